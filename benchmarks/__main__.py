@@ -0,0 +1,35 @@
+"""
+Runs the microbenchmarks and the load generator against every engine, reporting all
+their results as a single JSON document, for comparing commits. Run with
+`python -m benchmarks [--clients N] [--redis-url URL] [--output FILE]`.
+"""
+import argparse
+import json
+import sys
+
+from . import load, micro
+from .harness import raise_fd_limit, revision
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--redis-url")
+    parser.add_argument("--output", type=argparse.FileType("w"), default=sys.stdout)
+    args = parser.parse_args()
+
+    raise_fd_limit(args.clients)
+    results = {
+        "revision": revision(),
+        "micro": micro.run(),
+        "load": [
+            load.run(engine, args.clients, redis_url=args.redis_url)
+            for engine in ("gevent", "asyncio")
+        ],
+    }
+    json.dump(results, args.output, indent=2)
+    args.output.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Fan-out of a single message to every member of a large channel, and paging of its
+NAMES replies. Members write to sockets that discard everything, so this measures the
+server's own overhead rather than the network. Run with
+`python -m benchmarks.channels [--members N] [--messages N]`.
+"""
+import argparse
+import time
+
+import gevent
+
+from foghorn.bus import MessageBus
+from foghorn.commands.names import names_replies
+from foghorn.message import Message
+from foghorn.storage import ClientState, MemoryStorage
+from foghorn.writer import ConnectionWriter
+
+CHANNEL = "#foghorn"
+
+
+class NullSocket:
+    """A socket counting the lines written to it, and discarding them."""
+
+    def __init__(self):
+        self.writes = 0
+
+    def sendmsg(self, buffers) -> int:
+        self.writes += sum(bytes(buffer).count(b"\r\n") for buffer in buffers)
+        return sum(len(buffer) for buffer in buffers)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--members", type=int, default=50000)
+    parser.add_argument("--messages", type=int, default=20)
+    args = parser.parse_args()
+
+    storage = MemoryStorage()
+    bus = MessageBus(storage)
+    sockets, writers, members = [], [], []
+    for i in range(args.members):
+        client = ClientState(f"client:127.0.0.1@{i}", node=bus.node)
+        client.nickname = f"user{i}"
+        sock = NullSocket()
+        writer = ConnectionWriter(sock)  # type: ignore[arg-type]
+        bus.attach(client.key, writer.write)
+        bus.join(CHANNEL, client, storage)
+        sockets.append(sock)
+        writers.append(writer)
+        members.append(client)
+
+    # let every writer start waiting for data
+    gevent.sleep(0)
+
+    sender = members[0]
+    line = Message(
+        verb="PRIVMSG", source=sender.nickname, params=[CHANNEL, "hello there!"]
+    ).to_bytes()
+
+    blocked = delivered = 0.0
+    for _ in range(args.messages):
+        start = time.perf_counter()
+        bus.broadcast(CHANNEL, line, storage, exclude=sender)
+        blocked += time.perf_counter() - start
+
+        # the sender is free once broadcast returns, while the writers catch up
+        gevent.sleep(0)
+        delivered += time.perf_counter() - start
+
+    assert sum(sock.writes for sock in sockets) == (args.members - 1) * args.messages
+
+    start = time.perf_counter()
+    pages = names_replies(sender.nickname, CHANNEL, bus.members(CHANNEL, storage))
+    for page in pages:
+        page.to_bytes()
+    names = time.perf_counter() - start
+
+    print(f"{args.members} members, {args.messages} messages")
+    print(f"  sender blocked: {blocked / args.messages * 1e3:.2f} ms/message")
+    print(f"  all delivered:  {delivered / args.messages * 1e3:.2f} ms/message")
+    print(f"  NAMES:          {names * 1e3:.2f} ms for {len(pages)} replies")
+
+    for writer in writers:
+        writer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Connection storm against a running server: many clients connect at once, start
+capability negotiation, and disconnect as soon as they're answered. Compare the rate
+for different `foghorn start --workers` counts to see how the server scales with cores.
+Run with `python -m benchmarks.connections [--connections N] [--concurrency N]`.
+"""
+import argparse
+import time
+
+from gevent import socket
+from gevent.pool import Pool
+
+from foghorn.server import IRC_PORT
+
+
+def _connect(host: str, port: int) -> bool:
+    try:
+        with socket.create_connection((host, port)) as sock:
+            sock.sendall(b"CAP LS 302\r\n")
+            reply = b""
+            while not reply.endswith(b"\r\n"):
+                data = sock.recv(4096)
+                if not data:
+                    return False
+
+                reply += data
+    except OSError:
+        return False
+
+    return True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=IRC_PORT)
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=500)
+    args = parser.parse_args()
+
+    pool = Pool(args.concurrency)
+    start = time.perf_counter()
+    results = list(
+        pool.imap_unordered(
+            lambda _: _connect(args.host, args.port), range(args.connections)
+        )
+    )
+    elapsed = time.perf_counter() - start
+
+    failed = results.count(False)
+    print(
+        f"{args.connections} connections in {elapsed:.2f}s: "
+        f"{args.connections / elapsed:.0f} connections/s"
+    )
+    if failed:
+        print(f"{failed} connections failed")
+
+
+if __name__ == "__main__":
+    main()
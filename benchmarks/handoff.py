@@ -0,0 +1,125 @@
+"""
+A deploy under load: registered clients keep messaging each other while a second
+server is started with the same handoff path, takes over every connection from the
+first, and the first exits. Reports how long the handoff took, how many clients were
+disconnected, and how many of the messages sent throughout were delivered, with their
+latencies. Both servers keep their state in the Redis server at the given URL (like a
+local stand-in), which the handoff requires. Run with
+`python -m benchmarks.handoff --redis-url URL [--clients N] [--output FILE]`.
+"""
+import argparse
+import json
+import os
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import gevent
+from gevent.pool import Pool
+from gevent.queue import Empty
+
+from .harness import command, percentiles, raise_fd_limit, revision, serve
+from .load import TIMEOUT, Deliveries, LoadClient
+
+
+def run(
+    redis_url: str,
+    clients: int = 1000,
+    rounds: int = 20,
+    interval: float = 0.5,
+    concurrency: int = 200,
+) -> Dict[str, Any]:
+    """Runs a handoff under load against fresh servers, returning the results."""
+    path = os.path.join(tempfile.mkdtemp(), "handoff.sock")
+    args = ["--handoff-path", path]
+    deliveries = Deliveries(clients * rounds)
+    prefix = "".join(random.choices(string.ascii_lowercase, k=6))
+
+    with serve("gevent", clients + 1, redis_url, args) as old:
+
+        def connect(index: int) -> Optional[LoadClient]:
+            client = None
+            try:
+                client = LoadClient(prefix, index, (index + 1) % clients, deliveries)
+                client.register()
+                return client
+            except (OSError, Empty):
+                if client:
+                    client.close()
+
+                return None
+
+        online: List[LoadClient] = [
+            client
+            for client in Pool(concurrency).imap_unordered(connect, range(clients))
+            if client
+        ]
+        deliveries.expected = len(online) * rounds
+
+        # every client sends a message every interval, before, during and after the
+        # handoff, which happens a third of the way through
+        def chat() -> None:
+            for _ in range(rounds):
+                for client in online:
+                    try:
+                        client.burst(1)
+                    except OSError:
+                        pass
+                gevent.sleep(interval)
+
+        chatter = gevent.spawn(chat)
+        gevent.sleep(rounds * interval / 3)
+
+        start = time.perf_counter()
+        new = subprocess.Popen(command("gevent", clients + 1, redis_url, args))
+        try:
+            old.wait(TIMEOUT)
+            handoff = time.perf_counter() - start
+
+            chatter.join()
+            deliveries.done.wait(TIMEOUT)
+            # clients that were disconnected have stopped reading
+            disconnected = sum(client._reader.dead for client in online)
+            for client in online:
+                client.close()
+        finally:
+            new.terminate()
+            new.wait()
+
+    return {
+        "clients": clients,
+        "online": len(online),
+        "disconnected": disconnected,
+        "handoff_seconds": handoff,
+        "messages": {
+            "sent": deliveries.expected,
+            "delivered": len(deliveries.latencies),
+            **percentiles(deliveries.latencies),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--redis-url", required=True)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--output", type=argparse.FileType("w"), default=sys.stdout)
+    args = parser.parse_args()
+
+    raise_fd_limit(args.clients)
+    results = run(
+        args.redis_url, args.clients, args.rounds, args.interval, args.concurrency
+    )
+    json.dump({"revision": revision(), "handoff": results}, args.output, indent=2)
+    args.output.write("\n")
+
+
+if __name__ == "__main__":
+    main()
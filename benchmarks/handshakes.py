@@ -0,0 +1,111 @@
+"""
+TLS reconnect storm against a server of each engine: many clients connect at once,
+complete their handshake, start capability negotiation, and disconnect as soon as
+they're answered. Reports the handshakes per second with full handshakes, and with
+every client resuming a session from an earlier connection. The clients' side of
+every handshake is computed by this process, so compare rates rather than read them
+as absolute. Run with `python -m benchmarks.handshakes [--connections N]
+[--handshake-threads N] [--cert FILE --key FILE]`.
+"""
+import argparse
+import os
+import ssl
+import time
+from typing import Optional, Tuple
+
+from gevent import socket
+from gevent.pool import Pool
+
+from .harness import ADDRESS, raise_fd_limit, serve
+
+# the self-signed certificate the tests are served with
+CERTS = os.path.join(os.path.dirname(__file__), os.pardir, "tests", "certs")
+
+
+def _connect(
+    context: ssl.SSLContext, session: Optional[ssl.SSLSession] = None
+) -> Tuple[Optional[ssl.SSLSession], bool]:
+    """
+    Connects and negotiates once, resuming the given session if there's one. Returns
+    the session of the connection, and if it was resumed.
+    """
+    with socket.create_connection(ADDRESS) as sock:
+        with context.wrap_socket(
+            sock, server_hostname="localhost", session=session
+        ) as tls:
+            tls.sendall(b"CAP LS 302\r\n")
+            reply = b""
+            while not reply.endswith(b"\r\n"):
+                data = tls.recv(4096)
+                if not data:
+                    raise ConnectionError("The server closed the connection.")
+
+                reply += data
+
+            return tls.session, tls.session_reused
+
+
+def storm(
+    context: ssl.SSLContext,
+    connections: int,
+    concurrency: int,
+    session: Optional[ssl.SSLSession] = None,
+) -> Tuple[float, int]:
+    """Returns the handshakes per second, and how many of them were resumed."""
+    pool = Pool(concurrency)
+    start = time.perf_counter()
+    results = list(
+        pool.imap_unordered(lambda _: _connect(context, session), range(connections))
+    )
+    elapsed = time.perf_counter() - start
+    return connections / elapsed, sum(reused for _, reused in results)
+
+
+def run(
+    engine: str,
+    connections: int,
+    concurrency: int,
+    cert: str,
+    key: str,
+    handshake_threads: int = 0,
+) -> None:
+    args = ["--tls-cert", cert, "--tls-key", key]
+    if handshake_threads:
+        args += ["--handshake-threads", str(handshake_threads)]
+
+    context = ssl.create_default_context(cafile=cert)
+    with serve(engine, concurrency + 1, args=args):
+        session, _ = _connect(context)
+        for name, resumed in (("full", None), ("resumed", session)):
+            rate, reused = storm(context, connections, concurrency, resumed)
+            print(
+                f"{engine}: {connections} {name} handshakes at {rate:.0f}/s "
+                f"({reused} resumed)"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--connections", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--engine", choices=("gevent", "asyncio"))
+    parser.add_argument("--handshake-threads", type=int, default=0)
+    parser.add_argument("--cert", default=os.path.join(CERTS, "localhost.crt"))
+    parser.add_argument("--key", default=os.path.join(CERTS, "localhost.key"))
+    args = parser.parse_args()
+
+    raise_fd_limit(args.concurrency)
+    for engine in (args.engine,) if args.engine else ("gevent", "asyncio"):
+        run(
+            engine,
+            args.connections,
+            args.concurrency,
+            args.cert,
+            args.key,
+            # handshakes only run on threads with the gevent engine
+            args.handshake_threads if engine == "gevent" else 0,
+        )
+
+
+if __name__ == "__main__":
+    main()
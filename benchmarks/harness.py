@@ -0,0 +1,113 @@
+"""
+Helpers shared by the benchmarks run against a real server: starting one in a process of
+its own, measuring its memory, and summarizing latencies.
+"""
+import contextlib
+import resource
+import subprocess
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from gevent import socket
+
+from foghorn.core import IRC_PORT
+
+ADDRESS = ("127.0.0.1", IRC_PORT)
+
+
+def rss(pid: int) -> int:
+    """Returns the resident memory of the given process, in bytes."""
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+
+    raise RuntimeError("The memory of the process is unknown.")
+
+
+def raise_fd_limit(connections: int) -> None:
+    """
+    Raises the limit of open files for the given number of connections, exiting if
+    it can't be. Every connection takes a descriptor on both ends, and servers
+    inherit the limit of this process.
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = connections + 100
+    if hard != resource.RLIM_INFINITY and hard < wanted:
+        sys.exit(f"At most {hard - 100} connections can be opened (ulimit -n).")
+    elif soft != resource.RLIM_INFINITY and soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+
+def percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    """Returns the median and 99th percentile of the latencies, in milliseconds."""
+    if not samples:
+        return {"p50_ms": None, "p99_ms": None}
+
+    ordered = sorted(samples)
+    return {
+        "p50_ms": ordered[len(ordered) // 2] * 1e3,
+        "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1e3,
+    }
+
+
+def revision() -> Optional[str]:
+    """Returns the commit being benchmarked, if it's known."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def command(
+    engine: str = "gevent",
+    max_clients: int = 1000,
+    redis_url: Optional[str] = None,
+    args: Sequence[str] = (),
+) -> List[str]:
+    """
+    Returns the command starting a server with the given engine, keeping its state in
+    memory, or in the Redis server at the given URL, and started with any other given
+    arguments. Every benchmark client connects from the same address, so the address
+    is never flood limited.
+    """
+    storage = ["--redis-url", redis_url] if redis_url else ["--storage", "memory"]
+    return (
+        [sys.executable, "-m", "foghorn", "--engine", engine, *storage]
+        + ["--max-clients", str(max_clients), "--ip-rate", "1e9", "--ip-burst", "1e9"]
+        + list(args)
+    )
+
+
+@contextlib.contextmanager
+def serve(
+    engine: str = "gevent",
+    max_clients: int = 1000,
+    redis_url: Optional[str] = None,
+    args: Sequence[str] = (),
+) -> Iterator[subprocess.Popen]:
+    """
+    Runs a server started with the command above until the context exits, once it's
+    accepting connections.
+    """
+    server = subprocess.Popen(command(engine, max_clients, redis_url, args))
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(ADDRESS).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError(f"The {engine} server didn't start.")
+
+        yield server
+    finally:
+        server.terminate()
+        server.wait()
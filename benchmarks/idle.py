@@ -0,0 +1,78 @@
+"""
+Many idle clients held open against a server of each engine, measuring the server's
+memory per connection and the latency of a single active client on top of them. A
+server is started for every engine with in-memory storage, so nothing else is
+measured. Run with `python -m benchmarks.idle [--connections N] [--engine ENGINE]`.
+"""
+import argparse
+import random
+import time
+
+from gevent import socket
+from gevent.pool import Pool
+
+from .harness import ADDRESS, percentiles, raise_fd_limit, rss, serve
+
+PROBE = b"NAMES\r\n"
+
+
+def _ask(sock: socket.socket, line: bytes = PROBE) -> None:
+    sock.sendall(line)
+    reply = b""
+    while not reply.endswith(b"\r\n"):
+        data = sock.recv(4096)
+        if not data:
+            raise ConnectionError("The server closed the connection.")
+
+        reply += data
+
+
+def _connect(index: int) -> socket.socket:
+    sock = socket.create_connection(ADDRESS)
+    # every client registers before idling, so it's fully set up
+    _ask(sock, f"NICK idle{index}\r\nUSER idle 0 * :Idle\r\n".encode("utf-8"))
+    return sock
+
+
+def run(engine: str, connections: int, samples: int) -> None:
+    with serve(engine, connections + 1) as server:
+        baseline = rss(server.pid)
+        start = time.perf_counter()
+        idle = list(Pool(500).imap_unordered(_connect, range(connections)))
+        elapsed = time.perf_counter() - start
+        used = rss(server.pid) - baseline
+
+        # every sample is asked by a random client, waking it from idling
+        latencies = []
+        for probe in random.choices(idle, k=samples):
+            sent = time.perf_counter()
+            _ask(probe)
+            latencies.append(time.perf_counter() - sent)
+
+        latency = percentiles(latencies)
+        print(
+            f"{engine}: {connections} connections in {elapsed:.2f}s, "
+            f"{used / 1e6:.1f} MB ({used / connections:.0f} bytes/connection), "
+            f"p50 {latency['p50_ms'] * 1e3:.0f}us, p99 {latency['p99_ms'] * 1e3:.0f}us"
+        )
+
+        for sock in idle:
+            sock.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--connections", type=int, default=50000)
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument(
+        "--engine", choices=("gevent", "asyncio"), action="append", dest="engines"
+    )
+    args = parser.parse_args()
+
+    raise_fd_limit(args.connections)
+    for engine in args.engines or ("gevent", "asyncio"):
+        run(engine, args.connections, args.samples)
+
+
+if __name__ == "__main__":
+    main()
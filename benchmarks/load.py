@@ -0,0 +1,250 @@
+"""
+Load generator: thousands of simulated clients register, idle while pinging the server
+now and then, and then all send a burst of messages to each other at once. Reports the
+latency of every phase, the rate messages are delivered at, and the memory of the
+server as JSON, for comparing commits. The server keeps its state in memory, or in the
+Redis server at the given URL (like a local stand-in), so no network is needed. Run with
+`python -m benchmarks.load [--clients N] [--engine ENGINE] [--output FILE]`.
+
+Clients can send 20 lines at once before the server starts deferring them, so larger
+bursts measure flood control rather than the server.
+"""
+import argparse
+import json
+import random
+import string
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import gevent
+from gevent import socket
+from gevent.event import Event
+from gevent.pool import Group, Pool
+from gevent.queue import Empty, Queue
+
+from .harness import ADDRESS, percentiles, raise_fd_limit, revision, rss, serve
+
+# how long a client waits for any reply before giving up, in seconds
+TIMEOUT = 30.0
+
+
+class Deliveries:
+    """The latencies of the messages delivered to all clients."""
+
+    def __init__(self, expected: int):
+        self.latencies: List[float] = []
+        self.expected = expected
+        self.done = Event()
+
+    def record(self, latency: float) -> None:
+        self.latencies.append(latency)
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+
+class LoadClient:
+    """
+    A simulated client. Everything the server sends it is read by a greenlet of its own,
+    which records the latency of every message delivered, and hands any other reply to
+    whoever is waiting for one.
+    """
+
+    def __init__(self, prefix: str, index: int, peer: int, deliveries: Deliveries):
+        self.nickname = f"{prefix}{index}"
+        # every client messages the next one, so all of them receive as much as they
+        # send
+        self.peer = f"{prefix}{peer}"
+        self._deliveries = deliveries
+        self._replies: Queue = Queue()
+        self._socket = socket.create_connection(ADDRESS)
+        self._reader = gevent.spawn(self._read)
+
+    def _read(self) -> None:
+        buffer = b""
+        try:
+            while True:
+                data = self._socket.recv(65536)
+                if not data:
+                    break
+
+                buffer += data
+                *lines, buffer = buffer.split(b"\r\n")
+                for line in lines:
+                    if b" PRIVMSG " in line:
+                        # every message carries the time it was sent at
+                        sent = float(line.rsplit(b" ", 1)[1].lstrip(b":"))
+                        self._deliveries.record(time.perf_counter() - sent)
+                    else:
+                        self._replies.put(line)
+        except OSError:
+            pass
+        finally:
+            self._replies.put(None)
+
+    def ask(self, data: bytes, reply: bytes = b"") -> float:
+        """
+        Sends the data, and waits for a reply starting with the given prefix. Returns
+        how long it took, in seconds.
+        """
+        sent = time.perf_counter()
+        self._socket.sendall(data)
+        while True:
+            line = self._replies.get(timeout=TIMEOUT)
+            if line is None:
+                raise ConnectionError("The server closed the connection.")
+            elif line.startswith(reply):
+                return time.perf_counter() - sent
+
+    def register(self, cap: bool = True) -> float:
+        lines = [f"NICK {self.nickname}", f"USER {self.nickname} 0 * :Load"]
+        if cap:
+            lines = ["CAP LS 302", *lines, "CAP END"]
+
+        return self.ask("".join(f"{line}\r\n" for line in lines).encode(), b"001 ")
+
+    def ping(self) -> float:
+        # any reply will do, since the server doesn't answer with a PONG
+        return self.ask(b"PING :load\r\n")
+
+    def burst(self, messages: int) -> None:
+        self._socket.sendall(
+            b"".join(
+                f"PRIVMSG {self.peer} :{time.perf_counter()!r}\r\n".encode()
+                for _ in range(messages)
+            )
+        )
+
+    def close(self) -> None:
+        self._socket.close()
+        self._reader.kill()
+
+
+def run(
+    engine: str = "gevent",
+    clients: int = 2000,
+    pings: int = 3,
+    interval: float = 1.0,
+    messages: int = 10,
+    concurrency: int = 200,
+    cap: bool = True,
+    redis_url: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Runs the load against a fresh server, returning the results."""
+    deliveries = Deliveries(clients * messages)
+    errors = 0
+    # nicknames are unique to the run, since shared storage may still hold those of
+    # earlier ones
+    prefix = "".join(random.choices(string.ascii_lowercase, k=6))
+
+    with serve(engine, clients + 1, redis_url) as server:
+        baseline = rss(server.pid)
+
+        def connect(index: int) -> Tuple[Optional[LoadClient], Optional[float]]:
+            client = None
+            try:
+                client = LoadClient(prefix, index, (index + 1) % clients, deliveries)
+                return client, client.register(cap)
+            except (OSError, Empty):
+                if client:
+                    client.close()
+
+                return None, None
+
+        start = time.perf_counter()
+        connected = list(Pool(concurrency).imap_unordered(connect, range(clients)))
+        registration = time.perf_counter() - start
+        registered = rss(server.pid)
+        online = [client for client, _ in connected if client]
+        errors += clients - len(online)
+
+        # idle clients ping the server at random times, so they don't all ping at once
+        latencies = []
+
+        def idle(client: LoadClient) -> None:
+            nonlocal errors
+            try:
+                for _ in range(pings):
+                    gevent.sleep(random.uniform(0, interval))
+                    latencies.append(client.ping())
+            except (OSError, Empty):
+                errors += 1
+
+        group = Group()
+        for client in online:
+            group.spawn(idle, client)
+        group.join()
+
+        # then every client sends all its messages at once
+        deliveries.expected = len(online) * messages
+        start = time.perf_counter()
+        for client in online:
+            client.burst(messages)
+        deliveries.done.wait(TIMEOUT)
+        burst = time.perf_counter() - start
+        peak = rss(server.pid)
+
+        for client in online:
+            client.close()
+
+    return {
+        "engine": engine,
+        "storage": "redis" if redis_url else "memory",
+        "clients": clients,
+        "errors": errors,
+        "register": {
+            "seconds": registration,
+            **percentiles([latency for _, latency in connected if latency]),
+        },
+        "ping": {"samples": len(latencies), **percentiles(latencies)},
+        "burst": {
+            "messages": deliveries.expected,
+            "delivered": len(deliveries.latencies),
+            "seconds": burst,
+            "lines_per_second": len(deliveries.latencies) / burst,
+            **percentiles(deliveries.latencies),
+        },
+        "rss_bytes": {"baseline": baseline, "registered": registered, "peak": peak},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--pings", type=int, default=3)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--messages", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument(
+        "--no-cap",
+        action="store_false",
+        dest="cap",
+        help="register without negotiating capabilities",
+    )
+    parser.add_argument("--redis-url")
+    parser.add_argument(
+        "--engine", choices=("gevent", "asyncio"), action="append", dest="engines"
+    )
+    parser.add_argument("--output", type=argparse.FileType("w"), default=sys.stdout)
+    args = parser.parse_args()
+
+    raise_fd_limit(args.clients)
+    results = [
+        run(
+            engine,
+            args.clients,
+            args.pings,
+            args.interval,
+            args.messages,
+            args.concurrency,
+            args.cap,
+            args.redis_url,
+        )
+        for engine in args.engines or ("gevent", "asyncio")
+    ]
+    json.dump({"revision": revision(), "load": results}, args.output, indent=2)
+    args.output.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Microbenchmarks of the hot paths every line goes through: parsing and serializing
+messages, matching wildcard expressions, casting parameters, and handling whole batches
+of lines with and without metrics enabled. Reports the time per call of each as JSON,
+for comparing commits. Run with
+`python -m benchmarks.micro [--number N] [--output FILE]`.
+"""
+import argparse
+import json
+import sys
+import timeit
+from typing import Any, Callable, Dict, List
+
+from foghorn.commands import COMMANDS
+from foghorn.core import IRCCore
+from foghorn.enums import CapSubCommand, Command
+from foghorn.errors import ProtocolException
+from foghorn.flood import FloodControl
+from foghorn.message import Message
+from foghorn.storage import ClientState, MemoryStorage
+from foghorn.typing import typecaster
+from foghorn.utils import compose, transform
+
+from .harness import revision
+from .parsing import LINES
+
+# the nicknames of a busy network, for matching expressions against
+NICKNAMES = [f"user{i}" for i in range(10000)]
+EXPRESSIONS = ["user1234", "user12*", "*34", "user?2?4"]
+USER_PARAMS = ["coolguy", "0", "*", "Cool Guy"]
+# a message delivered to the sender itself, a reply, and an error
+BATCH = [b"PRIVMSG coolguy :hello there!", b"NAMES", b"FOO"]
+ADDRESS = ("127.0.0.1", 50000)
+
+
+def _from_line() -> None:
+    for line in LINES:
+        try:
+            Message.from_line(line)
+        except ProtocolException:
+            pass
+
+
+def _to_line(messages: List[Message]) -> Callable[[], None]:
+    def run() -> None:
+        for message in messages:
+            message.to_line()
+
+    return run
+
+
+def _match_expression() -> None:
+    for pattern in EXPRESSIONS:
+        Message.match_expression(pattern, NICKNAMES)
+
+
+def _transform() -> None:
+    transform([typecaster(str)] * 4, USER_PARAMS)
+    transform(CapSubCommand.LS.params, ["302"])
+
+
+def _compose() -> Callable[[], None]:
+    user = compose([typecaster(str)] * 4)
+    ls = compose(CapSubCommand.LS.params)
+
+    def run() -> None:
+        user(USER_PARAMS)
+        ls(["302"])
+
+    return run
+
+
+def _cap_ls() -> Callable[[], None]:
+    # every client of a reconnect storm negotiates from scratch
+    cap = COMMANDS[Command.CAP]
+    storage = MemoryStorage()
+    message = Message.from_line("CAP LS 302")
+
+    def run() -> None:
+        for reply in cap.respond(
+            ClientState("client:127.0.0.1@50000"), message, storage
+        ):
+            reply.to_bytes()
+
+    return run
+
+
+def _handle_batch(enable_metrics: bool) -> Callable[[], None]:
+    # the client is never flood limited, so nothing is ever deferred
+    unlimited = float("inf")
+    core = IRCCore(
+        MemoryStorage(),
+        flood_control=FloodControl(unlimited, unlimited, unlimited, unlimited),
+        enable_metrics=enable_metrics,
+    )
+    core.connect(ADDRESS, lambda data: None)
+    core.handle_batch(ADDRESS, [b"NICK coolguy", b"USER coolguy 0 * :Cool Guy"])
+
+    def run() -> None:
+        core.handle_batch(ADDRESS, BATCH)
+
+    return run
+
+
+def run(number: int = 2000) -> Dict[str, Any]:
+    """Times every benchmark, returning the best time per call of each."""
+    messages = [
+        Message(verb=Command.PRIVMSG, source="coolguy", params=["#channel", "hi!"]),
+        Message(
+            tags={"time": "2023-03-01T12:00:00.000Z"},
+            source="coolguy!ag@example.com",
+            verb=Command.PRIVMSG,
+            params=["#channel", "hello there, how is everyone?"],
+        ),
+        Message(
+            verb="353", params=["coolguy", "=", "#channel", " ".join(NICKNAMES[:40])]
+        ),
+    ]
+    benchmarks = {
+        # every call covers a few lines or calls, so it's reported per item
+        "from_line": (_from_line, len(LINES)),
+        "to_line": (_to_line(messages), len(messages)),
+        "match_expression": (_match_expression, len(EXPRESSIONS)),
+        "transform": (_transform, 2),
+        "compose": (_compose(), 2),
+        "cap_ls": (_cap_ls(), 1),
+    }
+
+    results = {}
+    for name, (func, items) in benchmarks.items():
+        # matching runs over thousands of candidates, so it needs far fewer calls
+        calls = max(1, number // 100) if name == "match_expression" else number
+        best = min(timeit.repeat(func, number=calls, repeat=5))
+        results[name] = {"us_per_call": best / (calls * items) * 1e6}
+
+    # batches are timed with and without metrics in turns, so both are equally
+    # affected by anything else running on the machine
+    batches = {"handle_batch": _handle_batch(False)}
+    batches["handle_batch_metrics"] = _handle_batch(True)
+    best = dict.fromkeys(batches, float("inf"))
+    for _ in range(10):
+        for name, func in batches.items():
+            best[name] = min(best[name], timeit.timeit(func, number=number))
+
+    for name, seconds in best.items():
+        results[name] = {"us_per_call": seconds / (number * len(BATCH)) * 1e6}
+
+    results["metrics_overhead"] = (
+        best["handle_batch_metrics"] / best["handle_batch"] - 1
+    )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--output", type=argparse.FileType("w"), default=sys.stdout)
+    args = parser.parse_args()
+
+    json.dump(
+        {"revision": revision(), "micro": run(args.number)}, args.output, indent=2
+    )
+    args.output.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Microbenchmark of Message.from_line against the original split-and-rejoin parser it
+replaced. Run with `python -m benchmarks.parsing`.
+"""
+import re
+import timeit
+from typing import Match
+
+from foghorn.enums import Command, ErrorCode
+from foghorn.errors import ProtocolException
+from foghorn.message import Message
+from foghorn.parsing import (
+    ATOM_DELIMITER,
+    MAX_MESSAGE_LENGTH,
+    MAX_TAGS_LENGTH,
+    SOURCE_PREFIX,
+    TAG_ESCAPE_MAPPING,
+    TAG_ESCAPE_MAPPING_2,
+    TAG_PREFIX,
+    TRAILING_PARAM_PREFIX,
+)
+
+LINES = [
+    b"CAP LS 302",
+    b"NICK coolguy",
+    b":coolguy!ag@example.com PRIVMSG #channel :hello there, how is everyone?",
+    b"@msgid=63E1033A051D4B41B1AB1FA3CF4A2A5D;time=2023-03-01T12:00:00.000Z"
+    b" :coolguy!ag@example.com PRIVMSG #channel :hello there, how is everyone?",
+    b"@+typing=active;+draft/reply=abc\\s123\\:4 :coolguy TAGMSG #channel",
+    b":irc.example.com MODE #channel +oo SomeUser :AnotherUser",
+]
+
+
+def legacy_tags_from_line(line: str):
+    def unescape(matchobj: Match) -> str:
+        match = matchobj.group(0)
+        return TAG_ESCAPE_MAPPING.get(
+            match, re.sub(r"\\([^:])", lambda m: m.group(1), matchobj.group(0))
+        )
+
+    line = re.sub(r"\\.?", unescape, line)
+    tags = dict(re.findall(r"([^=;]+)=?([^;]*)(?:;|$)", line))
+
+    def unescape2(matchobj: Match) -> str:
+        return TAG_ESCAPE_MAPPING_2[matchobj.group(0)]
+
+    return {t: re.sub(r"\\:|\\$", unescape2, tags[t]) for t in tags}
+
+
+def legacy_from_line(line: str) -> Message:
+    atoms = line.split(ATOM_DELIMITER)
+
+    tags = None
+    if atoms[0].startswith(TAG_PREFIX):
+        if len(atoms[0].encode("utf-8")) > MAX_TAGS_LENGTH - 1:
+            raise ProtocolException(ErrorCode.ERR_INPUTTOOLONG)
+
+        tags, atoms = legacy_tags_from_line(atoms[0][1:]), atoms[1:]
+
+    if len(ATOM_DELIMITER.join(atoms).encode("utf-8")) > MAX_MESSAGE_LENGTH:
+        raise ProtocolException(
+            ErrorCode.ERR_UNKNOWNERROR, msg=ErrorCode.ERR_INPUTTOOLONG.msg
+        )
+
+    source = None
+    if atoms[0].startswith(SOURCE_PREFIX):
+        source, atoms = atoms[0][1:], atoms[1:]
+
+    if atoms[0] not in Command.__members__:
+        raise ProtocolException(ErrorCode.ERR_UNKNOWNCOMMAND)
+
+    verb, params = Command[atoms[0]], []
+    for i, p in enumerate(atoms[1:]):
+        if p.startswith(TRAILING_PARAM_PREFIX):
+            params.append(ATOM_DELIMITER.join(atoms[1:][i:])[1:])
+            break
+        elif p.strip():
+            params.append(p)
+
+    return Message(tags=tags, source=source, verb=verb, params=params)
+
+
+def _parse_legacy():
+    for line in LINES:
+        try:
+            # the legacy parser was handed lines that were already decoded
+            legacy_from_line(line.decode("utf-8"))
+        except ProtocolException:
+            pass
+
+
+def _parse():
+    for line in LINES:
+        try:
+            Message.from_line(line)
+        except ProtocolException:
+            pass
+
+
+def main(number: int = 20000) -> None:
+    for name, func in (("legacy", _parse_legacy), ("from_line", _parse)):
+        best = min(timeit.repeat(func, number=number, repeat=5))
+        print(f"{name:>10}: {best / (number * len(LINES)) * 1e6:.3f} us/line")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Startup time of the foghorn command, for catching imports that slow down every start of
+the server. Times `foghorn --help` and importing the CLI in fresh interpreters, and
+lists the slowest modules the CLI imports (as reported by `python -X importtime`),
+along with any heavy dependency it shouldn't import before serving. Exits with an
+error if the best time of either is over the budget. Run with
+`python -m benchmarks.startup [--runs N] [--budget MS]`.
+"""
+import argparse
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+# dependencies only needed once the server is started, or by people reading help
+HEAVY = ("gevent", "redis", "rich")
+
+
+def best(command: List[str], runs: int) -> float:
+    """Returns the fastest of several runs of the given command, in milliseconds."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+
+    return min(times)
+
+
+def imports(module: str) -> List[Tuple[str, int]]:
+    """
+    Returns every module imported along with the given one, and the time it took to
+    import in microseconds, excluding the modules it imported.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        check=True,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    timings = []
+    # every line after the header reads "import time: <own> | <cumulative> | <name>"
+    for line in process.stderr.splitlines()[1:]:
+        own, _, name = line.partition(":")[2].split("|")
+        timings.append((name.strip(), int(own)))
+
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget", type=float, default=250.0)
+    parser.add_argument("--slowest", type=int, default=10)
+    args = parser.parse_args()
+
+    results = {
+        "foghorn --help": best([sys.executable, "-m", "foghorn", "--help"], args.runs),
+        "import foghorn.cli": best(
+            [sys.executable, "-c", "import foghorn.cli"], args.runs
+        ),
+    }
+    for name, elapsed in results.items():
+        print(f"{name}: {elapsed:.1f} ms")
+
+    timings = imports("foghorn.cli")
+    print(f"slowest of {len(timings)} modules imported by the CLI:")
+    for name, own in sorted(timings, key=lambda t: -t[1])[: args.slowest]:
+        print(f"  {own / 1000:6.1f} ms {name}")
+
+    heavy = sorted({name for name, _ in timings if name.split(".")[0] in HEAVY})
+    if heavy:
+        print(f"heavy modules imported by the CLI: {', '.join(heavy)}")
+
+    if max(results.values()) > args.budget:
+        sys.exit(f"Startup is over the budget of {args.budget:.0f} ms.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
-import gevent
-from gevent import monkey
+import os
 
-monkey.patch_all()
-gevent.config.loop = "libuv"
-gevent.config.resolver = ["dnspython", "ares", "thread", "block"]
+# the engine serving connections. the standard library is patched for gevent once the
+# core shared by both engines is imported, so the asyncio engine, which needs it
+# unpatched, must be selected before then
+ENGINE = os.environ.get("FOGHORN_ENGINE", "gevent")
@@ -0,0 +1,22 @@
+"""
+The entry point of the foghorn command. Rich only formats help and errors for people
+reading them, so it isn't imported at all when the output isn't a terminal, such as
+when the server is started by a supervisor or a script.
+"""
+import os
+import sys
+
+
+def main() -> None:
+    if not sys.stdout.isatty():
+        os.environ.setdefault("TYPER_USE_RICH", "0")
+        # typer imports rich if it can, whatever it's told
+        sys.modules.setdefault("rich", None)  # type: ignore
+
+    from foghorn.cli import app
+
+    app()
+
+
+if __name__ == "__main__":
+    main()
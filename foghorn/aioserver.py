@@ -0,0 +1,316 @@
+"""
+The asyncio engine, an alternative to the gevent one. Every connection is served by a
+protocol rather than a greenlet, so an idle connection costs no more than its buffers.
+Lines are handled by the same core as the gevent engine, with storage accessed through
+asyncio, and uvloop is used as the event loop if it's installed.
+
+The engine needs the standard library unpatched, so it must be selected, by setting
+FOGHORN_ENGINE=asyncio or foghorn.ENGINE, before foghorn.core is imported.
+"""
+import asyncio
+from ssl import SSLContext
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple, cast
+
+from .bridge import run_sync
+from .core import IRC_PORT, IRCCore
+from .flood import FloodControl, FloodLimiter
+from .framing import LineFramer
+from .history import HISTORY_LENGTH
+from .nicks import CaseMapping
+from .storage import AsyncRedisStorage, StorageBackend
+from .tls import HANDSHAKE_TIMEOUT
+from .typing import Address, Socket
+from .workers import LISTEN_BACKLOG
+from .sendq import DEFAULT_SENDQ, SendQPolicy
+
+try:
+    import uvloop
+except ImportError:  # pragma: no cover
+    uvloop = None
+
+
+class TransportWriter:
+    """
+    Writes to a single connection through its transport, which buffers whatever the
+    socket doesn't accept right away. The transport's buffer is limited to the given
+    budget, and anything written beyond it is handled according to the given policy.
+    Writes can't wait for room in the buffer, so blocking isn't supported.
+    """
+
+    __slots__ = ("dropped", "_transport", "_max_bytes", "_policy")
+
+    def __init__(
+        self,
+        transport: asyncio.WriteTransport,
+        max_bytes: int = DEFAULT_SENDQ,
+        policy: SendQPolicy = SendQPolicy.DISCONNECT,
+    ):
+        # the number of writes discarded since the buffer was full
+        self.dropped = 0
+
+        self._transport = transport
+        self._max_bytes = max_bytes
+        self._policy = policy
+
+    def write(self, data: bytes) -> None:
+        """
+        Writes the data to the connection, or buffers it. If the buffer is full, the
+        data is handled according to the policy of the writer.
+        """
+        transport = self._transport
+        if transport.is_closing():
+            return
+
+        # anything fits into an empty buffer, so nothing is ever too long to write
+        buffered = transport.get_write_buffer_size()
+        if buffered and buffered + len(data) > self._max_bytes:
+            if self._policy is SendQPolicy.DROP:
+                self.dropped += 1
+            else:
+                # the reason would only be sent after everything already buffered,
+                # so the client is disconnected without it
+                transport.abort()
+
+            return
+
+        transport.write(data)
+
+
+class IRCProtocol(asyncio.BufferedProtocol):
+    """
+    Serves a single connection. Everything done for the connection runs in order, and
+    reading is paused whenever something has to wait on storage or the client has to
+    be deferred, so lines are received directly into its framer's buffer and are never
+    queued anywhere else.
+    """
+
+    def __init__(self, server: "AsyncIRCServer"):
+        self._server = server
+        self._framer = LineFramer()
+        self._transport: Optional[asyncio.Transport] = None
+        self._writer: Optional[TransportWriter] = None
+        self._address: Optional[Address] = None
+        self._limiter: Optional[FloodLimiter] = None
+        # the lines received, but not handled yet
+        self._lines: Optional[Iterator[Optional[bytes]]] = None
+        # whatever is waiting on storage, or for the client to be out of debt
+        self._pending: Optional[asyncio.Future] = None
+        self._deferred: Optional[asyncio.TimerHandle] = None
+        self._closed = self._disconnected = False
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        # uvloop's transports don't derive from asyncio's, so they're only cast
+        self._transport = cast(asyncio.Transport, transport)
+        self._address = transport.get_extra_info("peername")[:2]
+        self._writer = TransportWriter(
+            self._transport, self._server._sendq, self._server._sendq_policy
+        )
+        self._run(self._connect)
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        return self._framer.get_buffer()
+
+    def buffer_updated(self, nbytes: int) -> None:
+        self._framer.buffer_updated(nbytes)
+        self._lines = self._framer.lines()
+        self._run(self._handle)
+
+    def eof_received(self) -> Optional[bool]:
+        # close the connection once the client is done sending
+        return False
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self._closed = True
+        if self._deferred:
+            self._deferred.cancel()
+            self._deferred = None
+
+        # whatever is pending disconnects the client once it's done
+        if not self._pending:
+            self._after()
+
+    def _connect(self) -> None:
+        assert self._address and self._writer  # calm down mypy
+        self._limiter = self._server.connect(self._address, self._writer.write)
+
+    def _handle(self) -> None:
+        assert self._address and self._writer and self._lines  # calm down mypy
+        # every complete message is handled together, and all their responses are
+        # sent at once
+        self._server.send(
+            self._writer.write, self._server.handle_batch(self._address, self._lines)
+        )
+
+    def _disconnect(self) -> None:
+        # the client may have disconnected before it was ever connected
+        if self._limiter:
+            assert self._address  # calm down mypy
+            self._server.disconnect(self._address)
+
+    def _run(self, func: Callable[[], None]) -> None:
+        assert self._transport  # calm down mypy
+        try:
+            self._pending = run_sync(func)
+        except Exception as exc:  # pylint: disable=broad-except
+            self._fail(exc)
+            return
+
+        if self._pending:
+            # nothing else is received until it's done
+            self._transport.pause_reading()
+            self._pending.add_done_callback(self._resume)
+        else:
+            self._after()
+
+    def _resume(self, future: asyncio.Future) -> None:
+        self._pending = None
+        if not future.cancelled() and future.exception():
+            self._fail(future.exception())
+            return
+
+        self._after()
+
+    def _after(self) -> None:
+        assert self._transport  # calm down mypy
+        if self._closed:
+            if not self._disconnected:
+                self._disconnected = True
+                self._run(self._disconnect)
+
+            return
+
+        # a client sending too fast has the rest of its lines deferred until it's
+        # earned enough tokens, and nothing more is read from it in the meantime
+        delay = self._limiter.delay() if self._limiter else 0.0
+        if delay:
+            assert self._limiter  # calm down mypy
+            self._limiter.defer(delay)
+            self._transport.pause_reading()
+            self._deferred = asyncio.get_running_loop().call_later(
+                delay, self._continue
+            )
+        else:
+            self._transport.resume_reading()
+
+    def _continue(self) -> None:
+        assert self._transport  # calm down mypy
+        self._deferred = None
+        # the line that put the client in debt may have been its last
+        if self._framer.has_line():
+            self._run(self._handle)
+        else:
+            self._transport.resume_reading()
+
+    def _fail(self, exc: Optional[BaseException]) -> None:
+        assert self._transport  # calm down mypy
+        asyncio.get_running_loop().call_exception_handler(
+            {
+                "message": "Unhandled exception while serving a client",
+                "exception": exc,
+                "protocol": self,
+            }
+        )
+        self._transport.abort()
+
+
+class AsyncIRCServer(IRCCore):
+    def __init__(
+        self,
+        hostname: str,
+        max_clients: int = 100,
+        redis_timeout: int = 20,
+        sync_storage: bool = False,
+        storage: Optional[StorageBackend] = None,
+        listener: Optional[Socket] = None,
+        sendq: int = DEFAULT_SENDQ,
+        sendq_policy: SendQPolicy = SendQPolicy.DISCONNECT,
+        flood_control: Optional[FloodControl] = None,
+        enable_metrics: bool = False,
+        casemapping: CaseMapping = CaseMapping.RFC1459,
+        history_length: int = HISTORY_LENGTH,
+        tls: Optional[SSLContext] = None,
+        handshake_threads: int = 0,
+        handoff_path: Optional[str] = None,
+    ):
+        if sendq_policy is SendQPolicy.BLOCK:
+            raise ValueError("Writes can't block with the asyncio engine.")
+        elif handshake_threads:
+            raise ValueError(
+                "Handshakes can't be run on threads with the asyncio engine."
+            )
+        elif handoff_path:
+            raise ValueError("Connections can't be handed off by the asyncio engine.")
+
+        # default to storing state in Redis, with a connection for every client
+        super().__init__(
+            storage
+            or AsyncRedisStorage.from_pool(
+                max_connections=max_clients, timeout=redis_timeout
+            ),
+            sync_storage=sync_storage,
+            flood_control=flood_control,
+            enable_metrics=enable_metrics,
+            casemapping=casemapping,
+            history_length=history_length,
+        )
+        self._hostname = hostname
+        # workers sharing a port are given an already listening socket
+        self._listener = listener
+        # the most bytes buffered for any connection, and what happens beyond that
+        self._sendq = sendq
+        self._sendq_policy = sendq_policy
+        # connections are only served over TLS given its context, with handshakes run
+        # by the event loop
+        self._tls = tls
+        self.address: Optional[Tuple[str, int]] = None
+
+    async def serve(self, started: Optional[Callable[[], Any]] = None) -> None:
+        """
+        Serves clients until cancelled. The given callback is called once the server
+        is listening.
+        """
+        loop = asyncio.get_running_loop()
+        tls: Dict[str, Any] = (
+            {"ssl": self._tls, "ssl_handshake_timeout": HANDSHAKE_TIMEOUT}
+            if self._tls
+            else {}
+        )
+        if self._listener:
+            server = await loop.create_server(
+                lambda: IRCProtocol(self), sock=self._listener, **tls
+            )
+        else:
+            server = await loop.create_server(
+                lambda: IRCProtocol(self),
+                self._hostname,
+                IRC_PORT,
+                reuse_address=True,
+                backlog=LISTEN_BACKLOG,
+                **tls,
+            )
+
+        self.address = server.sockets[0].getsockname()[:2]
+        # receive messages for this node's clients from other nodes
+        listener = run_sync(self._bus.listen) if self._storage.shared else None
+        lease = run_sync(self._bus.keep_alive) if self._storage.shared else None
+        try:
+            async with server:
+                if started:
+                    started()
+
+                await server.serve_forever()
+        finally:
+            if listener:
+                listener.cancel()
+            if lease:
+                lease.cancel()
+
+    def serve_forever(self) -> None:
+        """Runs an event loop serving clients until interrupted."""
+        if uvloop:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,54 @@
+"""
+Running the synchronous command handlers from asyncio, while still letting them wait on
+coroutines. Handlers run in a greenlet of their own, which switches back to the event
+loop whenever it has to await something, and is resumed with the result. Handlers that
+never await anything finish right away, without ever scheduling a task.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+from greenlet import getcurrent, greenlet
+
+
+class _BridgeGreenlet(greenlet):
+    """A greenlet running synchronous code on behalf of the event loop."""
+
+
+def await_(awaitable: Awaitable) -> Any:
+    """
+    Waits for the given awaitable from synchronous code running under `run_sync`,
+    returning its result or raising its exception.
+    """
+    current = getcurrent()
+    if not isinstance(current, _BridgeGreenlet):
+        raise RuntimeError("Coroutines can only be awaited from within run_sync.")
+
+    assert current.parent is not None  # calm down mypy
+    return current.parent.switch(awaitable)
+
+
+async def _drive(bridge: _BridgeGreenlet, awaitable: Awaitable) -> Any:
+    result = awaitable
+    while not bridge.dead:
+        try:
+            value = await result
+        except BaseException as exc:  # pylint: disable=broad-except
+            result = bridge.throw(exc)
+        else:
+            result = bridge.switch(value)
+
+    return result
+
+
+def run_sync(func: Callable, *args: Any) -> Optional["asyncio.Future"]:
+    """
+    Runs the given function until it returns, or until it awaits something for the
+    first time. Returns None if it returned right away, or a task running it to
+    completion otherwise.
+    """
+    bridge = _BridgeGreenlet(func)
+    awaitable = bridge.switch(*args)
+    if bridge.dead:
+        return None
+
+    return asyncio.ensure_future(_drive(bridge, awaitable))
@@ -0,0 +1,241 @@
+"""
+Delivery of messages to clients, regardless of which node they're connected to. Every
+node subscribes to a channel of its own, and messages for clients connected elsewhere
+are published to the channel of the node owning them. Since no node keeps any state
+about another's clients, nodes can be added behind a load balancer freely.
+"""
+import random
+from typing import Callable, Dict, FrozenSet, List, Optional, Set
+
+from .enums import Capabilities
+from .history import History
+from .nicks import NickRegistry
+from .parsing import CHANNEL_PREFIXES, MSG_DELIMITER
+from .storage import CLIENT_NODE_RKEY, ClientState, StorageBackend
+
+# published payloads are a series of records, each one being the key of the recipient
+# client, or the name of the recipient channel, followed by the line to deliver to it
+RECORD_KEY_DELIMITER = b" "
+CHANNEL_RECORD_PREFIXES = tuple(prefix.encode() for prefix in CHANNEL_PREFIXES)
+
+# node ids are random, so nodes never need to coordinate to pick unique ones
+NODE_ID_BITS = 48
+
+
+def node_channel(node: int) -> str:
+    """Returns the channel the given node receives messages on."""
+    return f"node:{node}"
+
+
+class MessageBus:
+    """
+    Routes messages to clients. Clients connected to this node are written to
+    directly, while messages for any others are batched per node and published
+    together once flushed.
+
+    The members of every channel connected to this node are indexed, and the index
+    is mirrored to storage. A message to a channel is published once to every other
+    node with members in it, and each node fans it out to its own members. Clients
+    connected to this node are also indexed by the capabilities they've enabled,
+    messages are addressed to clients through the registry of their nicknames, and the
+    messages sent to channels are kept in their history.
+    """
+
+    __slots__ = (
+        "node",
+        "nicks",
+        "history",
+        "_storage",
+        "_routes",
+        "_channels",
+        "_capable",
+        "_outbox",
+    )
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        node: Optional[int] = None,
+        nicks: Optional[NickRegistry] = None,
+        history: Optional[History] = None,
+    ):
+        self.node = node if node is not None else random.getrandbits(NODE_ID_BITS)
+        self.nicks = nicks or NickRegistry()
+        self.history = history or History()
+        self._storage = storage
+        # the writer of every client connected to this node
+        self._routes: Dict[str, Callable[[bytes], None]] = {}
+        # the members of every channel connected to this node
+        self._channels: Dict[str, Set[ClientState]] = {}
+        # the clients connected to this node with every capability enabled
+        self._capable: Dict[Capabilities, Set[ClientState]] = {
+            cap: set() for cap in Capabilities
+        }
+        # the records waiting to be published, per node
+        self._outbox: Dict[int, List[bytes]] = {}
+
+    @property
+    def channel(self) -> str:
+        return node_channel(self.node)
+
+    def attach(self, key: str, write: Callable[[bytes], None]) -> None:
+        """Routes messages for the given client through the given writer."""
+        self._routes[key] = write
+
+    def adopt(self, client: ClientState, write: Callable[[bytes], None]) -> None:
+        """
+        Routes messages for a client handed off to this node through the given writer,
+        indexing the channels it's a member of and its nickname. They're all recorded
+        in storage already.
+        """
+        self.attach(client.key, write)
+        for channel in client.channels:
+            self._channels.setdefault(channel, set()).add(client)
+        if client.nickname:
+            self.nicks.adopt(client.nickname, client.key)
+
+    def detach(self, key: str) -> None:
+        """Stops routing messages to the given client."""
+        self._routes.pop(key, None)
+
+    def send(self, key: str, line: bytes, storage: StorageBackend) -> bool:
+        """
+        Sends an encoded line to the given client, returning if it's connected
+        anywhere. Lines for clients of other nodes are only queued, and aren't
+        published until the next flush.
+        """
+        write = self._routes.get(key)
+        if write:
+            write(line)
+            return True
+
+        node = storage.read_client(key).get(CLIENT_NODE_RKEY)
+        if node is None:
+            return False
+
+        self._outbox.setdefault(node, []).append(
+            key.encode() + RECORD_KEY_DELIMITER + line
+        )
+        return True
+
+    def join(self, channel: str, client: ClientState, storage: StorageBackend) -> None:
+        """Adds the given client to the given channel."""
+        self._channels.setdefault(channel, set()).add(client)
+        client.channels.add(channel)
+        assert client.nickname  # calm down mypy
+        storage.join_channel(channel, client.nickname, self.node)
+
+    def part(self, channel: str, client: ClientState, storage: StorageBackend) -> None:
+        """Removes the given client from the given channel."""
+        client.channels.discard(channel)
+        members = self._channels.get(channel, set())
+        members.discard(client)
+        if not members:
+            self._channels.pop(channel, None)
+            # lines sent to the channel through other nodes won't be received anymore,
+            # so its cached history would go stale
+            self.history.invalidate(channel)
+
+        assert client.nickname  # calm down mypy
+        # once the last local member leaves, the node isn't sent the channel's
+        # messages anymore
+        storage.part_channel(channel, client.nickname, None if members else self.node)
+
+    def members(self, channel: str, storage: StorageBackend) -> List[str]:
+        """
+        Returns the nicknames of every member of the given channel. Unless members are
+        connected to other nodes, they're read from the local index.
+        """
+        if storage.channel_nodes(channel) - {self.node}:
+            return sorted(storage.channel_members(channel))
+
+        return sorted(
+            member.nickname
+            for member in self._channels.get(channel, ())
+            if member.nickname
+        )
+
+    def index_caps(self, client: ClientState, caps: FrozenSet[Capabilities]) -> None:
+        """
+        Indexes the given client by the given capabilities, being all of those it has
+        enabled. Clients are removed from the index with no capabilities.
+        """
+        for cap, members in self._capable.items():
+            if cap in caps:
+                members.add(client)
+            else:
+                members.discard(client)
+
+    def capable(self, cap: Capabilities) -> List[ClientState]:
+        """Returns the clients connected to this node with the capability enabled."""
+        return list(self._capable[cap])
+
+    def announce(self, cap: Capabilities, line: bytes) -> None:
+        """
+        Sends an encoded line to every client connected to this node with the given
+        capability enabled, without looking at any other.
+        """
+        routes = self._routes
+        for client in self._capable[cap]:
+            routes[client.key](line)
+
+    def broadcast(
+        self,
+        channel: str,
+        line: bytes,
+        storage: StorageBackend,
+        exclude: Optional[ClientState] = None,
+    ) -> None:
+        """
+        Sends an encoded line to every member of the given channel, except the given
+        one. The line is written to local members right away, and queued for every
+        other node with members.
+        """
+        routes = self._routes
+        for member in self._channels.get(channel, ()):
+            if member is not exclude:
+                routes[member.key](line)
+
+        record = channel.encode() + RECORD_KEY_DELIMITER + line
+        for node in storage.channel_nodes(channel):
+            if node != self.node:
+                self._outbox.setdefault(node, []).append(record)
+
+    def flush(self, storage: StorageBackend) -> None:
+        """Publishes every queued line, with a single payload per node."""
+        outbox, self._outbox = self._outbox, {}
+        for node, records in outbox.items():
+            storage.publish(node_channel(node), b"".join(records))
+
+    def receive(self, payload: bytes) -> None:
+        """Delivers every line in a payload published to this node."""
+        for record in payload.split(MSG_DELIMITER):
+            if not record:
+                continue
+
+            key, _, line = record.partition(RECORD_KEY_DELIMITER)
+            line += MSG_DELIMITER
+            if key.startswith(CHANNEL_RECORD_PREFIXES):
+                channel = key.decode()
+                # the line was added to the channel's history by another node
+                self.history.invalidate(channel)
+                for member in self._channels.get(channel, ()):
+                    self._routes[member.key](line)
+                continue
+
+            write = self._routes.get(key.decode())
+            # the client may have disconnected since the line was published
+            if write:
+                write(line)
+
+    def keep_alive(self) -> None:
+        """
+        Holds the lease of this node forever, so the nicknames its clients use aren't
+        taken over by other nodes.
+        """
+        self._storage.hold_lease(self.node)
+
+    def listen(self) -> None:
+        """Delivers every payload published to this node, forever."""
+        for payload in self._storage.subscribe(self.channel):
+            self.receive(payload)
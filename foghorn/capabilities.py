@@ -0,0 +1,153 @@
+"""
+The capabilities advertised by the server. The replies listing them are built and
+serialized once for every negotiation version, and only rebuilt when a capability is
+advertised or withdrawn, so a storm of clients negotiating at once only ever gets
+replies that are ready to be sent.
+"""
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+from .enums import Capabilities, CapSubCommand, Command
+from .message import Message
+from .parsing import ANY_CLIENT, ATOM_DELIMITER, MAX_MESSAGE_LENGTH
+from .storage import ClientState
+
+# the version of capability negotiation where replies can span many lines, and
+# cap-notify is implicitly enabled
+MULTILINE_VERSION = 302
+# marks every line of a reply but the last one when it spans many lines
+CONTINUATION = "*"
+
+
+def enabled_caps(client: ClientState) -> FrozenSet[Capabilities]:
+    """Returns the capabilities enabled for the client, including implicit ones."""
+    if (client.version or 0) >= MULTILINE_VERSION:
+        return frozenset((*client.caps, Capabilities.CAP_NOTIFY))
+
+    return frozenset(client.caps)
+
+
+def split_caps(
+    subcommand: CapSubCommand,
+    caps: Iterable[str],
+    multiline: bool,
+    max_length: int = MAX_MESSAGE_LENGTH,
+) -> List[Message]:
+    """
+    Returns the replies listing the given capabilities. With multiline replies, the
+    capabilities are split over as many lines as needed for every line to fit in the
+    given length, with all lines but the last one marked as continued.
+    """
+    caps = list(caps)
+    if not multiline or not caps:
+        return [Message(verb=Command.CAP, params=[ANY_CLIENT, subcommand.name, *caps])]
+
+    # everything but the capabilities on a continued line, delimiter included
+    prefix = len(
+        Message(
+            verb=Command.CAP, params=[ANY_CLIENT, subcommand.name, CONTINUATION, ""]
+        ).to_bytes()
+    )
+    budget = max_length - prefix
+
+    lines: List[List[str]] = [[]]
+    length = -1
+    for cap in caps:
+        length += len(cap.encode("utf-8")) + 1
+        if lines[-1] and length > budget:
+            lines.append([])
+            length = len(cap.encode("utf-8"))
+        lines[-1].append(cap)
+
+    return [
+        Message(
+            verb=Command.CAP,
+            params=[
+                ANY_CLIENT,
+                subcommand.name,
+                *([CONTINUATION] if i < len(lines) - 1 else []),
+                ATOM_DELIMITER.join(line),
+            ],
+        )
+        for i, line in enumerate(lines)
+    ]
+
+
+@lru_cache(maxsize=None)
+def ack(requested: FrozenSet[str]) -> Message:
+    """
+    Returns the reply acknowledging a request of the given caps, echoing them as they
+    were requested, along with the prefix of those removed. Only requests of caps that
+    are offered are acknowledged, so there are few of them to cache.
+    """
+    return Message(
+        verb=Command.CAP,
+        params=[ANY_CLIENT, CapSubCommand.ACK.name, " ".join(sorted(requested))],
+    )
+
+
+class CapabilitySet:
+    """
+    The capabilities currently advertised, with the replies listing them for clients
+    negotiating with and without multiline replies. All the replies are serialized up
+    front, so sending them never encodes anything.
+    """
+
+    def __init__(self, caps: Iterable[Capabilities] = Capabilities):
+        self._caps: FrozenSet[Capabilities] = frozenset()
+        self._values: Dict[str, Capabilities] = {}
+        self._ls: Dict[bool, List[Message]] = {}
+        self._build(caps)
+
+    def _build(self, caps: Iterable[Capabilities]) -> None:
+        self._caps = frozenset(caps)
+        # listed in a stable order, regardless of the order caps were advertised in
+        values = [cap.value for cap in Capabilities if cap in self._caps]
+        self._values = {cap.value: cap for cap in self._caps}
+        self._ls = {
+            multiline: split_caps(CapSubCommand.LS, values, multiline)
+            for multiline in (False, True)
+        }
+        for replies in self._ls.values():
+            for reply in replies:
+                reply.to_bytes()
+
+    def __contains__(self, cap: Capabilities) -> bool:
+        return cap in self._caps
+
+    def get(self, value: str) -> Optional[Capabilities]:
+        """Returns the advertised capability with the given name, if there's one."""
+        return self._values.get(value)
+
+    def ls(self, version: int) -> List[Message]:
+        """Returns the replies listing every capability to a client of the version."""
+        return self._ls[version >= MULTILINE_VERSION]
+
+    def add(self, cap: Capabilities) -> Optional[Message]:
+        """
+        Advertises the capability, returning the message notifying clients of it, or
+        None if it was already advertised.
+        """
+        if cap in self._caps:
+            return None
+
+        self._build(self._caps | {cap})
+        return Message(
+            verb=Command.CAP, params=[ANY_CLIENT, CapSubCommand.NEW.name, cap.value]
+        )
+
+    def remove(self, cap: Capabilities) -> Optional[Message]:
+        """
+        Stops advertising the capability, returning the message notifying clients of
+        it, or None if it wasn't advertised.
+        """
+        if cap not in self._caps:
+            return None
+
+        self._build(self._caps - {cap})
+        return Message(
+            verb=Command.CAP, params=[ANY_CLIENT, CapSubCommand.DEL.name, cap.value]
+        )
+
+
+CAPABILITIES = CapabilitySet()
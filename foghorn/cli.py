@@ -1,26 +1,232 @@
+from enum import Enum
 from typing import Optional
 
-from typer import Typer
+from typer import BadParameter, Typer
+
+from foghorn.flood import IP_BURST, IP_RATE
+from foghorn.history import HISTORY_LENGTH
+from foghorn.nicks import CaseMapping
+from foghorn.sendq import DEFAULT_SENDQ, SendQPolicy
 
 app = Typer()
 
 
+class StorageEngine(str, Enum):
+    """Where the server keeps state shared between connections."""
+
+    MEMORY = "memory"
+    REDIS = "redis"
+
+
+class ServerEngine(str, Enum):
+    """What serves connections: greenlets, or an asyncio event loop."""
+
+    GEVENT = "gevent"
+    ASYNCIO = "asyncio"
+
+
 @app.command()
 def start(
     hostname: Optional[str] = None,
     config: Optional[str] = ".foghornirc",
+    storage: StorageEngine = StorageEngine.REDIS,
+    redis_url: Optional[str] = None,
+    workers: int = 1,
+    engine: ServerEngine = ServerEngine.GEVENT,
+    max_clients: int = 1000,
+    sendq: int = DEFAULT_SENDQ,
+    sendq_policy: SendQPolicy = SendQPolicy.DISCONNECT,
+    ip_rate: float = IP_RATE,
+    ip_burst: float = IP_BURST,
+    metrics_port: Optional[int] = None,
+    profiling: bool = False,
+    profile_rate: Optional[float] = None,
+    profile_path: Optional[str] = None,
+    casemapping: CaseMapping = CaseMapping.RFC1459,
+    history_length: int = HISTORY_LENGTH,
+    tls_cert: Optional[str] = None,
+    tls_key: Optional[str] = None,
+    handshake_threads: int = 0,
+    handoff_path: Optional[str] = None,
 ):
     """
     Launches a Foghorn IRCv3 server running with the explicitly provided configuration,
     or by loading the configuration file if one is provided.
 
-    All servers run on TCP using port 6697 as per the specification. All connections
-    are encrypted with automatically generated TLS certificates from Let's Encrypt.
+    All servers run on TCP using port 6697 as per the specification. Given a TLS
+    certificate chain (and its key, unless it's in the same file), all connections are
+    encrypted, and returning clients resume their sessions through session tickets.
+    With the gevent engine, handshakes can be run on a pool of handshake-threads
+    threads in every worker, rather than stalling the worker's other connections.
+
+    State is kept in Redis (at the given URL, or the default local server), unless
+    in-memory storage is chosen for a single-node deployment.
+
+    With more than one worker, that many processes are forked to serve clients from
+    the same port, and any that die are restarted.
+
+    Connections are served by greenlets, or by an asyncio event loop (using uvloop if
+    it's installed), which is cheaper for many idle clients. With Redis storage, at
+    most max-clients connections to it are held at once.
+
+    At most sendq bytes are queued for any client that isn't reading fast enough.
+    Beyond that, whatever is sent to it is dropped, the sender blocks until there's
+    room, or the client is disconnected, depending on the sendq policy.
+
+    All the clients connected from a single IP address can send ip-rate lines per
+    second combined, in bursts of up to ip-burst lines, before being slowed down.
+
+    With a metrics port, the server measures itself, and serves its metrics for
+    Prometheus at http://127.0.0.1:<metrics-port>/metrics. Command counts and uptime
+    are also reported to clients through STATS.
+
+    With profiling allowed, sending a worker SIGUSR1 (or the supervisor, which
+    forwards it to every worker), or STATS p from a local client, toggles profiling:
+    profile-rate of the lines handled (1% by default) are timed through every stage,
+    and the times are dumped as collapsed stacks to profile-path (foghorn.{pid}.stacks
+    by default, where {pid} is the worker's pid) when it's toggled off.
+
+    Nicknames that only differ by case, as defined by the casemapping, can't be used
+    by different clients at once.
+
+    About history-length of the latest messages sent to every channel are kept, for
+    clients to replay through CHATHISTORY. No history is kept with a length of 0.
+
+    Given a handoff path, the server listens on a Unix socket there for the next one
+    started with the same path, and hands it every connection before exiting, so new
+    versions are deployed without disconnecting any client. Connections over TLS are
+    closed instead. It only works with the gevent engine, a single worker, and Redis.
     """
-    from foghorn.server import IRCServer
+    import foghorn
+
+    # nothing importing an engine was imported yet, so the standard library is only
+    # patched for gevent once it's chosen
+    foghorn.ENGINE = engine.value
+
+    from foghorn.core import IRC_PORT
+    from foghorn.flood import FloodControl
+    from foghorn.storage import AsyncRedisStorage, MemoryStorage, RedisStorage
+    from foghorn.workers import REUSE_PORT, Supervisor, bind_listener
+
+    if sendq < 1:
+        raise BadParameter("The sendq must be at least one byte.")
+    elif ip_rate <= 0 or ip_burst < 1:
+        raise BadParameter("Clients must be able to send at least a line.")
+    elif not profiling and (profile_rate is not None or profile_path is not None):
+        raise BadParameter("The profiler is only configured with profiling allowed.")
+    elif profile_rate is not None and not 0 < profile_rate <= 1:
+        raise BadParameter("The profile rate must be a fraction of the lines.")
+    elif tls_key and not tls_cert:
+        raise BadParameter("A TLS key is only used with its certificate.")
+    elif handshake_threads < 0 or (handshake_threads and not tls_cert):
+        raise BadParameter("Handshake threads can only run TLS handshakes.")
+    elif engine == ServerEngine.ASYNCIO and handshake_threads:
+        raise BadParameter(
+            "Handshakes can't be run on threads with the asyncio engine."
+        )
+    elif history_length < 0:
+        raise BadParameter("The history length can't be negative.")
+    elif max_clients < 1:
+        raise BadParameter("There must be room for at least one client.")
+    elif engine == ServerEngine.ASYNCIO and sendq_policy == SendQPolicy.BLOCK:
+        raise BadParameter("Writes can't block with the asyncio engine.")
+    elif workers < 1:
+        raise BadParameter("There must be at least one worker.")
+    elif workers > 1 and storage == StorageEngine.MEMORY:
+        raise BadParameter("In-memory storage cannot be shared between workers.")
+    elif workers > 1 and metrics_port is not None:
+        raise BadParameter("Metrics can only be served by a single worker.")
+    elif handoff_path and (
+        engine == ServerEngine.ASYNCIO or workers > 1 or storage == StorageEngine.MEMORY
+    ):
+        raise BadParameter(
+            "Connections can only be handed off by a single gevent worker using Redis."
+        )
+
+    address = ("127.0.0.1", IRC_PORT)
+
+    # the context is created before any worker is forked, so they all share the keys
+    # of session tickets, and clients can resume their sessions on any of them
+    tls = None
+    if tls_cert:
+        from foghorn.tls import server_context
+
+        try:
+            tls = server_context(tls_cert, tls_key)
+        except OSError as err:
+            raise BadParameter(f"The TLS certificate can't be loaded: {err}")
+
+    # without SO_REUSEPORT, workers inherit a single listening socket instead of
+    # binding their own
+    shared_listener = bind_listener(address) if workers > 1 and not REUSE_PORT else None
+
+    # a server already running at the handoff path hands off its listening socket,
+    # and everything else once this one is created
+    handoff = None
+    if handoff_path:
+        from foghorn.handoff import take_over
+
+        handoff = take_over(handoff_path)
+        if handoff:
+            shared_listener = handoff.listener
+
+    def serve() -> None:
+        if profiling:
+            from foghorn.profiling import PROFILER, install_signal_handler
+
+            PROFILER.allowed = True
+            if profile_rate is not None:
+                PROFILER.rate = profile_rate
+            if profile_path is not None:
+                PROFILER.path = profile_path
+            install_signal_handler()
+
+        # storage is created in every worker, so no connections are shared between
+        # processes
+        if engine == ServerEngine.ASYNCIO:
+            from foghorn.aioserver import AsyncIRCServer as Server
+
+            redis_storage = AsyncRedisStorage
+        else:
+            from foghorn.server import IRCServer as Server
+
+            redis_storage = RedisStorage
+
+        server = Server(
+            address[0],
+            max_clients,
+            storage=(
+                MemoryStorage()
+                if storage == StorageEngine.MEMORY
+                else redis_storage.from_pool(max_connections=max_clients, url=redis_url)
+            ),
+            listener=(
+                shared_listener
+                or (bind_listener(address, reuse_port=True) if workers > 1 else None)
+            ),
+            sendq=sendq,
+            sendq_policy=sendq_policy,
+            flood_control=FloodControl(ip_rate=ip_rate, ip_burst=ip_burst),
+            enable_metrics=metrics_port is not None,
+            casemapping=casemapping,
+            history_length=history_length,
+            tls=tls,
+            handshake_threads=handshake_threads,
+            handoff_path=handoff_path,
+        )
+        if handoff:
+            server.adopt(handoff)
+        if metrics_port is not None:
+            from foghorn.metrics import serve_metrics
+
+            serve_metrics((address[0], metrics_port))
+
+        server.serve_forever()
 
-    server = IRCServer("127.0.0.1", 1000)
-    server.serve_forever()
+    if workers > 1:
+        Supervisor(serve, workers).run()
+    else:
+        serve()
 
 
 if __name__ == "__main__":
@@ -1,9 +1,17 @@
 from ..enums import Command
 from ..typing import typecaster
 from .cap import CapCommand
+from .chathistory import ChathistoryCommand
+from .dispatch import DispatchPlan, compile_plans
 
 # from .passwd import PassCommand
+from .join import JoinCommand
+from .names import NamesCommand
 from .nick import NickCommand
+from .part import PartCommand
+from .privmsg import PrivmsgCommand
+from .stats import StatsCommand
+from .user import UserCommand
 
 COMMANDS = {
     Command.CAP: CapCommand(
@@ -27,8 +35,40 @@ COMMANDS = {
         save_context=True,
         required_post_context=Command.USER,
         allow_unregistered=True,
+        penalty=1,
+    ),
+    Command.USER: UserCommand(
+        required_params=[typecaster(str)] * 4,
+        required_pre_context=Command.NICK,
+        allow_unregistered=True,
+    ),
+    Command.JOIN: JoinCommand(
+        required_params=[typecaster(str), typecaster(str, optional=True)],
+        penalty=1,
+    ),
+    Command.PART: PartCommand(
+        required_params=[typecaster(str), typecaster(str, optional=True)],
+        penalty=1,
+    ),
+    Command.NAMES: NamesCommand(
+        required_params=[typecaster(str, optional=True)], penalty=2
+    ),
+    Command.STATS: StatsCommand(
+        required_params=[typecaster(str), typecaster(str, optional=True)], penalty=2
+    ),
+    Command.PRIVMSG: PrivmsgCommand(required_params=[typecaster(str)] * 2),
+    Command.NOTICE: PrivmsgCommand(
+        required_params=[typecaster(str)] * 2, reply_errors=False
+    ),
+    Command.CHATHISTORY: ChathistoryCommand(
+        required_params=[typecaster(str)] * 4 + [typecaster(str, optional=True)],
+        penalty=2,
     ),
-    # Command.USER: UserCommand(required_pre_context=Command.NICK),
 }
 
-__all__ = ["COMMANDS"]
+# the plans every line is dispatched by, and the raw verbs of the commands implemented,
+# so lines of any others are rejected before they're parsed any further
+PLANS = compile_plans(COMMANDS)
+VERBS = {verb.name.encode("utf-8"): verb for verb in PLANS}
+
+__all__ = ["COMMANDS", "PLANS", "VERBS", "DispatchPlan"]
@@ -2,10 +2,10 @@ from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from typing import Any, Callable, List, Optional, Union
 
-from redis import Redis
-
+from ..bus import MessageBus
 from ..enums import Command
 from ..message import Message
+from ..storage import ClientState, StorageBackend
 
 
 @dataclass(frozen=True)  # type: ignore[misc]
@@ -18,20 +18,26 @@ class BaseCommand(ABC):
     required_post_context: Optional[Union[Command, Callable[[Command], bool]]] = None
     # if the command can be run by an unregistered client
     allow_unregistered: bool = False
+    # the tokens charged by flood control on top of those for the line itself, for
+    # commands more expensive to handle than most
+    penalty: float = 0
 
     @abstractmethod
     def respond(
         self,
-        client_key: str,
+        client: ClientState,
         message: Message,
-        redis: Redis,
+        storage: StorageBackend,
         casted_params: List[Any] = None,
         prev_message: Message = None,
-    ) -> Optional[Message]:
+        bus: Optional[MessageBus] = None,
+    ) -> Optional[Union[Message, List[Message]]]:
         """
-        Optionally responds to the provided message, optionally storing correlated
-        information in the given Redis session. Each Redis session is isolated within
-        the specific response context, which runs under a unique greenlet for every
-        incoming packet.
+        Optionally responds to the provided message, with one or several messages in
+        order, optionally updating the state of the client or storing correlated
+        information in the given storage session. Each storage session is isolated
+        within the specific response context, which runs under a unique greenlet for
+        every incoming packet. Messages for other clients are sent through the given
+        bus.
         """
         raise NotImplementedError()
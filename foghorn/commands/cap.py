@@ -1,50 +1,51 @@
 from dataclasses import dataclass
-from typing import Any, List, Optional
-
-from redis import Redis
+from typing import Any, List, Optional, Union
 
+from ..bus import MessageBus
+from ..capabilities import CAPABILITIES, MULTILINE_VERSION, ack, enabled_caps
 from ..enums import Capabilities, CapSubCommand, ClientStatus, Command, ErrorCode
 from ..errors import ProtocolException
 from ..message import Message
-from ..parsing import ANY_CLIENT, PARAM_PREFIX, REMOVE_CAP_PREFIX
-from ..storage import (
-    CAP_DELIMITER,
-    CLIENT_CAPS_RKEY,
-    CLIENT_STATUS_RKEY,
-    CLIENT_VERSION_RKEY,
-    STATUS_DELIMITER,
-    get_statuses,
-)
-from ..utils import transform
+from ..parsing import ANY_CLIENT, ATOM_DELIMITER, REMOVE_CAP_PREFIX
+from ..storage import ClientState, StorageBackend
+from ..utils import compose
 from .base import BaseCommand
+from .user import register
+
+# the casts of the parameters of every subcommand expecting any, by name
+CASTS = {
+    name: compose(command.params)
+    for name, command in CapSubCommand.__members__.items()
+    if command.params
+}
 
 
 @dataclass(frozen=True)
 class CapCommand(BaseCommand):
     def respond(
         self,
-        client_key: str,
+        client: ClientState,
         message: Message,
-        redis: Redis,
+        storage: StorageBackend,
         casted_params: List[Any] = None,
         prev_message: Message = None,
-    ) -> Optional[Message]:
+        bus: Optional[MessageBus] = None,
+    ) -> Optional[Union[Message, List[Message]]]:
         if not message.params:
             raise ProtocolException(ErrorCode.ERR_NEEDMOREPARAMS)
 
         # ensure valid command
         _command = message.params[0].upper()
-        if _command not in CapSubCommand.__members__.keys():
+        command = CapSubCommand.__members__.get(_command)
+        if command is None:
             raise ProtocolException(
                 ErrorCode.ERR_INVALIDCAPCMD,
                 params=[ANY_CLIENT, _command],
             )
-        else:
-            command = CapSubCommand[_command]
 
         # if the subcommand expects parameters, transform them
-        if command.value:
-            casted_params = transform(command.value, message.params[1:])
+        if command.params:
+            casted_params = CASTS[_command](message.params[1:])
 
         # initiate capability negotiation
         if command == CapSubCommand.LS or command == CapSubCommand.REQ:
@@ -53,45 +54,47 @@ class CapCommand(BaseCommand):
             # the beginning of a negotiation, as it may have happened already, so
             # we need to keep track of both the previous and new status
             # to ensure we set it back correctly when negotiation completes.
-            statuses = get_statuses(redis, client_key)
-            if statuses[0] != ClientStatus.NEGOTIATING:
-                redis.hset(
-                    client_key,
-                    CLIENT_STATUS_RKEY,
-                    ClientStatus.NEGOTIATING + STATUS_DELIMITER + statuses[0],
-                )
-
-            assert casted_params  # calm down mypy
+            status = client.statuses[0]
+            if status is not ClientStatus.NEGOTIATING:
+                client.statuses = [ClientStatus.NEGOTIATING, status]
+
+            assert casted_params is not None  # calm down mypy
             if command == CapSubCommand.LS:
                 version = casted_params[0] or 300
 
                 # set the client negotiation if one is not set, or if the client
                 # has indicated a higher version that currently registered
-                if (redis.hget(client_key, CLIENT_VERSION_RKEY) or -1) < version:
-                    redis.hset(client_key, CLIENT_VERSION_RKEY, version)
-
-                return Message(
-                    verb=Command.CAP,
-                    params=[
-                        ANY_CLIENT,
-                        CapSubCommand.LS.name,
-                        *[cap.value for cap in Capabilities],
-                    ],
-                )
+                if (client.version or -1) < version:
+                    client.version = version
+                    # negotiating version 302 implicitly enables cap-notify
+                    if bus and version >= MULTILINE_VERSION:
+                        bus.index_caps(client, enabled_caps(client))
+
+                # the replies are shared by every client negotiating the version
+                return CAPABILITIES.ls(client.version or version)
             elif command == CapSubCommand.REQ:
-                # if the first parameter doesn't start with the prefix it isn't valid
-                if casted_params[0][0] != PARAM_PREFIX:
+                # the requested capabilities are space-separated, usually within a
+                # single trailing parameter
+                req_caps = set(ATOM_DELIMITER.join(casted_params).split())
+                if not req_caps:
                     raise ProtocolException(ErrorCode.ERR_NEEDMOREPARAMS)
 
-                req_caps = set(casted_params[0][1:] + casted_params[1:])
                 caps_to_add = {cap for cap in req_caps if cap[0] != REMOVE_CAP_PREFIX}
-                caps_to_remove = req_caps - caps_to_add
+                # ensure to strip the removal prefix from the caps to remove
+                caps_to_remove = {cap[1:] for cap in req_caps - caps_to_add}
 
                 # if the client requests a capability we don't offer, including those
-                # with values, reject the entire request. ensure to strip the removal
-                # prefix from the caps to remove before checking the set inclusion
-                if not (caps_to_add | ({cap[1:] for cap in caps_to_remove})).issubset(
-                    {c.value for c in Capabilities}
+                # with values, reject the entire request. cap-notify can't be disabled
+                # by clients that enabled it implicitly either
+                to_add = [CAPABILITIES.get(cap) for cap in caps_to_add]
+                to_remove = [CAPABILITIES.get(cap) for cap in caps_to_remove]
+                if (
+                    None in to_add
+                    or None in to_remove
+                    or (
+                        Capabilities.CAP_NOTIFY in to_remove
+                        and (client.version or 0) >= MULTILINE_VERSION
+                    )
                 ):
                     return Message(
                         verb=Command.CAP,
@@ -100,31 +103,29 @@ class CapCommand(BaseCommand):
                 else:
                     # add or remove client capabilities, store them, and accept the
                     # request
-                    current_caps = set(
-                        (redis.hget(client_key, CLIENT_CAPS_RKEY) or "").split(
-                            CAP_DELIMITER
-                        )
-                    )
+                    current_caps = set(client.caps)
 
                     # assume deletions take precedence over additions to ensure we
                     # don't add a capability when it should be removed. this is only
                     # a problem if a client asks to add and remove the same cap in
                     # the same message
-                    current_caps.update(caps_to_add)
-                    current_caps.difference_update(caps_to_remove)
+                    current_caps.update(to_add)  # type: ignore[arg-type]
+                    current_caps.difference_update(to_remove)
 
-                    redis.hset(
-                        client_key, CLIENT_CAPS_RKEY, CAP_DELIMITER.join(current_caps)
-                    )
-                    return Message(
-                        verb=Command.CAP,
-                        params=[ANY_CLIENT, CapSubCommand.ACK.name, *current_caps],
-                    )
+                    client.caps = current_caps
+                    if bus:
+                        bus.index_caps(client, enabled_caps(client))
+
+                    # every client requesting the same caps is sent the same reply
+                    return ack(frozenset(req_caps))
         elif command == CapSubCommand.END:
             # if the client was negotiating, change their status back to what it was
             # before
-            statuses = get_statuses(redis, client_key)
-            if statuses[0] == ClientStatus.NEGOTIATING:
-                redis.hset(client_key, CLIENT_STATUS_RKEY, statuses[1])
+            if client.statuses[0] is ClientStatus.NEGOTIATING:
+                client.statuses = client.statuses[1:]
+
+                # clients that sent USER while negotiating only register now, and
+                # those that registered before negotiating aren't welcomed again
+                return register(client)
 
         return None
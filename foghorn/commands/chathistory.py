@@ -0,0 +1,154 @@
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import count
+from typing import Any, List, Optional, Tuple, Union
+
+from ..bus import MessageBus
+from ..enums import Capabilities, Command, ErrorCode
+from ..errors import ProtocolException
+from ..message import Message
+from ..parsing import ANY_CLIENT, CHANNEL_PREFIXES, TAG_DELIMITER, TAG_PREFIX
+from ..storage import ClientState, StorageBackend, parse_history_id
+from .base import BaseCommand
+
+# the subcommands selecting lines, all but AROUND and TARGETS
+SUBCOMMANDS = ("LATEST", "BEFORE", "AFTER", "BETWEEN")
+# the most lines replayed by a single request
+MAX_LIMIT = 100
+# the type of batch lines of history are replayed in
+# https://ircv3.net/specs/extensions/chathistory
+BATCH_TYPE = "chathistory"
+# the criteria selecting a line either by its message id or its time
+MSGID_CRITERIA = "msgid="
+TIMESTAMP_CRITERIA = "timestamp="
+# the highest sequence number of a history id, so the bound right after every line
+# sent within the same millisecond
+MAX_SEQUENCE = 2**64 - 1
+
+_TAG_PREFIX = TAG_PREFIX.encode("utf-8")
+_TAG_DELIMITER = TAG_DELIMITER.encode("utf-8")
+
+# batches only need to be unique per connection, so they're simply counted
+_batch_refs = count(1)
+
+
+def parse_criteria(criteria: str, after: bool) -> str:
+    """
+    Returns the history id bounding the lines selected by the given criteria, on the
+    given side of it. Raises a ValueError if the criteria are malformed.
+    """
+    if criteria.startswith(MSGID_CRITERIA):
+        return criteria[len(MSGID_CRITERIA) :]
+    elif not criteria.startswith(TIMESTAMP_CRITERIA):
+        raise ValueError(criteria)
+
+    timestamp = criteria[len(TIMESTAMP_CRITERIA) :].replace("Z", "+00:00")
+    ms = int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+    # lines are bounded by the whole millisecond they were sent within
+    return f"{ms}-{MAX_SEQUENCE}" if after else f"{ms}-0"
+
+
+@dataclass(frozen=True)
+class ChathistoryCommand(BaseCommand):
+    def respond(
+        self,
+        client: ClientState,
+        message: Message,
+        storage: StorageBackend,
+        casted_params: List[Any] = None,
+        prev_message: Message = None,
+        bus: Optional[MessageBus] = None,
+    ) -> Optional[Union[Message, List[Message]]]:
+        assert casted_params and bus and client.nickname  # calm down mypy
+
+        subcommand, target, *criteria, limit = (
+            param for param in casted_params if param is not None
+        )
+        subcommand = subcommand.upper()
+        if subcommand not in SUBCOMMANDS:
+            raise ProtocolException(
+                ErrorCode.ERR_UNKNOWNERROR, msg=f"Unknown subcommand {subcommand}."
+            )
+        # only channels have a history, since private messages aren't kept
+        if not target.startswith(CHANNEL_PREFIXES):
+            raise ProtocolException(
+                ErrorCode.ERR_NOSUCHCHANNEL, params=[client.nickname, target]
+            )
+        if target not in client.channels:
+            raise ProtocolException(
+                ErrorCode.ERR_NOTONCHANNEL, params=[client.nickname, target]
+            )
+
+        try:
+            after, before, latest = self._bounds(subcommand, criteria)
+            limit = int(limit)
+            if limit < 1:
+                raise ValueError(limit)
+
+            lines = bus.history.read(
+                target, after, before, min(limit, MAX_LIMIT), latest, storage
+            )
+        except ValueError:
+            raise ProtocolException(ErrorCode.ERR_NEEDMOREPARAMS)
+
+        batched = Capabilities.BATCH in client.caps
+        tagged = Capabilities.MESSAGE_TAGS in client.caps
+        ref = str(next(_batch_refs))
+
+        # lines are replayed as they were stored, only prefixed with their tags
+        batch_tag = f"batch={ref}".encode("utf-8")
+        replies = []
+        for tags, line in lines:
+            if batched and tagged:
+                line = b"%s%s%s%s %s" % (
+                    _TAG_PREFIX,
+                    batch_tag,
+                    _TAG_DELIMITER,
+                    tags,
+                    line,
+                )
+            elif batched or tagged:
+                line = b"%s%s %s" % (_TAG_PREFIX, batch_tag if batched else tags, line)
+            replies.append(Message.serialized(message.verb, line))
+
+        if not batched:
+            return replies
+
+        return [
+            Message(verb=Command.BATCH, params=[f"+{ref}", BATCH_TYPE, target]),
+            *replies,
+            Message(verb=Command.BATCH, params=[f"-{ref}"]),
+        ]
+
+    @staticmethod
+    def _bounds(
+        subcommand: str, criteria: List[str]
+    ) -> Tuple[Optional[str], Optional[str], bool]:
+        """
+        Returns the history ids the lines asked for are between, and if the latest of
+        those lines are asked for rather than the earliest. Raises a ValueError if the
+        criteria don't match the subcommand.
+        """
+        if subcommand == "BETWEEN" and len(criteria) == 2:
+            start, end = criteria
+            # lines are taken starting from the first bound, towards the second one
+            if parse_history_id(parse_criteria(start, True)) <= parse_history_id(
+                parse_criteria(end, True)
+            ):
+                return parse_criteria(start, True), parse_criteria(end, False), False
+
+            return parse_criteria(end, True), parse_criteria(start, False), True
+        elif len(criteria) != 1:
+            raise ValueError(criteria)
+
+        (bound,) = criteria
+        if subcommand == "LATEST":
+            return (
+                None if bound == ANY_CLIENT else parse_criteria(bound, True),
+                None,
+                True,
+            )
+        elif subcommand == "BEFORE":
+            return None, parse_criteria(bound, False), True
+
+        return parse_criteria(bound, True), None, False
@@ -0,0 +1,58 @@
+"""
+Dispatch plans of every command, compiled once from the declarative options of their
+executors, so that handling a line only takes a single lookup of its plan and
+straight-line checks against it.
+"""
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, Optional
+
+from ..enums import Command
+from ..typing import DATACLASS_SLOTS, slotted
+from ..utils import compose
+from .base import BaseCommand
+
+
+@slotted
+@dataclass(frozen=True, **DATACLASS_SLOTS)
+class DispatchPlan:
+    verb: Command
+    executor: BaseCommand
+    # casts all the parameters of a message at once, if the command takes any
+    cast: Optional[Callable[[List[str]], List[Any]]]
+    # the commands allowed to precede and follow this one, if they're restricted
+    predecessors: Optional[FrozenSet[Command]]
+    successors: Optional[FrozenSet[Command]]
+    allow_unregistered: bool
+    save_context: bool
+    penalty: float
+
+
+def _allowed(context: Any) -> Optional[FrozenSet[Command]]:
+    """Returns every command satisfying the given context, if it's restricted."""
+    if not context:
+        return None
+    elif callable(context):
+        return frozenset(verb for verb in Command if context(verb))
+
+    return frozenset((context,))
+
+
+def compile_plans(
+    commands: Mapping[Command, BaseCommand]
+) -> Dict[Command, DispatchPlan]:
+    """Compiles the dispatch plan of every given command."""
+    return {
+        verb: DispatchPlan(
+            verb=verb,
+            executor=executor,
+            cast=(
+                compose(executor.required_params) if executor.required_params else None
+            ),
+            predecessors=_allowed(executor.required_pre_context),
+            successors=_allowed(executor.required_post_context),
+            allow_unregistered=executor.allow_unregistered,
+            save_context=executor.save_context,
+            penalty=executor.penalty,
+        )
+        for verb, executor in commands.items()
+    }
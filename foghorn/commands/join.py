@@ -0,0 +1,55 @@
+from dataclasses import dataclass
+from typing import Any, List, Optional, Union
+
+from ..bus import MessageBus
+from ..enums import ErrorCode
+from ..errors import ProtocolException
+from ..message import Message
+from ..parsing import CHANNEL_PREFIXES, TARGET_DELIMITER
+from ..storage import ClientState, StorageBackend
+from .base import BaseCommand
+from .names import names_replies
+
+
+@dataclass(frozen=True)
+class JoinCommand(BaseCommand):
+    def respond(
+        self,
+        client: ClientState,
+        message: Message,
+        storage: StorageBackend,
+        casted_params: List[Any] = None,
+        prev_message: Message = None,
+        bus: Optional[MessageBus] = None,
+    ) -> Optional[Union[Message, List[Message]]]:
+        assert casted_params and bus and client.nickname  # calm down mypy
+
+        # channel keys are ignored, since there are no channel modes yet
+        channels = casted_params[0].split(TARGET_DELIMITER)
+        for channel in channels:
+            # names can't contain spaces or commas, since they'd already have been
+            # split on them
+            if not channel.startswith(CHANNEL_PREFIXES) or len(channel) < 2:
+                raise ProtocolException(
+                    ErrorCode.ERR_NOSUCHCHANNEL, params=[client.nickname, channel]
+                )
+
+        replies: List[Message] = []
+        for channel in channels:
+            if channel in client.channels:
+                continue
+
+            # every other member is told about the new one, which gets its own copy
+            # of the same message in order with the rest of its replies
+            joined = Message(
+                verb=message.verb, source=client.nickname, params=[channel]
+            )
+            bus.join(channel, client, storage)
+            bus.broadcast(channel, joined.to_bytes(), storage, exclude=client)
+
+            replies.append(joined)
+            replies.extend(
+                names_replies(client.nickname, channel, bus.members(channel, storage))
+            )
+
+        return replies
@@ -0,0 +1,94 @@
+from dataclasses import dataclass
+from typing import Any, Iterable, List, Optional, Union
+
+from ..bus import MessageBus
+from ..enums import ReplyCode
+from ..message import Message
+from ..parsing import (
+    ANY_CLIENT,
+    ATOM_DELIMITER,
+    MAX_MESSAGE_LENGTH,
+    MSG_DELIMITER,
+    TARGET_DELIMITER,
+)
+from ..storage import ClientState, StorageBackend
+from .base import BaseCommand
+
+# every channel is public, since there are no channel modes yet
+PUBLIC_CHANNEL_SYMBOL = "="
+
+
+def names_replies(nickname: str, channel: str, names: Iterable[str]) -> List[Message]:
+    """
+    Pages the given names of the members of a channel into as few replies as fit
+    within the maximum message length, followed by the end of the list.
+    """
+    head = f"{ReplyCode.RPL_NAMREPLY.numeric:03} {nickname} {PUBLIC_CHANNEL_SYMBOL} "
+    # the names are in the trailing parameter, including its prefix
+    budget = (
+        MAX_MESSAGE_LENGTH
+        - len(MSG_DELIMITER)
+        - len(f"{head}{channel} :".encode("utf-8"))
+    )
+
+    def _page(page: List[str]) -> Message:
+        return Message(
+            verb=ReplyCode.RPL_NAMREPLY.numeric,
+            params=[
+                nickname,
+                PUBLIC_CHANNEL_SYMBOL,
+                channel,
+                ATOM_DELIMITER.join(page),
+            ],
+        )
+
+    replies, page, size = [], [], 0
+    for name in names:
+        length = len(name.encode("utf-8"))
+        if page and size + len(ATOM_DELIMITER) + length > budget:
+            replies.append(_page(page))
+            page, size = [], 0
+
+        size += length + (len(ATOM_DELIMITER) if page else 0)
+        page.append(name)
+
+    if page:
+        replies.append(_page(page))
+
+    replies.append(
+        Message(
+            verb=ReplyCode.RPL_ENDOFNAMES.numeric,
+            params=[nickname, channel, ReplyCode.RPL_ENDOFNAMES.msg],
+        )
+    )
+    return replies
+
+
+@dataclass(frozen=True)
+class NamesCommand(BaseCommand):
+    def respond(
+        self,
+        client: ClientState,
+        message: Message,
+        storage: StorageBackend,
+        casted_params: List[Any] = None,
+        prev_message: Message = None,
+        bus: Optional[MessageBus] = None,
+    ) -> Optional[Union[Message, List[Message]]]:
+        assert casted_params and bus and client.nickname  # calm down mypy
+
+        channels = casted_params[0]
+        if not channels:
+            # listing every channel isn't supported, so the list is always empty
+            return Message(
+                verb=ReplyCode.RPL_ENDOFNAMES.numeric,
+                params=[client.nickname, ANY_CLIENT, ReplyCode.RPL_ENDOFNAMES.msg],
+            )
+
+        replies = []
+        for channel in channels.split(TARGET_DELIMITER):
+            replies.extend(
+                names_replies(client.nickname, channel, bus.members(channel, storage))
+            )
+
+        return replies
@@ -1,24 +1,26 @@
 from dataclasses import dataclass
 from typing import Any, List, Optional
 
-from redis import Redis
-
+from ..bus import MessageBus
 from ..enums import ErrorCode
 from ..errors import ProtocolException
 from ..message import Message
 from ..parsing import INVALID_CHARACTER_PATTERN
+from ..storage import ClientState, StorageBackend
 from .base import BaseCommand
+from .user import register
 
 
 @dataclass(frozen=True)
 class NickCommand(BaseCommand):
     def respond(
         self,
-        client_key: str,
+        client: ClientState,
         message: Message,
-        redis: Redis,
+        storage: StorageBackend,
         casted_params: List[Any] = None,
         prev_message: Message = None,
+        bus: Optional[MessageBus] = None,
     ) -> Optional[Message]:
         assert casted_params
 
@@ -27,7 +29,26 @@ class NickCommand(BaseCommand):
             # no nickname supplied
             raise ProtocolException(ErrorCode.ERR_NONICKNAMEGIVEN)
         elif INVALID_CHARACTER_PATTERN.search(nickname):
-            # an invalid nickname was supplied (contains special characters except '-')
+            # an invalid nickname was supplied (with characters RFC 2812 forbids)
             raise ProtocolException(ErrorCode.ERR_ERRONEUSNICKNAME)
 
-        return None
+        assert bus  # calm down mypy
+        # the new nickname is claimed before the previous one is freed, so the client
+        # can always be addressed by one of them
+        if not bus.nicks.claim(nickname, client.key, bus.node, storage):
+            # the nickname is being used by another client
+            raise ProtocolException(ErrorCode.ERR_NICKNAMEINUSE, params=[nickname])
+
+        if client.nickname:
+            # changing the case of a nickname keeps the same claim
+            if bus.nicks.fold(client.nickname) != bus.nicks.fold(nickname):
+                bus.nicks.release(client.nickname, client.key, bus.node, storage)
+
+            # the client is listed under its new nickname in all of its channels
+            for channel in client.channels:
+                storage.part_channel(channel, client.nickname)
+                storage.join_channel(channel, nickname, bus.node)
+
+        client.nickname = nickname
+        # clients that sent USER before a nickname they could use register now
+        return register(client)
@@ -0,0 +1,46 @@
+from dataclasses import dataclass
+from typing import Any, List, Optional, Union
+
+from ..bus import MessageBus
+from ..enums import ErrorCode
+from ..errors import ProtocolException
+from ..message import Message
+from ..parsing import TARGET_DELIMITER
+from ..storage import ClientState, StorageBackend
+from .base import BaseCommand
+
+
+@dataclass(frozen=True)
+class PartCommand(BaseCommand):
+    def respond(
+        self,
+        client: ClientState,
+        message: Message,
+        storage: StorageBackend,
+        casted_params: List[Any] = None,
+        prev_message: Message = None,
+        bus: Optional[MessageBus] = None,
+    ) -> Optional[Union[Message, List[Message]]]:
+        assert casted_params and bus and client.nickname  # calm down mypy
+
+        channels, reason = casted_params
+        # parting the same channel twice in one message is parting it once
+        channels = list(dict.fromkeys(channels.split(TARGET_DELIMITER)))
+        for channel in channels:
+            if channel not in client.channels:
+                raise ProtocolException(
+                    ErrorCode.ERR_NOTONCHANNEL, params=[client.nickname, channel]
+                )
+
+        replies = []
+        for channel in channels:
+            parted = Message(
+                verb=message.verb,
+                source=client.nickname,
+                params=[channel, reason] if reason else [channel],
+            )
+            bus.broadcast(channel, parted.to_bytes(), storage, exclude=client)
+            bus.part(channel, client, storage)
+            replies.append(parted)
+
+        return replies
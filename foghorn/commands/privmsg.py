@@ -0,0 +1,58 @@
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from ..bus import MessageBus
+from ..enums import ErrorCode
+from ..errors import ProtocolException
+from ..message import Message
+from ..parsing import CHANNEL_PREFIXES, TARGET_DELIMITER
+from ..storage import ClientState, StorageBackend
+from .base import BaseCommand
+
+
+@dataclass(frozen=True)
+class PrivmsgCommand(BaseCommand):
+    # notices must never be replied to automatically, including with errors
+    reply_errors: bool = True
+
+    def respond(
+        self,
+        client: ClientState,
+        message: Message,
+        storage: StorageBackend,
+        casted_params: List[Any] = None,
+        prev_message: Message = None,
+        bus: Optional[MessageBus] = None,
+    ) -> Optional[Message]:
+        assert casted_params and bus  # calm down mypy
+
+        targets, text = casted_params
+        error = None
+        for target in targets.split(TARGET_DELIMITER):
+            # every message is serialized once, regardless of how many recipients
+            # it's delivered to
+            line = Message(
+                verb=message.verb, source=client.nickname, params=[target, text]
+            ).to_bytes()
+
+            # deliver to every target that exists, even if some of them don't
+            if target.startswith(CHANNEL_PREFIXES):
+                if target in client.channels:
+                    bus.broadcast(target, line, storage, exclude=client)
+                    bus.history.append(target, line, storage)
+                elif error is None:
+                    error = ProtocolException(
+                        ErrorCode.ERR_CANNOTSENDTOCHAN,
+                        params=[client.nickname, target],
+                    )
+            else:
+                key = bus.nicks.find(target, storage)
+                if not (key and bus.send(key, line, storage)) and error is None:
+                    error = ProtocolException(
+                        ErrorCode.ERR_NOSUCHNICK, params=[client.nickname, target]
+                    )
+
+        if error and self.reply_errors:
+            raise error
+
+        return None
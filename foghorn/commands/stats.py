@@ -0,0 +1,95 @@
+import ipaddress
+import time
+from dataclasses import dataclass
+from typing import Any, List, Optional, Union
+
+from .. import metrics
+from ..bus import MessageBus
+from ..enums import Command, ErrorCode, ReplyCode
+from ..errors import ProtocolException
+from ..message import Message
+from ..profiling import PROFILER
+from ..storage import ClientState, StorageBackend
+from .base import BaseCommand
+
+# the queries with replies of their own, any others only being answered with the end
+# of the report
+COMMANDS_QUERY = "m"
+UPTIME_QUERY = "u"
+# toggles profiling rather than reporting anything
+PROFILE_QUERY = "p"
+
+
+def _is_local(client: ClientState) -> bool:
+    # there are no operators yet, so only clients connected from the server's own
+    # host are trusted
+    host = client.key.partition(":")[2].rpartition("@")[0]
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+@dataclass(frozen=True)
+class StatsCommand(BaseCommand):
+    def respond(
+        self,
+        client: ClientState,
+        message: Message,
+        storage: StorageBackend,
+        casted_params: List[Any] = None,
+        prev_message: Message = None,
+        bus: Optional[MessageBus] = None,
+    ) -> Optional[Union[Message, List[Message]]]:
+        assert casted_params and client.nickname  # calm down mypy
+
+        # there's only ever this server to query, so the server is ignored
+        query = casted_params[0]
+        replies = []
+        if query == COMMANDS_QUERY:
+            # commands are only counted while metrics are enabled
+            replies = [
+                Message(
+                    verb=ReplyCode.RPL_STATSCOMMANDS.numeric,
+                    params=[client.nickname, command, str(int(count))],
+                )
+                for command, count in sorted(metrics.LINES.values().items())
+            ]
+        elif query == UPTIME_QUERY:
+            minutes, seconds = divmod(int(time.time() - metrics.STARTED), 60)
+            hours, minutes = divmod(minutes, 60)
+            days, hours = divmod(hours, 24)
+            replies = [
+                Message(
+                    verb=ReplyCode.RPL_STATSUPTIME.numeric,
+                    params=[
+                        client.nickname,
+                        f"Server Up {days} days {hours}:{minutes:02}:{seconds:02}",
+                    ],
+                )
+            ]
+        elif query == PROFILE_QUERY:
+            # every client may appear local behind a proxy, so profiling must also
+            # have been allowed when the server was started
+            if not PROFILER.allowed or not _is_local(client):
+                raise ProtocolException(ErrorCode.ERR_NOPRIVILEGES)
+
+            if PROFILER.enabled:
+                path = PROFILER.disable()
+                status = (
+                    f"Profiling disabled, {PROFILER.samples} lines sampled, "
+                    f"dumped to {path}"
+                )
+            else:
+                PROFILER.enable()
+                status = f"Profiling enabled, sampling {PROFILER.rate:.2%} of lines"
+
+            replies = [Message(verb=Command.NOTICE, params=[client.nickname, status])]
+
+        replies.append(
+            Message(
+                verb=ReplyCode.RPL_ENDOFSTATS.numeric,
+                params=[client.nickname, query, ReplyCode.RPL_ENDOFSTATS.msg],
+            )
+        )
+        return replies
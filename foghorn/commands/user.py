@@ -0,0 +1,54 @@
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from ..bus import MessageBus
+from ..enums import ClientStatus, ErrorCode, ReplyCode
+from ..errors import ProtocolException
+from ..message import Message
+from ..storage import ClientState, StorageBackend
+from .base import BaseCommand
+
+
+def welcome(client: ClientState) -> Message:
+    """Returns the reply welcoming a client that just registered."""
+    return Message(
+        verb=ReplyCode.RPL_WELCOME.numeric,
+        params=[client.nickname, f"Welcome to the Network, {client.nickname}"],
+    )
+
+
+def register(client: ClientState) -> Optional[Message]:
+    """
+    Registers the client once it has both a nickname and a username, returning the
+    reply welcoming it if it's now registered.
+    """
+    if not (client.nickname and client.username):
+        return None
+    elif client.statuses[0] is not ClientStatus.UNREGISTERED:
+        # the client registered already, or is still negotiating capabilities, and
+        # only registers once negotiation ends
+        return None
+
+    client.statuses = [ClientStatus.REGISTERED, *client.statuses[1:]]
+    return welcome(client)
+
+
+@dataclass(frozen=True)
+class UserCommand(BaseCommand):
+    def respond(
+        self,
+        client: ClientState,
+        message: Message,
+        storage: StorageBackend,
+        casted_params: List[Any] = None,
+        prev_message: Message = None,
+        bus: Optional[MessageBus] = None,
+    ) -> Optional[Message]:
+        assert casted_params  # calm down mypy
+
+        if client.username:
+            raise ProtocolException(ErrorCode.ERR_ALREADYREGISTERED)
+
+        # the mode and unused parameters are ignored, as is the realname
+        client.username = casted_params[0]
+        return register(client)
@@ -0,0 +1,357 @@
+"""
+The handling of clients shared by every server engine, regardless of how connections
+are accepted, read from, and written to.
+"""
+# the standard library is patched before anything else is imported
+from . import patching  # noqa: F401
+
+import time
+from itertools import chain
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
+
+from . import metrics
+from .bus import MessageBus
+from .capabilities import CAPABILITIES, enabled_caps
+from .commands import PLANS, VERBS, DispatchPlan
+from .enums import Capabilities, ClientStatus, ErrorCode
+from .errors import ProtocolException
+from .flood import FloodControl, FloodLimiter
+from .history import HISTORY_LENGTH, History
+from .message import Message
+from .nicks import CaseMapping, NickRegistry
+from .profiling import PROFILER, StageTimer
+from .storage import ClientState, StorageBackend, client_rkey
+from .typing import Address
+
+IRC_PORT = 6697
+# the statuses of a client allowed to run any command
+REGISTERED = [ClientStatus.REGISTERED]
+
+
+class IRCCore:
+    """
+    Keeps the state of every connected client, and handles the lines they send.
+    Engines only have to feed the lines of every connection through `handle_batch`,
+    and write whatever it returns back to it.
+    """
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        sync_storage: bool = False,
+        flood_control: Optional[FloodControl] = None,
+        enable_metrics: bool = False,
+        casemapping: CaseMapping = CaseMapping.RFC1459,
+        history_length: int = HISTORY_LENGTH,
+    ):
+        # the last message of every client expecting another to follow it, with the plan
+        # it was dispatched by
+        self._previous_messages: Dict[Address, Tuple[Message, DispatchPlan]] = {}
+        self._clients: Dict[Address, ClientState] = {}
+        self._limiters: Dict[Address, FloodLimiter] = {}
+        # if client state should be mirrored to storage after every message, rather
+        # than once after each batch
+        self._sync_storage = sync_storage
+        self.flood_control = flood_control or FloodControl()
+        self._storage = storage
+        # every worker is a node of its own, delivering messages to its own clients
+        self._bus = MessageBus(
+            self._storage,
+            nicks=NickRegistry(casemapping),
+            history=History(history_length),
+        )
+
+        # nothing is measured unless metrics are enabled, so they cost nothing
+        # otherwise
+        self._metrics = enable_metrics
+        if enable_metrics:
+            flood = self.flood_control
+            metrics.CONNECTIONS.set_function(lambda: len(self._clients))
+            metrics.FLOOD_THROTTLED.set_function(lambda: flood.throttled)
+            metrics.FLOOD_DEFERRED_SECONDS.set_function(lambda: flood.deferred)
+
+    def connect(self, address: Address, write: Callable[[bytes], None]) -> FloodLimiter:
+        """
+        Registers a new connection from the given address, whose messages from other
+        clients are written with the given function. Returns its flood limiter.
+        """
+        limiter = self._limiters[address] = self.flood_control.connect(address)
+
+        # create an unregistered client for the new address, owned by this node
+        client = self._clients[address] = ClientState(
+            client_rkey(address), node=self._bus.node
+        )
+        client.flush(self._storage)
+        self._bus.attach(client.key, write)
+        if self._metrics:
+            metrics.CONNECTIONS_TOTAL.inc()
+
+        return limiter
+
+    def export_client(self, address: Address) -> Dict[str, Any]:
+        """
+        Returns the state of the client connected from the given address that isn't
+        kept in storage, for another process to adopt it with, as JSON.
+        """
+        client = self._clients[address]
+        previous = self._previous_messages.get(address)
+        return {
+            "address": list(address),
+            "nickname": client.nickname,
+            "username": client.username,
+            "channels": sorted(client.channels),
+            "statuses": [status.name for status in client.statuses],
+            "caps": [cap.name for cap in client.caps],
+            "version": client.version,
+            # the message is parsed again, rather than keeping another form of it
+            "previous": previous[0].to_line() if previous else None,
+        }
+
+    def adopt_client(
+        self, state: Dict[str, Any], write: Callable[[bytes], None]
+    ) -> Tuple[Address, FloodLimiter]:
+        """
+        Adopts a client exported by another process, whose connection is now owned by
+        this node, and whose messages from other clients are written with the given
+        function. Returns its address and a fresh flood limiter.
+        """
+        address = cast(Address, tuple(state["address"]))
+        limiter = self._limiters[address] = self.flood_control.connect(address)
+
+        client = self._clients[address] = ClientState(
+            client_rkey(address), node=self._bus.node
+        )
+        client.nickname = state["nickname"]
+        client.username = state["username"]
+        client.channels = set(state["channels"])
+        client.statuses = [ClientStatus[status] for status in state["statuses"]]
+        client.caps = {Capabilities[cap] for cap in state["caps"]}
+        client.version = state["version"]
+        client.flush(self._storage)
+        self._bus.adopt(client, write)
+        self._bus.index_caps(client, enabled_caps(client))
+
+        if state["previous"] is not None:
+            msg = Message.from_line(state["previous"], VERBS)
+            self._previous_messages[address] = (msg, PLANS[msg.verb])
+
+        return address, limiter
+
+    def disconnect(self, address: Address) -> None:
+        """Deletes all traces of the client connected from the given address."""
+        client = self._clients.pop(address)
+        for channel in list(client.channels):
+            self._bus.part(channel, client, self._storage)
+        self._bus.detach(client.key)
+
+        self._bus.index_caps(client, frozenset())
+
+        del self._limiters[address]
+        self.flood_control.disconnect(address)
+        self._previous_messages.pop(address, None)
+        if client.nickname:
+            self._bus.nicks.release(
+                client.nickname, client.key, self._bus.node, self._storage
+            )
+        self._storage.delete_client(client.key)
+
+    def advertise(self, cap: Capabilities) -> None:
+        """
+        Starts advertising the given capability, notifying every client connected to
+        this node that enabled cap-notify.
+        """
+        notification = CAPABILITIES.add(cap)
+        if notification:
+            self._bus.announce(Capabilities.CAP_NOTIFY, notification.to_bytes())
+
+    def withdraw(self, cap: Capabilities) -> None:
+        """
+        Stops advertising the given capability, disabling it for every client connected
+        to this node that enabled it, and notifying every client that enabled
+        cap-notify.
+        """
+        notification = CAPABILITIES.remove(cap)
+        if not notification:
+            return
+
+        for client in self._bus.capable(cap):
+            client.caps = client.caps - {cap}
+            self._bus.index_caps(client, enabled_caps(client))
+        self._bus.announce(Capabilities.CAP_NOTIFY, notification.to_bytes())
+
+    def handle_batch(
+        self, address: Address, lines: Iterable[Optional[bytes]]
+    ) -> List[bytes]:
+        """
+        Handles a batch of incoming lines in the order they were received, using a
+        single storage session for all of them. Any changes to the client's state are
+        mirrored to storage once all of them have been handled. Returns the encoded
+        responses, in order, ready to be written together.
+
+        Every line is charged to the client's flood limiter, and handling stops early
+        once the client has to be deferred, leaving the rest of the lines unread.
+        """
+        lines = iter(lines)
+        # the session is only taken once there's a line, not for every partial read
+        for first in lines:
+            break
+        else:
+            return []
+
+        client = self._clients[address]
+        limiter = self._limiters[address]
+        responses = []
+        started = time.perf_counter() if self._metrics else 0.0
+        with self._storage.session() as storage:
+            if self._metrics:
+                metrics.STORAGE_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+            for line in chain((first,), lines):
+                limiter.charge()
+                # while profiling, a sample of lines is timed through every stage
+                timer = PROFILER.start() if PROFILER.enabled else None
+                try:
+                    if line is None:
+                        # the line was dropped while framing for being too long
+                        raise ProtocolException(ErrorCode.ERR_INPUTTOOLONG)
+
+                    resp = self.handle_message(address, line, storage, timer)
+                except UnicodeDecodeError:
+                    # as per spec impl recommendation, silently ignore any invalid
+                    # messages. this will include any messages that are encoded
+                    # validly but not UTF-8, which are caught while parsing
+                    resp = None
+                except ProtocolException as err:
+                    # if a protocol exception happened, send back the error numeric
+                    resp = self._error_response(err)
+                    if self._metrics:
+                        metrics.ERRORS.inc(err.error_code)
+                    if timer:
+                        timer.mark("error")
+
+                if isinstance(resp, list):
+                    responses.extend(r.to_bytes() for r in resp)
+                elif resp:
+                    responses.append(resp.to_bytes())
+
+                if timer:
+                    timer.mark("serialize")
+                    PROFILER.record(timer)
+
+                if self._sync_storage:
+                    client.flush(storage)
+
+                if limiter.delay():
+                    break
+
+            client.flush(storage)
+            # messages for clients of other nodes are published all at once
+            self._bus.flush(storage)
+
+        if self._metrics:
+            metrics.BATCH_SECONDS.observe(time.perf_counter() - started)
+
+        return responses
+
+    @staticmethod
+    def send(write: Callable[[bytes], None], responses: List[bytes]) -> None:
+        """Writes all the responses to a batch at once with the given function."""
+        if not responses:
+            return
+        elif not PROFILER.enabled:
+            write(b"".join(responses))
+            return
+
+        started = time.perf_counter()
+        write(b"".join(responses))
+        PROFILER.add("send", time.perf_counter() - started)
+
+    @staticmethod
+    def _error_response(err: ProtocolException) -> Message:
+        return Message(verb=err.numeric, params=err.params + [err.msg])
+
+    def handle_message(
+        self,
+        address: Address,
+        line: bytes,
+        storage: StorageBackend,
+        timer: Optional[StageTimer] = None,
+    ) -> Optional[Union[Message, List[Message]]]:
+        msg = Message.from_line(line, VERBS)
+        plan = PLANS[msg.verb]
+        if timer:
+            timer.command = msg.verb
+            timer.mark("parse")
+        if self._metrics:
+            metrics.LINES.inc(msg.verb)
+        if plan.penalty:
+            self._limiters[address].charge(plan.penalty)
+
+        # ensure that the client is registered unless the command allows
+        # them to be unregistered (for commands sent in order to register)
+        client = self._clients[address]
+        if not plan.allow_unregistered and client.statuses != REGISTERED:
+            raise ProtocolException(ErrorCode.ERR_NOTREGISTERED)
+        if timer:
+            timer.mark("register")
+
+        # attempt to cast all the given parameters to their expected types
+        casted_params = plan.cast(msg.params) if plan.cast else None
+        if timer:
+            timer.mark("transform")
+
+        prev_msg = None
+        previous = self._previous_messages.pop(address, None)
+        if previous:
+            prev_msg, prev_plan = previous
+            # throw an unknown error (since no numeric is standardized) if the
+            # preceding command isn't what the current one expects, or the other way
+            # around. the order only matters while registering
+            if client.statuses != REGISTERED and (
+                (
+                    plan.predecessors is not None
+                    and prev_msg.verb not in plan.predecessors
+                )
+                or (
+                    prev_plan.successors is not None
+                    and msg.verb not in prev_plan.successors
+                )
+            ):
+                raise ProtocolException(
+                    ErrorCode.ERR_UNKNOWNERROR, msg="Unexpected command."
+                )
+        if timer:
+            timer.mark("context")
+
+        # actually process the incoming message and generate a response
+        started = time.perf_counter() if self._metrics else 0.0
+        try:
+            response = plan.executor.respond(
+                client,
+                msg,
+                storage,
+                prev_message=prev_msg,
+                casted_params=casted_params,
+                bus=self._bus,
+            )
+        finally:
+            if self._metrics:
+                metrics.COMMAND_SECONDS.observe(time.perf_counter() - started, msg.verb)
+        if timer:
+            timer.mark("respond")
+
+        # save the incoming context if requested
+        if plan.save_context:
+            self._previous_messages[address] = (msg, plan)
+
+        return response
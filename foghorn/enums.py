@@ -48,6 +48,8 @@ class Command(NoValueEnum):
     # sending
     PRIVMSG = auto()
     NOTICE = auto()
+    BATCH = auto()
+    CHATHISTORY = auto()
 
     # miscellaneous
     USERHOST = auto()
@@ -79,7 +81,10 @@ class ReplyCode(NumericEnum):
 
     RPL_BOUNCE = (10, None)
 
+    RPL_STATSCOMMANDS = (212, None)
+    RPL_ENDOFSTATS = (219, "End of /STATS report")
     RPL_UMODEIS = (221, None)
+    RPL_STATSUPTIME = (242, "Server Up <days> days <hours>:<minutes>:<seconds>")
 
     RPL_LUSERCLIENT = (251, "There are <u> users and <i> invisible on <s> servers")
     RPL_LUSEROP = (252, "operator(s) online")
@@ -227,17 +232,25 @@ class NamedComparisonEnum(Enum):
         return self.name == obj
 
 
+@unique
 class CapSubCommand(NamedComparisonEnum):
     """Capability negotiation subcommands with their client-sent expected parameters."""
 
-    LS = [typecaster(int, optional=True)]
-    LIST = None
-    REQ = [typecaster(str, many=True)]
-    ACK = None
-    NAK = None
-    END = None
-    # NEW = None
-    # DEL = None
+    def __new__(cls, *params):
+        # subcommands without parameters would otherwise all be aliases of each other
+        obj = object.__new__(cls)
+        obj._value_ = len(cls.__members__)
+        obj.params = list(params) or None
+        return obj
+
+    LS = (typecaster(int, optional=True),)
+    LIST = ()
+    REQ = (typecaster(str, many=True),)
+    ACK = ()
+    NAK = ()
+    END = ()
+    NEW = ()
+    DEL = ()
 
 
 @unique
@@ -252,9 +265,10 @@ class Capabilities(str, Enum):
     """Implemented IRC v3 capabilities for this server. https://ircv3.net/irc/"""
 
     MESSAGE_TAGS = "message-tags"
+    CAP_NOTIFY = "cap-notify"
+    BATCH = "batch"
+    CHAT_HISTORY = "draft/chathistory"
     # TYPING = "typing"
     # AWAY_NOTIFY = "away-notify"
     # STRICT_TRANSPORT_SECURITY = "sts"
-    # BATCH = "batch"
     # SERVER_TIME = "server-time"
-    # CHAT_HISTORY = "draft/chathistory"
@@ -14,7 +14,7 @@ class ProtocolException(Exception):
         self.params = params or []
         self.msg = msg or self.error_code.msg
 
-        if not msg:
+        if not self.msg:
             raise TypeError(
                 "The given error has no default message, so one must be provided."
             )
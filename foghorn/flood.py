@@ -0,0 +1,152 @@
+"""
+Flood control of incoming lines, using token buckets per connection and per IP address.
+Clients sending too fast aren't rejected, but have their lines deferred until they've
+earned enough tokens to pay for them, like the "fakelag" of classic ircds.
+"""
+import time
+from typing import Dict, Tuple
+
+from .typing import Address
+
+# every line costs a token, on top of any penalty of its command
+LINE_COST = 1.0
+# the lines per second a single connection can sustain, and how many it can send in a
+# burst before being deferred
+CLIENT_RATE = 4.0
+CLIENT_BURST = 20.0
+# the same for all the connections from a single IP address combined
+IP_RATE = 20.0
+IP_BURST = 100.0
+
+
+class TokenBucket:
+    """
+    A bucket of tokens refilled at a steady rate, up to its capacity. Tokens can be
+    taken even when there aren't enough, putting the bucket in debt until it's
+    refilled.
+    """
+
+    __slots__ = ("rate", "capacity", "_tokens", "_updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def take(self, tokens: float, now: float) -> None:
+        """Takes the given number of tokens, going into debt if there aren't enough."""
+        self._refill(now)
+        self._tokens -= tokens
+
+    def debt(self, now: float) -> float:
+        """Returns how long it'll take for the bucket to be out of debt, in seconds."""
+        self._refill(now)
+        return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+class FloodLimiter:
+    """The buckets limiting a single connection."""
+
+    __slots__ = ("_control", "_client", "_ip", "throttled")
+
+    def __init__(self, control: "FloodControl", client: TokenBucket, ip: TokenBucket):
+        self._control = control
+        self._client = client
+        self._ip = ip
+        # the number of times the connection was deferred
+        self.throttled = 0
+
+    def charge(self, tokens: float = LINE_COST) -> None:
+        """Charges the connection and its IP address for a line, or a penalty."""
+        now = time.monotonic()
+        self._client.take(tokens, now)
+        self._ip.take(tokens, now)
+        self._control.tokens += tokens
+
+    def delay(self) -> float:
+        """
+        Returns how long the connection's next line has to be deferred for, in
+        seconds. It's zero unless the connection, or its IP address, is in debt.
+        """
+        now = time.monotonic()
+        return max(self._client.debt(now), self._ip.debt(now))
+
+    def defer(self, delay: float) -> None:
+        """Records that the connection is being deferred for the given delay."""
+        self.throttled += 1
+        self._control.throttled += 1
+        self._control.deferred += delay
+
+
+class FloodControl:
+    """
+    Creates the limiters of every connection, sharing a bucket between all the
+    connections from the same IP address. All the state is kept in-process, and
+    is constant per connection.
+    """
+
+    __slots__ = (
+        "client_rate",
+        "client_burst",
+        "ip_rate",
+        "ip_burst",
+        "_ips",
+        "tokens",
+        "throttled",
+        "deferred",
+    )
+
+    def __init__(
+        self,
+        client_rate: float = CLIENT_RATE,
+        client_burst: float = CLIENT_BURST,
+        ip_rate: float = IP_RATE,
+        ip_burst: float = IP_BURST,
+    ):
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+        # the bucket of every connected IP address, with how many connections use it
+        self._ips: Dict[str, Tuple[TokenBucket, int]] = {}
+
+        # counters of the tokens charged, the times connections were deferred, and
+        # the total seconds they were deferred for
+        self.tokens = 0.0
+        self.throttled = 0
+        self.deferred = 0.0
+
+    def connect(self, address: Address) -> FloodLimiter:
+        """Returns the limiter of a new connection from the given address."""
+        bucket, connections = self._ips.get(address[0], (None, 0))
+        if bucket is None:
+            bucket = TokenBucket(self.ip_rate, self.ip_burst)
+
+        self._ips[address[0]] = (bucket, connections + 1)
+        return FloodLimiter(
+            self, TokenBucket(self.client_rate, self.client_burst), bucket
+        )
+
+    def disconnect(self, address: Address) -> None:
+        """Forgets about a closed connection from the given address."""
+        bucket, connections = self._ips[address[0]]
+        if connections > 1:
+            self._ips[address[0]] = (bucket, connections - 1)
+        else:
+            del self._ips[address[0]]
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the counters of the flood control, for tuning it."""
+        return {
+            "ips": len(self._ips),
+            "tokens": self.tokens,
+            "throttled": self.throttled,
+            "deferred": self.deferred,
+        }
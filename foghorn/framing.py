@@ -0,0 +1,124 @@
+"""
+Per-connection framing of the incoming bytestream into delimited message lines.
+
+https://modern.ircdocs.horse/index.html#message-format
+"""
+from typing import Iterator, Optional, Tuple
+
+from .parsing import MAX_MESSAGE_LENGTH, MAX_TAGS_LENGTH, MSG_DELIMITER
+from .typing import Socket
+
+# the longest line a client may send, including the tag section and the delimiter
+MAX_LINE_LENGTH = MAX_MESSAGE_LENGTH + MAX_TAGS_LENGTH
+# enough room for a few maximum length lines, so pipelined bursts are split at once
+READ_BUFFER_SIZE = 16384
+
+
+class LineFramer:
+    """
+    Splits the bytestream of a single connection into message lines. Data is received
+    directly into a preallocated buffer, and lines are extracted by slicing a view
+    over it, so every line is copied exactly once regardless of how many reads it
+    took to arrive. Lines exceeding the maximum length are discarded while framing,
+    without ever being decoded.
+    """
+
+    __slots__ = ("_buffer", "_view", "_start", "_end", "_scan", "_discarding")
+
+    def __init__(self, size: int = READ_BUFFER_SIZE):
+        # the buffer must always be able to hold a line of the maximum length in
+        # order to tell if it is too long
+        self._buffer = bytearray(max(size, MAX_LINE_LENGTH))
+        self._view = memoryview(self._buffer)
+        # the pending (unterminated) bytes are those in [_start, _end), and _scan is
+        # where the next search for a delimiter resumes from
+        self._start = self._end = self._scan = 0
+        # if the rest of the current line should be dropped once terminated
+        self._discarding = False
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def recv_into(self, socket: Socket) -> int:
+        """
+        Reads as much data as fits into the free space at the end of the buffer,
+        returning the number of bytes read. Zero is returned when the socket is closed.
+        """
+        received = socket.recv_into(self.get_buffer())
+        self.buffer_updated(received)
+        return received
+
+    def get_buffer(self) -> memoryview:
+        """
+        Returns the free space at the end of the buffer, for data to be received
+        into directly. How much of it was filled must then be passed to
+        buffer_updated.
+        """
+        if self._start == self._end:
+            # nothing is pending, so start over at the beginning for free
+            self._start = self._end = self._scan = 0
+        elif self._start and len(self._buffer) - self._end < MAX_LINE_LENGTH:
+            # shift the pending bytes to the front to make room for more. they're
+            # always shorter than a line, so this is a single small move
+            pending = self._end - self._start
+            self._view[:pending] = self._view[self._start : self._end]
+            self._scan -= self._start
+            self._start, self._end = 0, pending
+
+        return self._view[self._end :]
+
+    def buffer_updated(self, received: int) -> None:
+        """Adds the given number of bytes received into the free space to the buffer."""
+        self._end += received
+
+    def has_line(self) -> bool:
+        """
+        Returns if a complete line is buffered that lines() hasn't yielded yet, such
+        as those left once a client was deferred in the middle of a batch.
+        """
+        return self._buffer.find(MSG_DELIMITER, self._scan, self._end) >= 0
+
+    def pending(self) -> Tuple[bytes, bool]:
+        """
+        Returns the bytes received that weren't yielded as lines yet, and if the rest
+        of the current line is being dropped, for another framer to resume from.
+        """
+        return bytes(self._view[self._start : self._end]), self._discarding
+
+    def resume(self, pending: bytes, discarding: bool) -> None:
+        """Resumes framing from what another framer had pending."""
+        buffer = self.get_buffer()
+        buffer[: len(pending)] = pending
+        self.buffer_updated(len(pending))
+        self._discarding = discarding
+
+    def lines(self) -> Iterator[Optional[bytes]]:
+        """
+        Yields every complete line in the buffer, without its delimiter, in the order
+        they were received. `None` is yielded in place of a line that was too long and
+        was dropped. Incomplete lines are kept until the rest of them is received.
+        """
+        buffer = self._buffer
+        while True:
+            idx = buffer.find(MSG_DELIMITER, self._scan, self._end)
+            if idx < 0:
+                break
+
+            start = self._start
+            self._start = self._scan = idx + len(MSG_DELIMITER)
+
+            if self._discarding or self._start - start > MAX_LINE_LENGTH:
+                self._discarding = False
+                yield None
+            else:
+                yield bytes(self._view[start:idx])
+
+        # the last received byte may be the first half of a split delimiter, so the
+        # next search needs to start from it
+        self._scan = max(self._start, self._end - len(MSG_DELIMITER) + 1)
+
+        # if the pending bytes cannot become a valid line anymore, drop all but the
+        # last one and ignore the rest of the line when it's eventually terminated
+        if self._end - self._start >= MAX_LINE_LENGTH:
+            self._discarding = True
+            self._start = self._scan = self._end - 1
@@ -0,0 +1,156 @@
+"""
+Zero-downtime restarts of the gevent engine. A server started with the path of a Unix
+socket listens on it for its replacement, which connects to it on startup and is handed
+the listening socket and every client connection, passed as file descriptors
+(SCM_RIGHTS), along with the state of each client that isn't kept in storage. Nothing
+is ever closed, so clients only notice a short pause, and never reconnect.
+
+The replacement takes over the node of the server it replaces, so the records of its
+clients in storage stay valid. That storage must be shared between both processes.
+"""
+import array
+import json
+import os
+import socket
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+from gevent import GreenletExit, Timeout
+
+from .typing import Socket
+
+# how long a handoff may take, in seconds, before the server keeps its clients
+HANDOFF_TIMEOUT = 30.0
+# the most descriptors passed by a single message, being the limit of Linux
+MAX_FDS = 253
+# the state of the handoff is sent first, prefixed by its length
+HEADER = struct.Struct("!I")
+# sent along with every batch of descriptors, and to acknowledge the handoff
+FDS_MARKER = b"F"
+ACK = b"A"
+
+
+class HandedOff(GreenletExit):
+    """
+    Raised in the greenlet serving a connection once it's been handed off, which is
+    then served by another process without being disconnected.
+    """
+
+
+class Handoff:
+    """
+    What a server hands off to the one replacing it: its node, the socket it listens
+    on, and every client connection with the state of its client.
+    """
+
+    __slots__ = ("node", "listener", "connections")
+
+    def __init__(
+        self,
+        node: int,
+        listener: Socket,
+        connections: List[Tuple[Socket, Dict[str, Any]]],
+    ):
+        self.node = node
+        self.listener = listener
+        self.connections = connections
+
+
+def listen(path: str) -> Socket:
+    """
+    Listens for the next server on the Unix socket at the given path, replacing the
+    socket of any server there before.
+    """
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(1)
+    return sock
+
+
+def _recv_exactly(channel: Socket, size: int) -> bytes:
+    # the descriptors are sent right after the state, and any byte received by
+    # anything but recvmsg would discard those passed with it
+    data = b""
+    while len(data) < size:
+        chunk = channel.recv(size - len(data))
+        if not chunk:
+            raise ConnectionResetError("The handoff was cut short.")
+
+        data += chunk
+
+    return data
+
+
+def send_handoff(channel: Socket, handoff: Handoff) -> None:
+    """
+    Sends everything handed off through the given channel, waiting until the other
+    end acknowledges it has received all of it. Raises an OSError if it doesn't.
+    """
+    payload = json.dumps(
+        {
+            "node": handoff.node,
+            "connections": [state for _, state in handoff.connections],
+        }
+    ).encode()
+    channel.sendall(HEADER.pack(len(payload)) + payload)
+
+    fds = [handoff.listener.fileno()]
+    fds.extend(connection.fileno() for connection, _ in handoff.connections)
+    for i in range(0, len(fds), MAX_FDS):
+        batch = array.array("i", fds[i : i + MAX_FDS])
+        channel.sendmsg(
+            [FDS_MARKER], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, batch.tobytes())]
+        )
+
+    with Timeout(HANDOFF_TIMEOUT, TimeoutError):
+        if channel.recv(len(ACK)) != ACK:
+            raise ConnectionResetError("The handoff wasn't acknowledged.")
+
+
+def receive_handoff(channel: Socket) -> Handoff:
+    """Receives everything handed off through the given channel, and acknowledges it."""
+    (size,) = HEADER.unpack(_recv_exactly(channel, HEADER.size))
+    state = json.loads(_recv_exactly(channel, size))
+
+    fds = array.array("i")
+    expected = len(state["connections"]) + 1
+    while len(fds) < expected:
+        marker, ancdata, flags, _ = channel.recvmsg(
+            len(FDS_MARKER), socket.CMSG_SPACE(MAX_FDS * fds.itemsize)
+        )
+        if marker != FDS_MARKER or flags & socket.MSG_CTRUNC:
+            raise ConnectionResetError("The connections weren't all received.")
+
+        for level, kind, data in ancdata:
+            if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                fds.frombytes(data[: len(data) - len(data) % fds.itemsize])
+
+    sockets = [socket.socket(fileno=fd) for fd in fds]
+    channel.sendall(ACK)
+    return Handoff(
+        state["node"], sockets[0], list(zip(sockets[1:], state["connections"]))
+    )
+
+
+def take_over(path: str) -> Optional[Handoff]:
+    """
+    Takes over from the server listening for its replacement at the given path,
+    returning everything it handed off, or None if no server is listening there.
+    """
+    channel = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            channel.connect(path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            # the socket is left over by a server that's gone
+            return None
+
+        with Timeout(HANDOFF_TIMEOUT, TimeoutError):
+            return receive_handoff(channel)
+    finally:
+        channel.close()
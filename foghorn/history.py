@@ -0,0 +1,163 @@
+"""
+The history of the messages sent to every channel, kept in storage as a bounded log
+per target for clients to replay what they missed. Replays come in bursts, since every
+client reconnecting asks for the latest lines of all of its channels at once, so the
+latest lines of the most recently read targets are also cached in process, with the
+tags they're replayed with already serialized.
+"""
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Deque, List, Optional, Tuple
+
+from .storage import StorageBackend, parse_history_id
+
+# the lines of history kept in storage for every target, roughly
+HISTORY_LENGTH = 1000
+# the targets whose latest lines are cached, and how many of those lines
+CACHED_TARGETS = 256
+CACHED_LINES = 100
+
+# a line of history as it's replayed, being its serialized tags and its encoded line
+HistoryLine = Tuple[bytes, bytes]
+# a cached line of history, with the key ordering it among the others
+CachedLine = Tuple[Tuple[int, int], bytes, bytes]
+
+
+def history_tags(history_id: str) -> bytes:
+    """
+    Returns the serialized tags a line of history is replayed with, being the time it
+    was sent, and its id as its message id.
+    https://ircv3.net/specs/extensions/server-time
+    """
+    ms, _ = parse_history_id(history_id)
+    sent = datetime.fromtimestamp(ms / 1000, timezone.utc)
+    return f"time={sent:%Y-%m-%dT%H:%M:%S}.{ms % 1000:03}Z;msgid={history_id}".encode(
+        "utf-8"
+    )
+
+
+class CachedHistory:
+    """The latest lines of history of a single target."""
+
+    __slots__ = ("lines", "complete")
+
+    def __init__(self, lines: Deque[CachedLine], complete: bool):
+        self.lines = lines
+        # if the lines are all of those of the target, rather than the latest ones
+        self.complete = complete
+
+
+class History:
+    """
+    Appends lines to the history of targets, and reads them back. Lines are read from
+    the cache whenever it's certain to hold all of the lines asked for, and from
+    storage otherwise. Lines appended through other nodes aren't seen by this one, so
+    the cache of a target must be invalidated whenever another node sends it a line.
+    """
+
+    __slots__ = ("length", "cached_targets", "cached_lines", "_cache", "_appends")
+
+    def __init__(
+        self,
+        length: int = HISTORY_LENGTH,
+        cached_targets: int = CACHED_TARGETS,
+        cached_lines: int = CACHED_LINES,
+    ):
+        # no history is kept at all without a length
+        self.length = length
+        self.cached_targets = cached_targets
+        self.cached_lines = cached_lines
+        # the cached history of every target, least recently read first
+        self._cache: "OrderedDict[str, CachedHistory]" = OrderedDict()
+        # the lines appended so far, to tell if any were while a target was loading
+        self._appends = 0
+
+    def append(self, target: str, line: bytes, storage: StorageBackend) -> None:
+        """Appends an encoded line to the history of the given target."""
+        if not self.length:
+            return
+
+        history_id = storage.append_history(target, line, self.length)
+        self._appends += 1
+        cached = self._cache.get(target)
+        if cached is not None:
+            # the oldest line is evicted once the cache is full
+            if len(cached.lines) == cached.lines.maxlen:
+                cached.complete = False
+            cached.lines.append(
+                (parse_history_id(history_id), history_tags(history_id), line)
+            )
+
+    def invalidate(self, target: str) -> None:
+        """Drops the cached history of the given target."""
+        self._cache.pop(target, None)
+
+    def read(
+        self,
+        target: str,
+        after: Optional[str],
+        before: Optional[str],
+        count: int,
+        latest: bool,
+        storage: StorageBackend,
+    ) -> List[HistoryLine]:
+        """
+        Returns up to the given number of lines from the history of the given target,
+        oldest first. Only lines between the given ids (excluding them) are returned,
+        the latest of them if latest is set, or the earliest otherwise. Raises a
+        ValueError if any id is malformed.
+        """
+        low = parse_history_id(after) if after else None
+        high = parse_history_id(before) if before else None
+        if not self.length:
+            return []
+
+        cached = self._load(target, storage)
+        lines = [
+            (tags, line)
+            for key, tags, line in cached.lines
+            if (low is None or key > low) and (high is None or key < high)
+        ]
+        # the cache holds every line since its oldest one, so it has all the lines
+        # asked for if they're all more recent, or if it has enough of the latest ones
+        if (
+            cached.complete
+            or (low is not None and cached.lines and low >= cached.lines[0][0])
+            or (latest and len(lines) >= count)
+        ):
+            return lines[-count:] if latest else lines[:count]
+
+        return [
+            (history_tags(history_id), line)
+            for history_id, line in storage.read_history(
+                target, after, before, count, latest
+            )
+        ]
+
+    def _load(self, target: str, storage: StorageBackend) -> CachedHistory:
+        """Returns the cached history of the given target, reading it if needed."""
+        cached = self._cache.get(target)
+        if cached is not None:
+            self._cache.move_to_end(target)
+            return cached
+
+        appends = self._appends
+        entries = storage.read_history(target, None, None, self.cached_lines, True)
+        cached = CachedHistory(
+            deque(
+                (
+                    (parse_history_id(history_id), history_tags(history_id), line)
+                    for history_id, line in entries
+                ),
+                maxlen=self.cached_lines,
+            ),
+            len(entries) < self.cached_lines,
+        )
+        # lines appended while reading may be missing, so the history is only cached
+        # if there weren't any
+        if appends == self._appends:
+            self._cache[target] = cached
+            if len(self._cache) > self.cached_targets:
+                self._cache.popitem(last=False)
+
+        return cached
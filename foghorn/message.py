@@ -1,6 +1,20 @@
 import re
-from dataclasses import dataclass
-from typing import Dict, List, Match, Optional
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from enum import Enum
+from functools import lru_cache
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Match,
+    Optional,
+    Pattern,
+    Tuple,
+    Union,
+)
 
 from .enums import Command, ErrorCode
 from .errors import ProtocolException
@@ -8,127 +22,241 @@ from .parsing import (
     ATOM_DELIMITER,
     MAX_MESSAGE_LENGTH,
     MAX_TAGS_LENGTH,
+    MSG_DELIMITER,
     SOURCE_PREFIX,
-    TAG_ESCAPE_MAPPING,
-    TAG_ESCAPE_MAPPING_2,
+    TAG_DELIMITER,
+    TAG_ESCAPE_CHARACTER,
+    TAG_ESCAPED_CHARACTERS,
     TAG_PREFIX,
     TAG_UNESCAPE_MAPPING,
+    TAG_VALUE_DELIMITER,
     TRAILING_PARAM_PREFIX,
     WILDCARD_ESCAPE_MAPPING,
 )
+from .typing import DATACLASS_SLOTS, slotted
 
 
-@dataclass(frozen=True)
-class Message:
-    params: List[str]
-    verb: Command
-    source: Optional[str] = None
-    tags: Optional[Dict[str, str]] = None
+# the raw bytes of the parsing characters, for scanning undecoded lines
+_ATOM_DELIMITER = ATOM_DELIMITER.encode("utf-8")
+_TRAILING_PARAM_PREFIX = TRAILING_PARAM_PREFIX.encode("utf-8")
+
+# matches the optional tags and source, the verb, and the start of the params of a
+# raw line, skipping any repeated delimiters between them
+_LINE_PATTERN = re.compile(rb"(?:@([^ ]*) +)?(?::([^ ]*) +)?([^ ]*) *")
+
+_TAG_ESCAPE_PATTERN = re.compile(r"\\(.?)", re.DOTALL)
+_TAG_UNESCAPE_TABLE = str.maketrans(TAG_UNESCAPE_MAPPING)
+
+# the most recently used wildcard expressions are kept compiled
+EXPRESSION_CACHE_SIZE = 4096
+_WILDCARD_PATTERN = re.compile(
+    "|".join(re.escape(w[1:]) for w in WILDCARD_ESCAPE_MAPPING)
+)
+
+
+def _unescape_tag_character(matchobj: Match) -> str:
+    """Unescapes a single escape sequence from a raw tag value."""
+    char = matchobj.group(1)
+    return TAG_ESCAPED_CHARACTERS.get(char, char)
+
+
+class MessageTags(Mapping):
+    """
+    The tags of a parsed message. They are kept in the escaped form they were received
+    in, and are only decoded the first time they are read. A message relayed unchanged
+    reuses the escaped form instead of encoding the tags again.
+    """
+
+    __slots__ = ("raw", "_decoded")
+
+    def __init__(self, raw: str):
+        self.raw = raw
+        self._decoded: Optional[Dict[str, str]] = None
 
     @staticmethod
-    def _tags_from_line(line: str):
+    def _tags_from_line(line: str) -> Dict[str, str]:
         """
         Parses the tag section of a UTF-8 encoded ABNF string line to a
         appropriately mapped dictionary. Tags that are empty are parsed as
-        missing.
+        missing. As per spec, the last value of a repeated tag is acknowledged.
         https://ircv3.net/specs/extensions/message-tags.html
         """
+        tags = {}
+        for assignment in line.split(TAG_DELIMITER):
+            key, _, value = assignment.partition(TAG_VALUE_DELIMITER)
+            if not key:
+                continue
 
-        def unescape(matchobj: Match) -> str:
-            """
-            Unescapes non-parsing special character encodings from the entire line
-            at once to reduce the number of regex calls.
-            """
-            match = matchobj.group(0)
-            return TAG_ESCAPE_MAPPING.get(
-                match, re.sub(r"\\([^:])", lambda m: m.group(1), matchobj.group(0))
+            # only values containing escapes need another pass
+            tags[key] = (
+                _TAG_ESCAPE_PATTERN.sub(_unescape_tag_character, value)
+                if TAG_ESCAPE_CHARACTER in value
+                else value
             )
 
-        line = re.sub(r"\\.?", unescape, line)
-        # extract all tag assignments and as a list of tuples of matching groups,
-        # and combine them together into a dictionary. as per spec, the last value
-        # of a tag is acknowledged
-        tags = dict(re.findall(r"([^=;]+)=?([^;]*)(?:;|$)", line))
+        return tags
 
-        def unescape2(matchobj: Match) -> str:
-            r"""
-            Unescapes the special parsing character encodings (trailing '\' and '\:')
-            from each raw value. This must be done lastly on each tag as the raw
-            values for both characters have special meanings for initial decoding.
-            """
-            return TAG_ESCAPE_MAPPING_2[matchobj.group(0)]
+    @property
+    def decoded(self) -> Dict[str, str]:
+        if self._decoded is None:
+            self._decoded = self._tags_from_line(self.raw)
 
-        return {t: re.sub(r"\\:|\\$", unescape2, tags[t]) for t in tags}
+        return self._decoded
+
+    def __getitem__(self, key: str) -> str:
+        return self.decoded[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.decoded)
+
+    def __len__(self) -> int:
+        return len(self.decoded)
+
+    def __bool__(self) -> bool:
+        # avoid decoding just to check if there are tags
+        return bool(self.raw)
+
+    def __repr__(self) -> str:
+        return repr(self.decoded)
+
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def _compile_expression(pattern: str) -> Tuple[str, str, Optional[Pattern]]:
+    """
+    Compiles a wildcard expression, returning its literal prefix and suffix (which
+    every match must start and end with) and the regex matching it. Expressions
+    without wildcards are matched literally, so no regex is returned for them.
+    """
+    wildcards = _WILDCARD_PATTERN.search(pattern)
+    if not wildcards:
+        return pattern, "", None
+
+    npattern = re.escape(pattern)
+    for unescaped, escaped in WILDCARD_ESCAPE_MAPPING.items():
+        npattern = npattern.replace(unescaped, escaped)
+
+    suffix = _WILDCARD_PATTERN.split(pattern)[-1]
+    return pattern[: wildcards.start()], suffix, re.compile(npattern)
+
+
+@slotted
+@dataclass(frozen=True, **DATACLASS_SLOTS)
+class Message:
+    params: List[str]
+    verb: Command
+    source: Optional[str] = None
+    tags: Optional[Mapping[str, str]] = None
+    # the memoized wire form of the message, since it never changes
+    _line: Optional[bytes] = field(default=None, init=False, repr=False, compare=False)
 
     @classmethod
-    def from_line(cls, line: str):
-        atoms = line.split(ATOM_DELIMITER)
+    def from_line(
+        cls,
+        line: Union[bytes, str],
+        verbs: Optional[Mapping[bytes, Command]] = None,
+    ) -> "Message":
+        """
+        Parses a single UTF-8 encoded line, without its delimiter, into a message. The
+        line is tokenized in a single pass, and every atom is decoded directly from its
+        raw bytes. If the accepted verbs are given by their raw bytes, lines with any
+        other verb are rejected before anything else is decoded.
+        """
+        if isinstance(line, str):
+            line = line.encode("utf-8")
+
+        # split off the optional tags and source, the verb, and the raw params
+        match = _LINE_PATTERN.match(line)
+        assert match  # every line matches, calm down mypy
+        raw_tags, raw_source, raw_verb = match.groups()
 
-        # tags are optional. if the first atom begins with '@', extract them
+        # the verb must be the next atom. check it to see if it is a valid command,
+        # or raise an error
+        verb = (
+            Command.__members__.get(raw_verb.decode("utf-8"))
+            if verbs is None
+            else verbs.get(raw_verb)
+        )
+        if verb is None:
+            # lines that aren't valid UTF-8 are ignored rather than answered, so the
+            # unknown verb is decoded to tell them apart
+            raw_verb.decode("utf-8")
+            raise ProtocolException(ErrorCode.ERR_UNKNOWNCOMMAND)
+
+        # tags are optional. if the line begins with '@', extract them
         tags = None
-        if atoms[0].startswith(TAG_PREFIX):
+        if raw_tags is not None:
             # raise an error if we've exceeded the maximum number of bytes
             # for the tag section
-            if len(atoms[0].encode("utf-8")) > MAX_TAGS_LENGTH - 1:
+            if match.end(1) > MAX_TAGS_LENGTH - 1:
                 raise ProtocolException(ErrorCode.ERR_INPUTTOOLONG)
 
-            tags, atoms = cls._tags_from_line(atoms[0][1:]), atoms[1:]
+            tags = MessageTags(raw_tags.decode("utf-8"))
 
         # raise an error if we've exceeded the maximum number of bytes
         # for the remaining message
-        if len(ATOM_DELIMITER.join(atoms).encode("utf-8")) > MAX_MESSAGE_LENGTH:
+        end = len(line)
+        start = match.start(2) - 1 if raw_source is not None else match.start(3)
+        if end - start > MAX_MESSAGE_LENGTH:
             raise ProtocolException(
                 ErrorCode.ERR_UNKNOWNERROR, msg=ErrorCode.ERR_INPUTTOOLONG.msg
             )
 
-        # source is optional. if the first atom (or second, depending on the inclusion
-        # of tags) begins with ':', extract it
-        source = None
-        if atoms[0].startswith(SOURCE_PREFIX):
-            source, atoms = atoms[0][1:], atoms[1:]
-
-        # the verb and params must the remaining atoms. check the verb to see if it
-        # is a valid command, or raise an error
-        if atoms[0] not in Command.__members__:
-            raise ProtocolException(ErrorCode.ERR_UNKNOWNCOMMAND)
+        # source is optional. if the next atom begins with ':', extract it
+        source = None if raw_source is None else raw_source.decode("utf-8")
 
-        # The last parameter may contain spaces, so be sure to concatenate its atoms
-        # if indicated (prefixed by a ':')
-        verb, params = Command[atoms[0]], []
-        for i, p in enumerate(atoms[1:]):
-            if p.startswith(TRAILING_PARAM_PREFIX):
-                params.append(ATOM_DELIMITER.join(atoms[1:][i:])[1:])
+        # the params are all the remaining atoms. the last parameter may contain
+        # spaces if indicated (prefixed by a ':'), so it extends to the end of the line
+        params, pos = [], match.end()
+        while pos < end:
+            if line.startswith(_TRAILING_PARAM_PREFIX, pos):
+                params.append(line[pos + 1 :].decode("utf-8"))
                 break
-            elif p.strip():
-                params.append(p)
+
+            atom_end = line.find(_ATOM_DELIMITER, pos)
+            if atom_end < 0:
+                atom_end = end
+
+            # consecutive delimiters yield empty atoms, which aren't parameters
+            if atom_end > pos:
+                params.append(line[pos:atom_end].decode("utf-8"))
+
+            pos = atom_end + 1
 
         return Message(tags=tags, source=source, verb=verb, params=params)
 
-    def _tags_to_line(self):
+    @classmethod
+    def serialized(cls, verb: Command, line: bytes) -> "Message":
+        """
+        Returns a message sent as the given line, already encoded and terminated by
+        the message delimiter, such as a stored one. The line is never parsed back, so
+        the message only carries the given verb.
+        """
+        message = cls(verb=verb, params=[])
+        object.__setattr__(message, "_line", line)
+        return message
+
+    def _tags_to_line(self) -> str:
         """
         Encodes this message's tags into a UTF-8 encoded ABNF string, escaping
         all characters with special meanings. Tags that were parsed as empty
-        during ingestion are normalized to missing values.
+        during ingestion are normalized to missing values. Parsed tags are reused
+        as they were received.
         https://ircv3.net/specs/extensions/message-tags.html
         """
+        assert self.tags  # calm down mypy
+        if isinstance(self.tags, MessageTags):
+            return f"{TAG_PREFIX}{self.tags.raw}"
 
-        def escape(matchgroup: Match) -> str:
-            """
-            Escapes all characters by the reverse of the special character
-            mapping used during parsing. By the nature of the initial decoding,
-            this process is lossless in terms of meaning, but may not yield the
-            exact original line (for example, invalid backslashes are not added).
-            """
-            match = matchgroup.group(0)
-            return TAG_UNESCAPE_MAPPING.get(match, match)
-
-        pattern = re.compile(r".{1}", re.DOTALL)
+        # escape all characters by the reverse of the special character mapping used
+        # during parsing. by the nature of the initial decoding, this process is
+        # lossless in terms of meaning, but may not yield the exact original line
+        # (for example, invalid backslashes are not added)
         assignments = [
-            k + (f"={re.sub(pattern, escape, self.tags[k])}" if self.tags[k] else "")
-            for k in self.tags
+            k + (f"={v.translate(_TAG_UNESCAPE_TABLE)}" if v else "")
+            for k, v in self.tags.items()
         ]
 
-        return f"@{';'.join(assignments)}"
+        return f"{TAG_PREFIX}{TAG_DELIMITER.join(assignments)}"
 
     def to_line(self) -> str:
         atoms = []
@@ -141,7 +269,13 @@ class Message:
         if self.source:
             atoms.append(f"{SOURCE_PREFIX}{self.source}")
 
-        atoms.append(self.verb)
+        # commands are sent by name, and numerics are always three digits
+        if isinstance(self.verb, Enum):
+            atoms.append(self.verb.name)
+        elif isinstance(self.verb, int):
+            atoms.append(f"{self.verb:03}")
+        else:
+            atoms.append(self.verb)
 
         # if params are present, append them while ensuring to append the
         # trailing parameter character when necessary for proper encoding
@@ -160,15 +294,62 @@ class Message:
 
         return ATOM_DELIMITER.join(atoms)
 
+    def to_bytes(self) -> bytes:
+        """
+        Returns the UTF-8 encoded line of this message, terminated by the message
+        delimiter and ready to be sent. The line is only serialized and encoded the
+        first time, no matter how many recipients the message is sent to.
+        """
+        if self._line is None:
+            object.__setattr__(
+                self, "_line", self.to_line().encode("utf-8") + MSG_DELIMITER
+            )
+
+        assert self._line  # calm down mypy
+        return self._line
+
     @staticmethod
     def match_expression(pattern: str, candidates: List[str]) -> List[str]:
         """
         Matches the given wildcard expression against all candidates in the provided
         list. Positive full matches are returned.
         """
-        npattern = re.escape(pattern)
-        for unescaped, escaped in WILDCARD_ESCAPE_MAPPING.items():
-            npattern = npattern.replace(unescaped, escaped)
+        prefix, suffix, matcher = _compile_expression(pattern)
+        return [
+            c
+            for c in candidates
+            if c.startswith(prefix)
+            and c.endswith(suffix)
+            and (matcher.fullmatch(c) if matcher else c == pattern)
+        ]
+
+    @staticmethod
+    def match_expressions(
+        patterns: Iterable[str], candidates: List[str]
+    ) -> Dict[str, List[str]]:
+        """
+        Matches every given wildcard expression against all candidates in the provided
+        list, returning the positive full matches of each expression in the order of
+        the candidates. Candidates are sorted once, so only those sharing the literal
+        prefix of an expression are ever checked against it.
+        """
+        order = sorted(range(len(candidates)), key=candidates.__getitem__)
+        ordered = [candidates[i] for i in order]
+
+        matches = {}
+        for pattern in patterns:
+            prefix, suffix, matcher = _compile_expression(pattern)
+
+            hits = []
+            for i in range(bisect_left(ordered, prefix), len(ordered)):
+                c = ordered[i]
+                if not c.startswith(prefix):
+                    break
+                elif c.endswith(suffix) and (
+                    matcher.fullmatch(c) if matcher else c == pattern
+                ):
+                    hits.append(order[i])
+
+            matches[pattern] = [candidates[i] for i in sorted(hits)]
 
-        matcher = re.compile(npattern)
-        return [c for c in candidates if matcher.fullmatch(c)]
+        return matches
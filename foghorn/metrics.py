@@ -0,0 +1,269 @@
+"""
+Metrics of the server, kept in-process and rendered in the Prometheus text format.
+Updating one costs a dict lookup and an addition, so they're cheap enough for the hot
+path, and nothing is measured at all unless metrics are enabled for the server.
+"""
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .typing import Address
+
+# the bounds of histogram buckets, in seconds, from handling a single line up to
+# waiting out the timeout of the Redis pool
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    20.0,
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# when the process started, for its uptime
+STARTED = time.time()
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_value(label: Hashable) -> str:
+    # enum members are labelled by name, which is only looked up when rendering since
+    # it's slow to get
+    return getattr(label, "name", str(label))
+
+
+def _format(name: str, labels: Dict[str, str], value: float) -> str:
+    if labels:
+        pairs = ",".join(f'{label}="{_escape(text)}"' for label, text in labels.items())
+        name = f"{name}{{{pairs}}}"
+
+    return f"{name} {value}"
+
+
+class Metric:
+    """
+    A metric, optionally split by the values of a single label. Values can be given as
+    anything hashable, like enum members, and are only turned into text when rendered.
+    """
+
+    kind = "untyped"
+
+    __slots__ = ("name", "description", "label")
+
+    def __init__(self, name: str, description: str, label: Optional[str] = None):
+        self.name = name
+        self.description = description
+        self.label = label
+
+    def _labels(self, value: str) -> Dict[str, str]:
+        return {self.label: value} if self.label else {}
+
+    def samples(self) -> Iterator[Sample]:
+        raise NotImplementedError()
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for name, labels, value in self.samples():
+            yield _format(name, labels, value)
+
+
+class Counter(Metric):
+    """A value that's only ever incremented."""
+
+    kind = "counter"
+
+    __slots__ = ("_values",)
+
+    def __init__(self, name: str, description: str, label: Optional[str] = None):
+        super().__init__(name, description, label)
+        self._values: Dict[Any, float] = {}
+
+    def inc(self, label: Hashable = "", amount: float = 1) -> None:
+        self._values[label] = self._values.get(label, 0) + amount
+
+    def values(self) -> Dict[str, float]:
+        """Returns the current value for every value of the label."""
+        # copying is atomic, so it's safe while the server updates the counter
+        return {
+            _label_value(label): value for label, value in dict(self._values).items()
+        }
+
+    def samples(self) -> Iterator[Sample]:
+        for label, value in sorted(self.values().items()):
+            yield self.name, self._labels(label), value
+
+
+class Gauge(Metric):
+    """A value that's read from the server whenever it's rendered."""
+
+    kind = "gauge"
+
+    __slots__ = ("_read",)
+
+    def __init__(self, name: str, description: str):
+        super().__init__(name, description)
+        self._read: Optional[Callable[[], float]] = None
+
+    def set_function(self, read: Callable[[], float]) -> None:
+        self._read = read
+
+    def samples(self) -> Iterator[Sample]:
+        if self._read:
+            yield self.name, {}, self._read()
+
+
+class Histogram(Metric):
+    """Observed durations, counted into buckets by how long they took."""
+
+    kind = "histogram"
+
+    __slots__ = ("buckets", "_values")
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label: Optional[str] = None,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, description, label)
+        self.buckets = tuple(buckets)
+        # the count of every bucket (the last one being unbounded), followed by the sum
+        # of all observations, for every value of the label
+        self._values: Dict[Any, List[float]] = {}
+
+    def observe(self, seconds: float, label: Hashable = "") -> None:
+        try:
+            counts = self._values[label]
+        except KeyError:
+            counts = self._values[label] = [0] * (len(self.buckets) + 2)
+
+        counts[bisect_left(self.buckets, seconds)] += 1
+        counts[-1] += seconds
+
+    def samples(self) -> Iterator[Sample]:
+        values = {_label_value(label): c for label, c in dict(self._values).items()}
+        for label, counts in sorted(values.items()):
+            labels = self._labels(label)
+            counts = list(counts)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += int(count)
+                yield f"{self.name}_bucket", {**labels, "le": str(bound)}, cumulative
+
+            yield f"{self.name}_sum", labels, counts[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Registry:
+    """All the metrics of the process."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text format."""
+        return "".join(
+            f"{line}\n"
+            for metric in list(self._metrics.values())
+            for line in metric.render()
+        )
+
+
+REGISTRY = Registry()
+
+CONNECTIONS = Gauge("foghorn_connections", "Clients currently connected.")
+CONNECTIONS_TOTAL = Counter("foghorn_connections_total", "Clients ever connected.")
+LINES = Counter("foghorn_lines_total", "Lines handled, by command.", "command")
+ERRORS = Counter("foghorn_errors_total", "Error replies sent, by numeric.", "error")
+BATCH_SECONDS = Histogram(
+    "foghorn_batch_seconds", "Time spent handling the lines read at once."
+)
+COMMAND_SECONDS = Histogram(
+    "foghorn_command_seconds", "Time spent responding to a command.", "command"
+)
+STORAGE_WAIT_SECONDS = Histogram(
+    "foghorn_storage_wait_seconds",
+    "Time spent waiting for a storage session, like a Redis pool connection.",
+)
+FLOOD_THROTTLED = Gauge(
+    "foghorn_flood_throttled", "Times clients were deferred by flood control."
+)
+FLOOD_DEFERRED_SECONDS = Gauge(
+    "foghorn_flood_deferred_seconds", "Time clients were deferred for in total."
+)
+
+for _metric in (
+    CONNECTIONS,
+    CONNECTIONS_TOTAL,
+    LINES,
+    ERRORS,
+    BATCH_SECONDS,
+    COMMAND_SECONDS,
+    STORAGE_WAIT_SECONDS,
+    FLOOD_THROTTLED,
+    FLOOD_DEFERRED_SECONDS,
+):
+    REGISTRY.register(_metric)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # scrapes happen every few seconds, so they aren't logged
+        pass
+
+
+def serve_metrics(address: Address) -> ThreadingHTTPServer:
+    """
+    Serves the metrics over HTTP at /metrics on the given address, from a thread of
+    its own, which is a greenlet for the gevent engine. Returns the server, to be shut
+    down when done.
+    """
+    server = ThreadingHTTPServer(address, _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
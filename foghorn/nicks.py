@@ -0,0 +1,98 @@
+"""
+The nicknames in use, compared without regard to case. Which characters are the same
+regardless of case depends on the casemapping of the server, and nicknames are folded
+by a translation table built once for it, so looking one up never runs a regex.
+"""
+import string
+from enum import Enum
+from typing import Dict, Optional
+
+from .storage import StorageBackend
+
+
+class CaseMapping(str, Enum):
+    """
+    The casemappings a server can compare nicknames with.
+    https://modern.ircdocs.horse/#casemapping-parameter
+    """
+
+    ASCII = "ascii"
+    # the characters {}|^ are considered the lowercase equivalents of []\~
+    RFC1459 = "rfc1459"
+
+
+FOLDING_TABLES = {
+    CaseMapping.ASCII: str.maketrans(string.ascii_uppercase, string.ascii_lowercase),
+    CaseMapping.RFC1459: str.maketrans(
+        string.ascii_uppercase + "[]\\~", string.ascii_lowercase + "{}|^"
+    ),
+}
+
+
+class NickRegistry:
+    """
+    Claims nicknames for clients, atomically in storage, so no two clients of any
+    worker ever use nicknames that only differ by case. The nicknames of clients
+    connected to this node are cached, and only those of other nodes are ever looked
+    up in storage. Claims record the node of their client, so they're only ever freed
+    by it, or taken over once it's gone.
+    """
+
+    __slots__ = ("casemapping", "_table", "_local")
+
+    def __init__(self, casemapping: CaseMapping = CaseMapping.RFC1459):
+        self.casemapping = casemapping
+        self._table = FOLDING_TABLES[casemapping]
+        # the key of the client using every folded nickname claimed through this node
+        self._local: Dict[str, str] = {}
+
+    def fold(self, nickname: str) -> str:
+        """Returns the form of the nickname that's the same regardless of case."""
+        return nickname.translate(self._table)
+
+    def find(self, nickname: str, storage: StorageBackend) -> Optional[str]:
+        """Returns the key of the client using the given nickname, if there's one."""
+        folded = nickname.translate(self._table)
+        key = self._local.get(folded)
+        return key if key is not None else storage.find_nick(folded)
+
+    def claim(
+        self, nickname: str, key: str, node: int, storage: StorageBackend
+    ) -> bool:
+        """
+        Claims the given nickname for the given client of the given node, unless
+        another client uses it already. Returns if the client now uses the nickname.
+        """
+        folded = nickname.translate(self._table)
+        owner = self._local.get(folded)
+        if owner is None:
+            owner, owner_node = storage.claim_nick(folded, key, node)
+            # the claims of a node that's gone, like a crashed one, are never freed
+            # by it, so they're taken over
+            if owner_node != node and not storage.node_alive(owner_node):
+                storage.delete_nick(folded, owner, owner_node)
+                owner, _ = storage.claim_nick(folded, key, node)
+        if owner != key:
+            return False
+
+        self._local[folded] = key
+        return True
+
+    def adopt(self, nickname: str, key: str) -> None:
+        """
+        Caches the nickname of a client handed off to this node, which claimed it in
+        storage already.
+        """
+        self._local[nickname.translate(self._table)] = key
+
+    def release(
+        self, nickname: str, key: str, node: int, storage: StorageBackend
+    ) -> None:
+        """
+        Frees up the given nickname, unless it's no longer claimed by the given client
+        of the given node.
+        """
+        folded = nickname.translate(self._table)
+        if self._local.get(folded) == key:
+            del self._local[folded]
+        storage.delete_nick(folded, key, node)
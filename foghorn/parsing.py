@@ -11,11 +11,19 @@ ATOM_DELIMITER = " "
 
 MAX_TAGS_LENGTH = 4096  # in bytes
 TAG_PREFIX = "@"
+TAG_DELIMITER = ";"
+TAG_VALUE_DELIMITER = "="
+TAG_ESCAPE_CHARACTER = "\\"
 TAG_ESCAPE_MAPPING = {r"\s": " ", r"\\": "\\", r"\r": "\r", r"\n": "\n"}
 TAG_ESCAPE_MAPPING_2 = {r"\:": ";", "\\": ""}
 TAG_UNESCAPE_MAPPING = {
     v: k for k, v in dict(TAG_ESCAPE_MAPPING, **TAG_ESCAPE_MAPPING_2).items() if v
 }
+# the character following a '\' in a tag value, mapped to what the pair decodes to.
+# any other escaped character decodes to itself
+TAG_ESCAPED_CHARACTERS = {
+    k[1:]: v for k, v in dict(TAG_ESCAPE_MAPPING, **TAG_ESCAPE_MAPPING_2).items()
+}
 
 # can / should these be combined?
 SOURCE_PREFIX = ":"
@@ -25,7 +33,13 @@ PARAM_PREFIX = ":"
 WILDCARD_ESCAPE_MAPPING = {r"\*": r"[^\\]*", r"\?": r"[^\\]{1}"}
 
 ANY_CLIENT = "*"
-
-INVALID_CHARACTER_PATTERN = re.compile(r"[^\w\d-]")
+# separates the targets of a command addressed to several at once
+TARGET_DELIMITER = ","
+# the first character of every channel name
+CHANNEL_PREFIXES = ("#", "&")
+
+# nicknames may also use the special characters of RFC 2812, which the rfc1459
+# casemapping folds
+INVALID_CHARACTER_PATTERN = re.compile(r"[^\w\d\-\[\]\\`^{|}]")
 
 REMOVE_CAP_PREFIX = "-"
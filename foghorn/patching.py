@@ -0,0 +1,15 @@
+"""
+Patches the standard library for the gevent engine once imported, unless the asyncio
+engine was selected. It's imported by the core shared by both engines rather than by
+foghorn itself, so whatever only needs foghorn's definitions (like the CLI parsing its
+arguments) doesn't pay for gevent.
+"""
+import gevent
+from gevent import monkey
+
+import foghorn
+
+if foghorn.ENGINE == "gevent":
+    monkey.patch_all()
+    gevent.config.loop = "libuv"
+    gevent.config.resolver = ["dnspython", "ares", "thread", "block"]
@@ -0,0 +1,115 @@
+"""
+A sampling profiler of the commands handled, toggled at runtime. While it's enabled, a
+fraction of the lines handled are timed through every stage of their handling, and the
+time spent in each is accumulated per command. When it's disabled again, everything
+accumulated is dumped as collapsed stacks, ready for flamegraph.pl or speedscope.
+
+Profiling is off limits unless the server is started with it allowed, and is then
+toggled by sending the process PROFILE_SIGNAL, or with `STATS p` from a local client.
+While disabled, it costs a single attribute check per line.
+"""
+import os
+import random
+import signal
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# only where the platform has it, so on Windows profiling is toggled by STATS p alone
+PROFILE_SIGNAL: Optional[int] = getattr(signal, "SIGUSR1", None)
+# the fraction of lines that are timed while profiling
+DEFAULT_RATE = 0.01
+# where the stacks are dumped, given the pid of the process, since every worker
+# profiles itself
+DEFAULT_PATH = "foghorn.{pid}.stacks"
+# the stage every line is attributed to when it couldn't even be parsed
+UNPARSED = "unparsed"
+
+
+class StageTimer:
+    """The time spent in every stage of handling a single sampled line."""
+
+    __slots__ = ("command", "stages", "_last")
+
+    def __init__(self):
+        # the command of the line, once it's parsed
+        self.command: Any = None
+        self.stages: List[Tuple[str, float]] = []
+        self._last = time.perf_counter()
+
+    def mark(self, stage: str) -> None:
+        """Ends the given stage, which started when the previous one ended."""
+        now = time.perf_counter()
+        self.stages.append((stage, now - self._last))
+        self._last = now
+
+
+class CommandProfiler:
+    """
+    Accumulates the time spent in every stage of the sampled lines, by command, as
+    collapsed stacks of the command and the stage.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, path: str = DEFAULT_PATH):
+        self.enabled = False
+        # whether profiling may be toggled at all, which writes files on the server
+        self.allowed = False
+        self.rate = rate
+        self.path = path
+        # the number of lines sampled since profiling was enabled
+        self.samples = 0
+        self._stacks: Dict[str, float] = {}
+
+    def start(self) -> Optional[StageTimer]:
+        """Returns a timer for the next line if it's sampled, or None otherwise."""
+        return StageTimer() if random.random() < self.rate else None
+
+    def record(self, timer: StageTimer) -> None:
+        """Adds the stages of a sampled line to the stacks of its command."""
+        command = getattr(timer.command, "name", None) or UNPARSED
+        for stage, seconds in timer.stages:
+            self.add(f"{command};{stage}", seconds)
+
+        self.samples += 1
+
+    def add(self, stack: str, seconds: float) -> None:
+        self._stacks[stack] = self._stacks.get(stack, 0.0) + seconds
+
+    def enable(self) -> None:
+        self._stacks.clear()
+        self.samples = 0
+        self.enabled = True
+
+    def disable(self) -> str:
+        """Stops profiling, dumping the stacks. Returns the path they were dumped to."""
+        self.enabled = False
+        return self.dump()
+
+    def toggle(self) -> None:
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+
+    def dump(self) -> str:
+        """
+        Writes the collapsed stacks to the profiler's path, weighted by the
+        microseconds spent in them. Returns the path.
+        """
+        path = self.path.format(pid=os.getpid())
+        with open(path, "w") as stacks:
+            for stack, seconds in sorted(self._stacks.items()):
+                stacks.write(f"{stack} {round(seconds * 1e6)}\n")
+
+        return path
+
+
+PROFILER = CommandProfiler()
+
+
+def install_signal_handler() -> None:
+    """
+    Toggles profiling whenever the process is sent PROFILE_SIGNAL, if the platform
+    has it.
+    """
+    if PROFILE_SIGNAL is not None:
+        signal.signal(PROFILE_SIGNAL, lambda signum, frame: PROFILER.toggle())
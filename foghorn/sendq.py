@@ -0,0 +1,19 @@
+"""
+The limits of what's queued for every connection, which both engines enforce. They're
+kept apart from the writers of either engine, so configuring them doesn't import one.
+"""
+from enum import Enum
+
+# the most bytes that may be queued for a single connection by default
+DEFAULT_SENDQ = 1 << 20
+
+
+class SendQPolicy(str, Enum):
+    """What happens to data written to a connection whose queue is already full."""
+
+    # the data is discarded
+    DROP = "drop"
+    # the client is told why, and disconnected
+    DISCONNECT = "disconnect"
+    # the greenlet writing the data waits until there's room for it
+    BLOCK = "block"
@@ -1,145 +1,286 @@
-import math
-from typing import Callable, Dict, Optional
+# the standard library is patched before anything else is imported
+from . import patching  # noqa: F401
 
-from gevent.queue import LifoQueue
+from ssl import SSLContext
+from typing import Any, Dict, List, Optional, Tuple
+
+import gevent
+from gevent import Greenlet
+from gevent.lock import Semaphore
 from gevent.server import StreamServer
-from redis import BlockingConnectionPool, Redis
-
-from .commands import COMMANDS
-from .commands.cap import ClientStatus
-from .enums import ErrorCode
-from .errors import ProtocolException
-from .message import Message
-from .parsing import MAX_MESSAGE_LENGTH, MAX_TAGS_LENGTH, MSG_DELIMITER
-from .storage import CLIENT_STATUS_RKEY, client_rkey, get_statuses
+
+from . import handoff
+from .core import IRC_PORT, IRCCore
+from .flood import FloodControl, FloodLimiter
+from .framing import LineFramer
+from .handoff import HandedOff, Handoff
+from .history import HISTORY_LENGTH
+from .nicks import CaseMapping
+from .storage import RedisStorage, StorageBackend
+from .tls import TLSAcceptor
 from .typing import Address, Socket
-from .utils import transform
+from .writer import DEFAULT_SENDQ, ConnectionWriter, SendQPolicy
+
+
+class Connection:
+    """
+    A client connection served by a greenlet. It's only served while holding its lock,
+    so it can be handed off between batches.
+    """
 
-IRC_PORT = 6697
+    __slots__ = ("socket", "writer", "limiter", "greenlet", "busy")
 
+    def __init__(
+        self,
+        socket: Socket,
+        writer: ConnectionWriter,
+        limiter: FloodLimiter,
+    ):
+        self.socket = socket
+        self.writer = writer
+        self.limiter = limiter
+        # the greenlet serving the connection, once it's served
+        self.greenlet: Optional[Greenlet] = None
+        self.busy = Semaphore()
 
-class IRCServer(StreamServer):
-    def __init__(self, hostname: str, max_clients: int = 100, redis_timeout: int = 20):
-        self._connection_buffer_map: Dict[Address, bytes] = {}
-        self._previous_messages: Dict[Address, Message] = {}
-        self._redis_connection_pool = BlockingConnectionPool(
-            queue_class=LifoQueue, max_connections=max_clients, timeout=redis_timeout
+
+class IRCServer(IRCCore, StreamServer):
+    def __init__(
+        self,
+        hostname: str,
+        max_clients: int = 100,
+        redis_timeout: int = 20,
+        sync_storage: bool = False,
+        storage: Optional[StorageBackend] = None,
+        listener: Optional[Socket] = None,
+        sendq: int = DEFAULT_SENDQ,
+        sendq_policy: SendQPolicy = SendQPolicy.DISCONNECT,
+        flood_control: Optional[FloodControl] = None,
+        enable_metrics: bool = False,
+        casemapping: CaseMapping = CaseMapping.RFC1459,
+        history_length: int = HISTORY_LENGTH,
+        tls: Optional[SSLContext] = None,
+        handshake_threads: int = 0,
+        handoff_path: Optional[str] = None,
+    ):
+        # default to storing state in Redis, with a connection for every client
+        IRCCore.__init__(
+            self,
+            storage
+            or RedisStorage.from_pool(
+                max_connections=max_clients, timeout=redis_timeout
+            ),
+            sync_storage=sync_storage,
+            flood_control=flood_control,
+            enable_metrics=enable_metrics,
+            casemapping=casemapping,
+            history_length=history_length,
         )
+        self._connection_buffer_map: Dict[Address, LineFramer] = {}
+        self._connections: Dict[Address, Connection] = {}
+        # the most bytes queued for any connection, and what happens beyond that
+        self._sendq = sendq
+        self._sendq_policy = sendq_policy
+        self._bus_listener: Optional[gevent.Greenlet] = None
+        # holds the lease of the node, which outlives the handoff to a replacement
+        self._lease: Optional[gevent.Greenlet] = None
+        # connections are only served over TLS given its context
+        self._tls = TLSAcceptor(tls, handshake_threads) if tls else None
+        # the path the server listens on for the process replacing it, if it does
+        self._handoff_path = handoff_path
+        self._handoff_listener: Optional[gevent.Greenlet] = None
 
-        super().__init__((hostname, IRC_PORT), spawn=max_clients)
+        # workers sharing a port are given an already listening socket
+        StreamServer.__init__(self, listener or (hostname, IRC_PORT), spawn=max_clients)
 
     def handle(self, socket: Socket, address: Address) -> None:  # pylint: disable=E0202
-        buffer = self._connection_buffer_map.get(address, b"")
-
-        # create an unregistered client for the new address
-        with Redis(connection_pool=self._redis_connection_pool) as redis:
-            redis.hset(
-                client_rkey(address),
-                CLIENT_STATUS_RKEY,
-                ClientStatus.UNREGISTERED.value,
-            )
+        if self._tls:
+            try:
+                socket = self._tls.accept(socket)  # type: ignore[assignment]
+            except OSError:
+                # the client never completed its handshake, so it never connected
+                socket.close()
+                return
 
-        while True:
-            # read messages into the address's buffer until a delimiter is found
-            while MSG_DELIMITER not in buffer:
-                # closest power of 2
-                try:
-                    data = socket.recv(
-                        math.ceil(
-                            (MAX_MESSAGE_LENGTH + MAX_TAGS_LENGTH - 2).bit_length() / 8
-                        )
-                    )
-                finally:
-                    # if the socket is closed
-                    if not data:
-                        # delete all traces of the client
-                        with Redis(
-                            connection_pool=self._redis_connection_pool
-                        ) as redis:
-                            client_key = client_rkey(address)
-                            redis.delete(client_key)
-
-                        return
-
-                # TODO: read atom sizes for compliance while reading buffer instead
-                # of decoding and re-encoding utf-8
-
-                buffer += data
-
-            # messages may be incomplete, so ensure to save the remainder of the
-            # buffer for the next parsing cycle
-            line, _, self._connection_buffer_map[address] = buffer.partition(
-                MSG_DELIMITER
-            )
+        self._connection_buffer_map[address] = LineFramer()
 
-            try:
-                # redundant, but nice to be explicit about whats happening here
-                resp = self.handle_message(
-                    socket, address, line.decode("utf-8", "strict")
-                )
-            except UnicodeDecodeError:
-                # as per spec impl recommendation, silently ignore any invalid messages.
-                # this will include any messages that are encoded validly but not UTF-8
-                continue
-            except ProtocolException as err:
-                # if a protocol exception happened, send back the error numeric
-                resp = Message(verb=err.numeric, params=err.params + [err.msg])
-
-            # send the response if exists, exhausting the entire bytestream
-            if resp:
-                socket.sendall(resp.to_line().encode("utf-8"))
-
-    def _check_context(self, context, verb):
-        # throw an unknown error (since no numeric is standardized) if the order of
-        # the messages is unexpected
-        if context and (
-            (isinstance(context, Callable) and not context(verb)) or context != verb
-        ):
-            raise ProtocolException(ErrorCode.ERR_UNKNOWNERROR)
-
-    def handle_message(
-        self, socket: Socket, address: Address, line: str
-    ) -> Optional[Message]:
-        msg = Message.from_line(line)
-        executor = COMMANDS[msg.verb]
-
-        with Redis(connection_pool=self._redis_connection_pool) as redis:
-            # ensure that the client is registered unless the command allows
-            # them to be unregistered (for commands sent in order to register)
-            client_key = client_rkey(address)
-            if not executor.allow_unregistered and get_statuses(redis, client_key) != [
-                ClientStatus.REGISTERED
-            ]:
-                raise ProtocolException(ErrorCode.ERR_NOTREGISTERED)
-
-            # attempt to cast all the given parameters to their expected types
-            casted_params = (
-                transform(executor.required_params, msg.params)
-                if executor.required_params
-                else None
+        # messages from other clients may be written to the connection at any time,
+        # so every write goes through its writer
+        writer = ConnectionWriter(socket, self._sendq, self._sendq_policy)
+        limiter = self.connect(address, writer.write)
+        self._serve(address, Connection(socket, writer, limiter))
+
+    def _serve(self, address: Address, connection: Connection) -> None:
+        """
+        Serves a connection until it's closed, or handed off. Lines already pending in
+        its buffer, such as those deferred before it was handed off, are handled first.
+        """
+        self._connections[address] = connection
+        connection.greenlet = gevent.getcurrent()
+        socket, writer = connection.socket, connection.writer
+        limiter = connection.limiter
+        framer = self._connection_buffer_map[address]
+        pending = len(framer) > 0
+        handed_off = False
+
+        try:
+            # read messages into the address's buffer until the socket is closed
+            while pending or framer.recv_into(socket):
+                pending = False
+                # messages may be incomplete, so the framer keeps the remainder of the
+                # buffer for the next parsing cycle. every complete message is handled
+                # together, and all their responses are sent at once
+                lines = framer.lines()
+                while True:
+                    with connection.busy:
+                        self.send(writer.write, self.handle_batch(address, lines))
+
+                    # a client sending too fast has the rest of its lines deferred
+                    # until it's earned enough tokens. nothing more is read from it
+                    # in the meantime, and no storage connection is held
+                    delay = limiter.delay()
+                    if not delay:
+                        break
+
+                    limiter.defer(delay)
+                    gevent.sleep(delay)
+                    # the line that put the client in debt may have been its last
+                    if not framer.has_line():
+                        break
+        except OSError:
+            # the connection broke, or the client was disconnected for not reading
+            # what it was sent
+            pass
+        except HandedOff:
+            # the connection is served by another process, and is still open
+            handed_off = True
+        finally:
+            if not handed_off:
+                with connection.busy:
+                    # delete all traces of the client
+                    del self._connections[address]
+                    self.disconnect(address)
+                    writer.close()
+                    del self._connection_buffer_map[address]
+                    # only the connections the server accepted are closed for it
+                    socket.close()
+
+    def hand_off(self, channel: Socket) -> bool:
+        """
+        Hands off the listening socket and every connection to the process at the
+        other end of the given channel, returning if it took them over. Connections
+        over TLS can't be handed off, since their keys are only known to OpenSSL, so
+        they're closed first. The server keeps serving every connection if the
+        handoff fails.
+        """
+        self.stop_accepting()
+        if self._bus_listener:
+            self._bus_listener.kill()
+
+        if self._tls:
+            gevent.killall(
+                [c.greenlet for c in self._connections.values() if c.greenlet]
             )
 
-            prev_msg = self._previous_messages.get(address)
-            if prev_msg:
-                del self._previous_messages[address]
-                # check if the preceding command is what the current one expects
-                self._check_context(executor.required_pre_context, prev_msg.verb)
-                # check if the current command is required by the preceding one
-                self._check_context(
-                    COMMANDS[prev_msg.verb].required_post_context, msg.verb
-                )
+        # every connection is stopped between batches, and nothing is written to any of
+        # them once they all are. those closed in the meantime are left out
+        for connection in list(self._connections.values()):
+            connection.busy.acquire()
+        connections = list(self._connections.items())
+        gevent.joinall([gevent.spawn(c.writer.close) for _, c in connections])
+
+        # the sockets of accepted connections are closed once they're served, so
+        # they're only served through copies from now on
+        for _, connection in connections:
+            connection.socket = connection.socket.dup()
+        gevent.killall([c.greenlet for _, c in connections if c.greenlet], HandedOff)
 
-            # actually process the incoming message and generate a response
-            response: Optional[Message] = executor.respond(
-                client_key,
-                msg,
-                redis,
-                prev_message=prev_msg,
-                casted_params=casted_params,
+        exported: List[Tuple[Socket, Dict[str, Any]]] = []
+        for address, connection in connections:
+            state = self.export_client(address)
+            pending, discarding = self._connection_buffer_map[address].pending()
+            state.update(pending=pending.hex(), discarding=discarding)
+            exported.append((connection.socket, state))
+
+        try:
+            handoff.send_handoff(
+                channel, Handoff(self._bus.node, self.socket, exported)
             )
+        except OSError:
+            # the replacement is gone, so the connections are served again as if
+            # nothing happened
+            for address, connection in connections:
+                writer = ConnectionWriter(
+                    connection.socket, self._sendq, self._sendq_policy
+                )
+                self._bus.attach(self._clients[address].key, writer.write)
+                connection.writer = writer
+                connection.busy.release()
+                self.pool.spawn(self._serve, address, connection)
+
+            if self._storage.shared:
+                self._bus_listener = gevent.spawn(self._bus.listen)
+            self.start_accepting()
+            return False
+
+        # the replacement has its own copies of every socket
+        for _, connection in connections:
+            connection.socket.close()
+        return True
+
+    def adopt(self, handoff: Handoff) -> None:
+        """
+        Takes over the node and every connection handed off by the server this one
+        replaces, before it's started. It must be listening on the handed off socket.
+        """
+        self._bus.node = handoff.node
+        connections = []
+        for socket, state in handoff.connections:
+            writer = ConnectionWriter(socket, self._sendq, self._sendq_policy)
+            address, limiter = self.adopt_client(state, writer.write)
+            framer = self._connection_buffer_map[address] = LineFramer()
+            framer.resume(bytes.fromhex(state["pending"]), state["discarding"])
+            connections.append((address, Connection(socket, writer, limiter)))
+
+        # no connection is served until every client is routed to, or messages for
+        # those adopted later would be published to this node before it's listening
+        for address, connection in connections:
+            self.pool.spawn(self._serve, address, connection)
+
+    def _await_handoff(self) -> None:
+        """Hands everything off to the first replacement that asks, and stops."""
+        assert self._handoff_path  # calm down mypy
+        listener = handoff.listen(self._handoff_path)
+        try:
+            while True:
+                channel, _ = listener.accept()
+                with channel:
+                    if self.hand_off(channel):
+                        break
+        finally:
+            listener.close()
+
+        # the replacement listens on its own copy of the listening socket, which is
+        # left open when this one is closed
+        gevent.spawn(self.stop)
+
+    def start(self) -> None:
+        super().start()
+        # receive messages for this node's clients from other nodes
+        if self._storage.shared:
+            self._bus_listener = gevent.spawn(self._bus.listen)
+            self._lease = gevent.spawn(self._bus.keep_alive)
+        if self._handoff_path:
+            self._handoff_listener = gevent.spawn(self._await_handoff)
 
-        # save the incoming context if requested
-        if executor.save_context:
-            self._previous_messages[address] = msg
+    def stop(self, timeout: Optional[float] = None) -> None:
+        if self._bus_listener:
+            self._bus_listener.kill()
+        if self._lease:
+            self._lease.kill()
+        if self._handoff_listener:
+            self._handoff_listener.kill()
 
-        return response
+        super().stop(timeout)
+        if self._tls:
+            self._tls.close()
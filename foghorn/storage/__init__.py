@@ -0,0 +1,60 @@
+import importlib
+from typing import Any
+
+from .base import HistoryEntry, StorageBackend, parse_history_id
+from .client import (
+    CAP_FLAGS,
+    CLIENT_CAPS_RKEY,
+    CLIENT_NODE_RKEY,
+    CLIENT_PASS_RKEY,
+    CLIENT_STATUS_RKEY,
+    CLIENT_VERSION_RKEY,
+    STATUS_BITS,
+    STATUS_CODES,
+    ClientState,
+    client_rkey,
+    decode_caps,
+    decode_statuses,
+    encode_caps,
+    encode_statuses,
+)
+
+# the backends are only imported once used, since most of them import a client of
+# their own, like redis-py, which is the bulk of foghorn's imports
+_BACKENDS = {
+    "AsyncRedisStorage": ".asyncredis",
+    "MemoryStorage": ".memory",
+    "RedisStorage": ".redis",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module = _BACKENDS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    return getattr(importlib.import_module(module, __name__), name)
+
+
+__all__ = [
+    "AsyncRedisStorage",
+    "CAP_FLAGS",
+    "CLIENT_CAPS_RKEY",
+    "CLIENT_NODE_RKEY",
+    "CLIENT_PASS_RKEY",
+    "CLIENT_STATUS_RKEY",
+    "CLIENT_VERSION_RKEY",
+    "STATUS_BITS",
+    "STATUS_CODES",
+    "ClientState",
+    "HistoryEntry",
+    "MemoryStorage",
+    "RedisStorage",
+    "StorageBackend",
+    "client_rkey",
+    "decode_caps",
+    "decode_statuses",
+    "encode_caps",
+    "encode_statuses",
+    "parse_history_id",
+]
@@ -0,0 +1,168 @@
+import asyncio
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from redis.asyncio import BlockingConnectionPool, Redis
+
+from ..bridge import await_
+from .base import HistoryEntry, StorageBackend
+from .redis import (
+    DELETE_NICK_SCRIPT,
+    HISTORY_LINE_FIELD,
+    NICKS_RKEY,
+    NODE_LEASE,
+    NODE_LEASE_RENEWAL,
+    channel_nodes_rkey,
+    channel_rkey,
+    history_range,
+    history_rkey,
+    nick_owner,
+    node_lease_rkey,
+    parse_nick_owner,
+)
+
+
+class AsyncRedisStorage(StorageBackend):
+    """
+    Storage kept in Redis, for the asyncio engine. It's the same storage as
+    RedisStorage, but talks to Redis using asyncio, and so can only be used from code
+    running under `run_sync`.
+    """
+
+    __slots__ = ("_redis",)
+
+    def __init__(self, redis: Redis):
+        self._redis = redis
+
+    @classmethod
+    def from_pool(
+        cls, max_connections: int = 100, timeout: int = 20, url: Optional[str] = None
+    ) -> "AsyncRedisStorage":
+        """
+        Creates storage backed by a blocking pool of connections to the Redis server
+        at the given URL, or the default local one.
+        """
+        kwargs = dict(max_connections=max_connections, timeout=timeout)
+        pool = (
+            BlockingConnectionPool.from_url(url, **kwargs)
+            if url
+            else BlockingConnectionPool(**kwargs)
+        )
+        return cls(Redis(connection_pool=pool))
+
+    def read_client(self, key: str) -> Dict[str, int]:
+        return {
+            field.decode("utf-8"): int(value)
+            for field, value in await_(self._redis.hgetall(key)).items()
+        }
+
+    def write_client(self, key: str, fields: Dict[str, int]) -> None:
+        await_(self._redis.hset(key, mapping=fields))
+
+    def delete_client(self, key: str) -> None:
+        await_(self._redis.delete(key))
+
+    def find_nick(self, nickname: str) -> Optional[str]:
+        owner = await_(self._redis.hget(NICKS_RKEY, nickname))
+        return parse_nick_owner(owner)[0] if owner is not None else None
+
+    def claim_nick(self, nickname: str, key: str, node: int) -> Tuple[str, int]:
+        # the nickname is only set if it's free, and whoever uses it is read back in
+        # the same transaction
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.hsetnx(NICKS_RKEY, nickname, nick_owner(key, node))
+        pipe.hget(NICKS_RKEY, nickname)
+        _, owner = await_(pipe.execute())
+        return parse_nick_owner(owner)
+
+    def delete_nick(self, nickname: str, key: str, node: int) -> None:
+        await_(
+            self._redis.eval(
+                DELETE_NICK_SCRIPT, 1, NICKS_RKEY, nickname, nick_owner(key, node)
+            )
+        )
+
+    def hold_lease(self, node: int) -> None:
+        while True:
+            await_(self._redis.set(node_lease_rkey(node), 1, ex=NODE_LEASE))
+            await_(asyncio.sleep(NODE_LEASE_RENEWAL))
+
+    def node_alive(self, node: int) -> bool:
+        return bool(await_(self._redis.exists(node_lease_rkey(node))))
+
+    def join_channel(self, channel: str, nickname: str, node: int) -> None:
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.sadd(channel_rkey(channel), nickname)
+        pipe.sadd(channel_nodes_rkey(channel), node)
+        await_(pipe.execute())
+
+    def part_channel(
+        self, channel: str, nickname: str, node: Optional[int] = None
+    ) -> None:
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.srem(channel_rkey(channel), nickname)
+        if node is not None:
+            pipe.srem(channel_nodes_rkey(channel), node)
+        await_(pipe.execute())
+
+    def channel_members(self, channel: str) -> Set[str]:
+        return {
+            member.decode("utf-8")
+            for member in await_(self._redis.smembers(channel_rkey(channel)))
+        }
+
+    def channel_nodes(self, channel: str) -> Set[int]:
+        return {
+            int(node)
+            for node in await_(self._redis.smembers(channel_nodes_rkey(channel)))
+        }
+
+    def append_history(self, target: str, line: bytes, length: int) -> str:
+        history_id = await_(
+            self._redis.xadd(
+                history_rkey(target),
+                {HISTORY_LINE_FIELD: line},
+                maxlen=length,
+                approximate=True,
+            )
+        )
+        return history_id.decode("utf-8")
+
+    def read_history(
+        self,
+        target: str,
+        after: Optional[str],
+        before: Optional[str],
+        count: int,
+        latest: bool,
+    ) -> List[HistoryEntry]:
+        low, high = history_range(after, before)
+        entries = (
+            await_(self._redis.xrevrange(history_rkey(target), high, low, count))[::-1]
+            if latest
+            else await_(self._redis.xrange(history_rkey(target), low, high, count))
+        )
+        return [
+            (history_id.decode("utf-8"), fields[HISTORY_LINE_FIELD])
+            for history_id, fields in entries
+        ]
+
+    def publish(self, channel: str, payload: bytes) -> None:
+        await_(self._redis.publish(channel, payload))
+
+    def subscribe(self, channel: str) -> Iterator[bytes]:
+        # subscriptions hold a dedicated connection of their own for as long as
+        # they're listened to
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await_(pubsub.subscribe(channel))
+        try:
+            while True:
+                message = await_(
+                    pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+                )
+                if message:
+                    yield message["data"]
+        finally:
+            await_(pubsub.reset())
+
+    def close(self) -> None:
+        await_(self._redis.connection_pool.disconnect())
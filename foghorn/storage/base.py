@@ -0,0 +1,156 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# every line of history is identified like an entry of a Redis stream, by the
+# millisecond it was added at and a sequence number within it
+HistoryEntry = Tuple[str, bytes]
+
+
+def parse_history_id(history_id: str) -> Tuple[int, int]:
+    """
+    Returns the millisecond and sequence number of the given history id, which order
+    it among the others. Raises a ValueError if it's malformed.
+    """
+    ms, _, seq = history_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class StorageBackend(ABC):
+    """
+    The shared state of the server, which outlives any single connection and is
+    visible to every worker using the same storage.
+    """
+
+    __slots__ = ()
+
+    # if the storage is visible to other workers, which may send messages through it
+    shared = True
+
+    @contextmanager
+    def session(self) -> Iterator["StorageBackend"]:
+        """
+        Returns a view of this storage to be used for a batch of operations from a
+        single greenlet. Backends talking to an external service hold a single
+        connection for the duration of the session.
+        """
+        yield self
+
+    @abstractmethod
+    def read_client(self, key: str) -> Dict[str, int]:
+        """Returns all the stored fields of the given client."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def write_client(self, key: str, fields: Dict[str, int]) -> None:
+        """Sets the given fields of the given client, leaving any others untouched."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def delete_client(self, key: str) -> None:
+        """Deletes all the stored fields of the given client."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def find_nick(self, nickname: str) -> Optional[str]:
+        """Returns the key of the client using the given nickname, if there is one."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def claim_nick(self, nickname: str, key: str, node: int) -> Tuple[str, int]:
+        """
+        Records the given client of the given node as the one using the given
+        nickname, unless another one already is, atomically. Returns the key of the
+        client using it, and its node.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def delete_nick(self, nickname: str, key: str, node: int) -> None:
+        """
+        Frees up the given nickname, only if it's still used by the given client of the
+        given node, atomically.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def hold_lease(self, node: int) -> None:
+        """
+        Keeps the lease of the given node, which tells other nodes it's still running,
+        blocking the current greenlet for as long as it's held.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def node_alive(self, node: int) -> bool:
+        """
+        Returns if the given node still holds its lease. The nicknames used by clients
+        of nodes that stopped holding it, like crashed ones, can be claimed again.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def join_channel(self, channel: str, nickname: str, node: int) -> None:
+        """Adds the given member of the given node to the given channel."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def part_channel(
+        self, channel: str, nickname: str, node: Optional[int] = None
+    ) -> None:
+        """
+        Removes the given member from the given channel. If a node is given, it has no
+        members left in the channel.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def channel_members(self, channel: str) -> Set[str]:
+        """Returns the nicknames of every member of the given channel."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def channel_nodes(self, channel: str) -> Set[int]:
+        """Returns every node with members in the given channel."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def append_history(self, target: str, line: bytes, length: int) -> str:
+        """
+        Appends an encoded line to the history of the given target, which keeps about
+        the given number of its latest lines. Returns the id of the line.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def read_history(
+        self,
+        target: str,
+        after: Optional[str],
+        before: Optional[str],
+        count: int,
+        latest: bool,
+    ) -> List[HistoryEntry]:
+        """
+        Returns up to the given number of lines from the history of the given target,
+        with their ids, oldest first. Only lines between the given ids (excluding
+        them) are returned, the latest of them if latest is set, or the earliest
+        otherwise.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def publish(self, channel: str, payload: bytes) -> None:
+        """Sends the payload to every current subscriber of the given channel."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def subscribe(self, channel: str) -> Iterator[bytes]:
+        """
+        Yields every payload published to the given channel from now on, blocking the
+        current greenlet until the next one arrives.
+        """
+        raise NotImplementedError()
+
+    def close(self) -> None:
+        """Releases any resources held by this storage."""
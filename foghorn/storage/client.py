@@ -0,0 +1,154 @@
+from typing import TYPE_CHECKING, Dict, List, Optional, Set
+
+from ..enums import Capabilities, ClientStatus
+from ..typing import Address
+
+if TYPE_CHECKING:
+    from .base import StorageBackend
+
+CLIENT_STATUS_RKEY = "status"
+CLIENT_CAPS_RKEY = "caps"
+CLIENT_VERSION_RKEY = "version"
+CLIENT_NODE_RKEY = "node"
+CLIENT_PASS_RKEY = "password"
+
+# every capability is a single bit of the stored bitmask
+CAP_FLAGS = {cap: 1 << i for i, cap in enumerate(Capabilities)}
+# statuses are stored as a stack of small codes, the current one in the lowest bits.
+# zero is reserved for the bottom of the stack
+STATUS_CODES = {status.name: i for i, status in enumerate(ClientStatus, start=1)}
+STATUS_BITS = max(STATUS_CODES.values()).bit_length()
+
+
+def client_rkey(addr: Address) -> str:
+    """Returns the redis key for the given client address."""
+    return f"client:{addr[0]}@{addr[1]}"
+
+
+def encode_caps(caps: Set[Capabilities]) -> int:
+    """Encodes a set of capabilities into a bitmask."""
+    mask = 0
+    for cap in caps:
+        mask |= CAP_FLAGS[cap]
+
+    return mask
+
+
+def decode_caps(mask: int) -> Set[Capabilities]:
+    """Decodes a bitmask into the set of capabilities it contains."""
+    return {cap for cap, flag in CAP_FLAGS.items() if mask & flag}
+
+
+def encode_statuses(statuses: List[ClientStatus]) -> int:
+    """Encodes a list of statuses into a stack of status codes."""
+    stack = 0
+    for status in reversed(statuses):
+        stack = (stack << STATUS_BITS) | STATUS_CODES[status.name]
+
+    return stack
+
+
+def decode_statuses(stack: int) -> List[ClientStatus]:
+    """Decodes a stack of status codes into the list of statuses it contains."""
+    statuses, members = [], list(ClientStatus)
+    while stack:
+        statuses.append(members[(stack & ((1 << STATUS_BITS) - 1)) - 1])
+        stack >>= STATUS_BITS
+
+    return statuses
+
+
+class ClientState:
+    """
+    The state of a single connected client. It is authoritative within the worker that
+    owns the client's connection, so reading it never requires a round-trip. Changes
+    are recorded as they're made and mirrored to storage all at once when flushed.
+    """
+
+    __slots__ = (
+        "key",
+        "nickname",
+        "username",
+        "channels",
+        "_statuses",
+        "_caps",
+        "_version",
+        "_node",
+        "_changes",
+    )
+
+    def __init__(self, key: str, node: Optional[int] = None):
+        self.key = key
+        self._changes: Dict[str, int] = {}
+
+        # the names the client registered with, if it has yet
+        self.nickname: Optional[str] = None
+        self.username: Optional[str] = None
+        # the channels the client is a member of
+        self.channels: Set[str] = set()
+
+        # new clients are always unregistered
+        self.statuses = [ClientStatus.UNREGISTERED]
+        self.caps = set()
+        self.version = None
+        self.node = node
+
+    @property
+    def statuses(self) -> List[ClientStatus]:
+        """
+        The registration statuses of the client, the current one being first. Any
+        following statuses are those to restore once the current one ends.
+        """
+        return self._statuses
+
+    @statuses.setter
+    def statuses(self, statuses: List[ClientStatus]) -> None:
+        self._statuses = statuses
+        self._changes[CLIENT_STATUS_RKEY] = encode_statuses(statuses)
+
+    @property
+    def caps(self) -> Set[Capabilities]:
+        """The capabilities negotiated by the client."""
+        return self._caps
+
+    @caps.setter
+    def caps(self, caps: Set[Capabilities]) -> None:
+        self._caps = caps
+        self._changes[CLIENT_CAPS_RKEY] = encode_caps(caps)
+
+    @property
+    def version(self) -> Optional[int]:
+        """The capability negotiation version the client supports, if it's known."""
+        return self._version
+
+    @version.setter
+    def version(self, version: Optional[int]) -> None:
+        self._version = version
+        if version is not None:
+            self._changes[CLIENT_VERSION_RKEY] = version
+
+    @property
+    def node(self) -> Optional[int]:
+        """The node the client is connected to, which messages for it are sent to."""
+        return self._node
+
+    @node.setter
+    def node(self, node: Optional[int]) -> None:
+        self._node = node
+        if node is not None:
+            self._changes[CLIENT_NODE_RKEY] = node
+
+    @property
+    def dirty(self) -> bool:
+        """If there are changes that haven't been mirrored to storage yet."""
+        return bool(self._changes)
+
+    def flush(self, storage: "StorageBackend") -> None:
+        """
+        Mirrors all changes since the last flush to storage in a single round-trip.
+        Since this state is authoritative, changes are written as absolute values rather
+        than read-modify-writes, and they're all applied at once.
+        """
+        if self._changes:
+            storage.write_client(self.key, self._changes)
+            self._changes = {}
@@ -0,0 +1,120 @@
+import time
+from collections import deque
+from typing import Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from gevent.queue import Queue
+
+from .base import HistoryEntry, StorageBackend, parse_history_id
+
+
+class MemoryStorage(StorageBackend):
+    """
+    Storage kept entirely within the current process. It is only visible to a single
+    worker, but requires no external service, so it's suited for single-node
+    deployments, tests, and benchmarking the server in isolation.
+    """
+
+    __slots__ = ("_clients", "_nicks", "_channels", "_history", "_subscribers")
+
+    shared = False
+
+    def __init__(self):
+        self._clients: Dict[str, Dict[str, int]] = {}
+        # the key of the client using every nickname, and its node
+        self._nicks: Dict[str, Tuple[str, int]] = {}
+        # the members of every channel, and the nodes they're connected to
+        self._channels: Dict[str, Dict[str, int]] = {}
+        # a ring buffer of the latest lines of every target, with their ids
+        self._history: Dict[str, Deque[Tuple[Tuple[int, int], str, bytes]]] = {}
+        # the queue of every subscriber, per channel
+        self._subscribers: Dict[str, List[Queue]] = {}
+
+    def read_client(self, key: str) -> Dict[str, int]:
+        return dict(self._clients.get(key, {}))
+
+    def write_client(self, key: str, fields: Dict[str, int]) -> None:
+        self._clients.setdefault(key, {}).update(fields)
+
+    def delete_client(self, key: str) -> None:
+        self._clients.pop(key, None)
+
+    def find_nick(self, nickname: str) -> Optional[str]:
+        owner = self._nicks.get(nickname)
+        return owner[0] if owner else None
+
+    def claim_nick(self, nickname: str, key: str, node: int) -> Tuple[str, int]:
+        return self._nicks.setdefault(nickname, (key, node))
+
+    def delete_nick(self, nickname: str, key: str, node: int) -> None:
+        if self._nicks.get(nickname) == (key, node):
+            del self._nicks[nickname]
+
+    def hold_lease(self, node: int) -> None:
+        # the storage only lives as long as the process using it, so every node
+        # using it is running
+        pass
+
+    def node_alive(self, node: int) -> bool:
+        return True
+
+    def join_channel(self, channel: str, nickname: str, node: int) -> None:
+        self._channels.setdefault(channel, {})[nickname] = node
+
+    def part_channel(
+        self, channel: str, nickname: str, node: Optional[int] = None
+    ) -> None:
+        members = self._channels.get(channel, {})
+        members.pop(nickname, None)
+        if not members:
+            self._channels.pop(channel, None)
+
+    def channel_members(self, channel: str) -> Set[str]:
+        return set(self._channels.get(channel, ()))
+
+    def channel_nodes(self, channel: str) -> Set[int]:
+        return set(self._channels.get(channel, {}).values())
+
+    def append_history(self, target: str, line: bytes, length: int) -> str:
+        history = self._history.get(target)
+        if history is None:
+            history = self._history[target] = deque(maxlen=length)
+
+        # ids are generated like those of Redis streams, always increasing
+        ms, seq = int(time.time() * 1000), 0
+        if history and history[-1][0] >= (ms, seq):
+            ms, seq = history[-1][0][0], history[-1][0][1] + 1
+
+        history_id = f"{ms}-{seq}"
+        history.append(((ms, seq), history_id, line))
+        return history_id
+
+    def read_history(
+        self,
+        target: str,
+        after: Optional[str],
+        before: Optional[str],
+        count: int,
+        latest: bool,
+    ) -> List[HistoryEntry]:
+        low = parse_history_id(after) if after else None
+        high = parse_history_id(before) if before else None
+        entries = [
+            (history_id, line)
+            for key, history_id, line in self._history.get(target, ())
+            if (low is None or key > low) and (high is None or key < high)
+        ]
+        return entries[-count:] if latest else entries[:count]
+
+    def publish(self, channel: str, payload: bytes) -> None:
+        for queue in self._subscribers.get(channel, ()):
+            queue.put(payload)
+
+    def subscribe(self, channel: str) -> Iterator[bytes]:
+        queue: Queue = Queue()
+        subscribers = self._subscribers.setdefault(channel, [])
+        subscribers.append(queue)
+        try:
+            while True:
+                yield queue.get()
+        finally:
+            subscribers.remove(queue)
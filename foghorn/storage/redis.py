@@ -0,0 +1,207 @@
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import gevent
+from gevent.queue import LifoQueue
+from redis import BlockingConnectionPool, Redis
+
+from .base import HistoryEntry, StorageBackend
+
+# the hash of every nickname in use, and the node and key of the client using it
+NICKS_RKEY = "nicks"
+# frees up a nickname, only if it's still used by the given client, in a single step
+DELETE_NICK_SCRIPT = """
+if redis.call("HGET", KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call("HDEL", KEYS[1], ARGV[1])
+end
+return 0
+"""
+# how long the lease of a node lasts unless it's renewed, in seconds, and how often
+# it's renewed
+NODE_LEASE = 30
+NODE_LEASE_RENEWAL = NODE_LEASE / 3
+# the field of every entry of a history stream holding its line
+HISTORY_LINE_FIELD = b"line"
+
+
+def channel_rkey(channel: str) -> str:
+    """Returns the redis key of the set of members of the given channel."""
+    return f"channel:{channel}"
+
+
+def history_rkey(target: str) -> str:
+    """Returns the redis key of the stream of the history of the given target."""
+    return f"history:{target}"
+
+
+def history_range(after: Optional[str], before: Optional[str]) -> Tuple[str, str]:
+    """Returns the bounds of a stream range between the given ids, excluding them."""
+    return (f"({after}" if after else "-", f"({before}" if before else "+")
+
+
+def node_lease_rkey(node: int) -> str:
+    """Returns the redis key that exists for as long as the given node is running."""
+    return f"node:{node}:lease"
+
+
+def nick_owner(key: str, node: int) -> str:
+    """Returns the value recording the given client of the given node in NICKS_RKEY."""
+    return f"{node}:{key}"
+
+
+def parse_nick_owner(owner: bytes) -> Tuple[str, int]:
+    """Returns the key and node of the client recorded by a value of NICKS_RKEY."""
+    node, _, key = owner.decode("utf-8").partition(":")
+    return key, int(node)
+
+
+def channel_nodes_rkey(channel: str) -> str:
+    """Returns the redis key of the set of nodes with members in the given channel."""
+    return f"channel:{channel}:nodes"
+
+
+class RedisStorage(StorageBackend):
+    """
+    Storage kept in Redis, which is shared by every worker connected to the same
+    Redis server.
+    """
+
+    __slots__ = ("_redis",)
+
+    def __init__(self, redis: Redis):
+        self._redis = redis
+
+    @classmethod
+    def from_pool(
+        cls, max_connections: int = 100, timeout: int = 20, url: Optional[str] = None
+    ) -> "RedisStorage":
+        """
+        Creates storage backed by a blocking pool of connections to the Redis server
+        at the given URL, or the default local one.
+        """
+        kwargs = dict(
+            queue_class=LifoQueue, max_connections=max_connections, timeout=timeout
+        )
+        pool = (
+            BlockingConnectionPool.from_url(url, **kwargs)
+            if url
+            else BlockingConnectionPool(**kwargs)
+        )
+        return cls(Redis(connection_pool=pool))
+
+    @contextmanager
+    def session(self) -> Iterator[StorageBackend]:
+        # check a single connection out of the pool for the entire session
+        with Redis(
+            connection_pool=self._redis.connection_pool, single_connection_client=True
+        ) as redis:
+            yield RedisStorage(redis)
+
+    def read_client(self, key: str) -> Dict[str, int]:
+        return {
+            field.decode("utf-8"): int(value)
+            for field, value in self._redis.hgetall(key).items()
+        }
+
+    def write_client(self, key: str, fields: Dict[str, int]) -> None:
+        self._redis.hset(key, mapping=fields)
+
+    def delete_client(self, key: str) -> None:
+        self._redis.delete(key)
+
+    def find_nick(self, nickname: str) -> Optional[str]:
+        owner = self._redis.hget(NICKS_RKEY, nickname)
+        return parse_nick_owner(owner)[0] if owner is not None else None
+
+    def claim_nick(self, nickname: str, key: str, node: int) -> Tuple[str, int]:
+        # the nickname is only set if it's free, and whoever uses it is read back in
+        # the same transaction
+        with self._redis.pipeline() as pipe:
+            pipe.hsetnx(NICKS_RKEY, nickname, nick_owner(key, node))
+            pipe.hget(NICKS_RKEY, nickname)
+            _, owner = pipe.execute()
+        return parse_nick_owner(owner)
+
+    def delete_nick(self, nickname: str, key: str, node: int) -> None:
+        self._redis.eval(
+            DELETE_NICK_SCRIPT, 1, NICKS_RKEY, nickname, nick_owner(key, node)
+        )
+
+    def hold_lease(self, node: int) -> None:
+        while True:
+            self._redis.set(node_lease_rkey(node), 1, ex=NODE_LEASE)
+            gevent.sleep(NODE_LEASE_RENEWAL)
+
+    def node_alive(self, node: int) -> bool:
+        return bool(self._redis.exists(node_lease_rkey(node)))
+
+    def join_channel(self, channel: str, nickname: str, node: int) -> None:
+        with self._redis.pipeline(transaction=False) as pipe:
+            pipe.sadd(channel_rkey(channel), nickname)
+            pipe.sadd(channel_nodes_rkey(channel), node)
+            pipe.execute()
+
+    def part_channel(
+        self, channel: str, nickname: str, node: Optional[int] = None
+    ) -> None:
+        with self._redis.pipeline(transaction=False) as pipe:
+            pipe.srem(channel_rkey(channel), nickname)
+            if node is not None:
+                pipe.srem(channel_nodes_rkey(channel), node)
+            pipe.execute()
+
+    def channel_members(self, channel: str) -> Set[str]:
+        return {
+            member.decode("utf-8")
+            for member in self._redis.smembers(channel_rkey(channel))
+        }
+
+    def channel_nodes(self, channel: str) -> Set[int]:
+        return {int(node) for node in self._redis.smembers(channel_nodes_rkey(channel))}
+
+    def append_history(self, target: str, line: bytes, length: int) -> str:
+        # the stream is only trimmed once whole nodes of it can be dropped, which is
+        # far cheaper than keeping it at an exact length
+        history_id = self._redis.xadd(
+            history_rkey(target),
+            {HISTORY_LINE_FIELD: line},
+            maxlen=length,
+            approximate=True,
+        )
+        return history_id.decode("utf-8")
+
+    def read_history(
+        self,
+        target: str,
+        after: Optional[str],
+        before: Optional[str],
+        count: int,
+        latest: bool,
+    ) -> List[HistoryEntry]:
+        low, high = history_range(after, before)
+        entries = (
+            self._redis.xrevrange(history_rkey(target), high, low, count)[::-1]
+            if latest
+            else self._redis.xrange(history_rkey(target), low, high, count)
+        )
+        return [
+            (history_id.decode("utf-8"), fields[HISTORY_LINE_FIELD])
+            for history_id, fields in entries
+        ]
+
+    def publish(self, channel: str, payload: bytes) -> None:
+        self._redis.publish(channel, payload)
+
+    def subscribe(self, channel: str) -> Iterator[bytes]:
+        # subscriptions hold a dedicated connection of their own for as long as
+        # they're listened to
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+        try:
+            for message in pubsub.listen():
+                yield message["data"]
+        finally:
+            pubsub.close()
+
+    def close(self) -> None:
+        self._redis.connection_pool.disconnect()
@@ -0,0 +1,179 @@
+"""
+TLS for connections served by greenlets. Handshakes are by far the most expensive part
+of TLS, so returning clients resume their sessions through session tickets, skipping
+the key exchange, and handshakes can be run on a pool of threads rather than the hub.
+OpenSSL releases the GIL while computing, so a storm of reconnecting clients keeps
+several cores busy instead of stalling every other connection of the worker.
+
+Records are encrypted and decrypted in memory, and sent through the plain socket, so
+a connection over TLS is written to with vectored writes like any other.
+"""
+import ssl
+from typing import List, Optional, Union
+
+from gevent import Timeout
+from gevent.lock import Semaphore
+from gevent.threadpool import ThreadPool
+
+from .typing import Socket
+
+# only forward-secret key exchanges, with AEAD ciphers that most CPUs accelerate. TLS
+# 1.3 only has suites like these, so this only restricts TLS 1.2
+CIPHERS = "ECDHE+AESGCM:ECDHE+CHACHA20"
+# the tickets issued after every TLS 1.3 handshake, each of them resuming a session once
+SESSION_TICKETS = 2
+# the longest a client is given to complete its handshake, in seconds
+HANDSHAKE_TIMEOUT = 10.0
+# the most bytes received from the socket at once, being a whole record
+RECV_SIZE = 1 << 14
+
+
+def server_context(certfile: str, keyfile: Optional[str] = None) -> ssl.SSLContext:
+    """
+    Returns the context of the server side of TLS connections, with the given
+    certificate chain and the key in the given file (or the certificate file).
+
+    The keys session tickets are encrypted with are generated with the context, so
+    tickets are only accepted by workers forked after it was created.
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.set_ciphers(CIPHERS)
+    # clients can't force expensive handshakes by renegotiating
+    context.options |= (
+        ssl.OP_NO_COMPRESSION
+        | ssl.OP_CIPHER_SERVER_PREFERENCE
+        | ssl.OP_SINGLE_ECDH_USE
+        | getattr(ssl, "OP_NO_RENEGOTIATION", 0)
+    )
+    # tickets are always issued, but how many only can be set on 3.8+
+    if hasattr(context, "num_tickets"):
+        context.num_tickets = SESSION_TICKETS
+
+    context.load_cert_chain(certfile, keyfile)
+    return context
+
+
+class TLSConnection:
+    """
+    A connection over TLS, used like the plain socket it wraps. Anything sent by
+    several greenlets at once is sent in the order it was encrypted.
+    """
+
+    __slots__ = ("_socket", "_tls", "_incoming", "_outgoing", "_sending")
+
+    def __init__(
+        self,
+        socket: Socket,
+        tls: ssl.SSLObject,
+        incoming: ssl.MemoryBIO,
+        outgoing: ssl.MemoryBIO,
+    ):
+        self._socket = socket
+        self._tls = tls
+        self._incoming = incoming
+        self._outgoing = outgoing
+        self._sending = Semaphore()
+
+    @property
+    def session_reused(self) -> bool:
+        """If the connection resumed a previous session rather than starting anew."""
+        return self._tls.session_reused
+
+    def _flush(self, flags: int = 0) -> None:
+        """Sends every record encrypted so far."""
+        with self._sending:
+            records = self._outgoing.read()
+            if records:
+                self._socket.sendall(records, flags)
+
+    def _fill(self) -> bool:
+        """Receives more records, returning False once the socket is closed."""
+        records = self._socket.recv(RECV_SIZE)
+        if not records:
+            self._incoming.write_eof()
+            return False
+
+        self._incoming.write(records)
+        return True
+
+    def recv_into(self, buffer: memoryview) -> int:
+        while True:
+            try:
+                return self._tls.read(len(buffer), buffer)
+            except ssl.SSLWantReadError:
+                # the client may have sent messages of the protocol itself, like key
+                # updates, that have to be answered first
+                self._flush()
+                if not self._fill():
+                    return 0
+            except ssl.SSLZeroReturnError:
+                # the client closed the connection cleanly
+                return 0
+
+    def sendmsg(
+        self,
+        buffers: List[Union[bytes, memoryview]],
+        ancdata: tuple = (),
+        flags: int = 0,
+    ) -> int:
+        data = b"".join(buffers)
+        view, written = memoryview(data), 0
+        while written < len(data):
+            written += self._tls.write(view[written:])
+
+        self._flush(flags)
+        return written
+
+    def shutdown(self, how: int) -> None:
+        self._socket.shutdown(how)
+
+    def close(self) -> None:
+        self._socket.close()
+
+
+class TLSAcceptor:
+    """
+    Completes the handshakes of incoming connections, on a pool of the given number
+    of threads, or on the hub without any.
+    """
+
+    __slots__ = ("context", "_pool")
+
+    def __init__(self, context: ssl.SSLContext, threads: int = 0):
+        self.context = context
+        self._pool = ThreadPool(threads) if threads else None
+
+    def accept(self, socket: Socket) -> TLSConnection:
+        """
+        Completes the handshake of the given connection, returning it over TLS. Raises
+        an OSError if the client fails to complete it in time.
+        """
+        incoming, outgoing = ssl.MemoryBIO(), ssl.MemoryBIO()
+        tls = self.context.wrap_bio(incoming, outgoing, server_side=True)
+        connection = TLSConnection(socket, tls, incoming, outgoing)
+
+        with Timeout(HANDSHAKE_TIMEOUT, TimeoutError):
+            while True:
+                try:
+                    # only the computations are run on the pool, while the greenlet
+                    # does all the waiting for records
+                    if self._pool:
+                        self._pool.apply(tls.do_handshake)
+                    else:
+                        tls.do_handshake()
+                    break
+                except ssl.SSLWantReadError:
+                    connection._flush()
+                    if not connection._fill():
+                        raise ConnectionResetError("The handshake was cut short.")
+
+            # the end of the handshake, and any session tickets
+            connection._flush()
+
+        return connection
+
+    def close(self) -> None:
+        """Stops every thread of the pool."""
+        if self._pool:
+            self._pool.kill()
@@ -1,37 +1,97 @@
-from typing import Any, Callable, Iterator, List, Tuple, Type
+import dataclasses
+import socket
+import sys
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, List, Tuple, Type, TypeVar
 
-from gevent._socket3 import socket
-
-Socket = socket
+# the sockets of connections. they're gevent's once the standard library is patched
+Socket = socket.socket
 Address = Tuple[str, int]  # ip address, port
 
+T = TypeVar("T")
 
-def typecaster(t: Type, many=False, optional=False) -> Callable:
+# slotted dataclasses are only supported on 3.10+, so older versions are given their
+# slots by `slotted` instead
+DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+def slotted(cls: Type[T]) -> Type[T]:
     """
-    Returns a function to cast the next arg in an iterator to the provided type. If
-    optional=True, individual parameters that don't exist are treated as optional. If
-    many=True, the returned Callable will accept and cast all items in the iterator.
-    In both cases, arguments are exhausted as they are casted.
+    Recreates a dataclass with __slots__ for its fields instead of an instance
+    dictionary, as `dataclass(slots=True)` does. Dataclasses that already have them
+    are returned as they are.
     """
-    if many and optional:
-        raise TypeError(
-            "'many' and 'optional' are mutually exclusive options, and cannot both be"
-            " set to `True`."
-        )
+    if "__slots__" in cls.__dict__:
+        return cls
+
+    fields = dataclasses.fields(cls)
+    namespace = dict(cls.__dict__)
+    # the defaults of the fields would shadow their slots, and are only looked up on
+    # the class for fields that aren't initialized, so those are set on every instance
+    for name in (*(f.name for f in fields), "__dict__", "__weakref__"):
+        namespace.pop(name, None)
+    namespace["__slots__"] = tuple(f.name for f in fields)
+
+    defaults = [
+        (f.name, f.default)
+        for f in fields
+        if not f.init and f.default is not dataclasses.MISSING
+    ]
+    if defaults:
+        init = namespace["__init__"]
+
+        def __init__(self, *args, **kwargs):
+            for name, default in defaults:
+                object.__setattr__(self, name, default)
+            init(self, *args, **kwargs)
+
+        namespace["__init__"] = __init__
+
+    slotted_cls = type(cls)(cls.__name__, cls.__bases__, namespace)
+    slotted_cls.__qualname__ = cls.__qualname__
+    return slotted_cls
+
 
-    def _cast(params: List[str], args: Iterator) -> Any:
-        if many:
+@slotted
+@dataclass(frozen=True, **DATACLASS_SLOTS)
+class Typecaster:
+    """
+    Casts the next arg in an iterator to the given type, or all the remaining ones if
+    many=True. Since what it casts is known up front, casters of whole commands can be
+    precomposed from these.
+    """
+
+    type: Type
+    many: bool = False
+    optional: bool = False
+
+    def __call__(self, params: List[str], args: Iterator) -> Any:
+        if self.many:
             # cast all remaining parameters to the given type
-            return [t(next(args)) for _ in params]
+            return [self.type(next(args)) for _ in params]
         else:
             # attempt to case the current parameter to the given type,
             # returning None if non-existent
             try:
-                return t(next(args))
+                return self.type(next(args))
             except StopIteration:
-                if not optional:
+                if not self.optional:
                     raise
 
                 return None
 
-    return _cast
+
+def typecaster(t: Type, many=False, optional=False) -> Callable:
+    """
+    Returns a function to cast the next arg in an iterator to the provided type. If
+    optional=True, individual parameters that don't exist are treated as optional. If
+    many=True, the returned Callable will accept and cast all items in the iterator.
+    In both cases, arguments are exhausted as they are casted.
+    """
+    if many and optional:
+        raise TypeError(
+            "'many' and 'optional' are mutually exclusive options, and cannot both be"
+            " set to `True`."
+        )
+
+    return Typecaster(t, many, optional)
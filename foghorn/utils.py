@@ -2,10 +2,12 @@
 Different miscellaneous utility functions for parsing, ingestion, and egestion of
 message packets sent to and from foghorn.
 """
-from typing import Callable, List
+from functools import partial
+from typing import Any, Callable, List
 
 from .enums import ErrorCode
 from .errors import ProtocolException
+from .typing import Typecaster
 
 
 def transform(transformers: List[Callable], args: List[str]):
@@ -18,12 +20,18 @@ def transform(transformers: List[Callable], args: List[str]):
     aiter = iter(args)
     for transformer in transformers:
         try:
-            transformed.extend(transformer(args, aiter))
+            casted = transformer(args, aiter)
         except (TypeError, ValueError, StopIteration):
             # something went wrong during transformation, so the param was
             # super invalid or missing when expected
             raise ProtocolException(ErrorCode.ERR_NEEDMOREPARAMS)
 
+        # transformers casting many arguments return all of them at once
+        if isinstance(casted, list):
+            transformed.extend(casted)
+        else:
+            transformed.append(casted)
+
     # if there are remaining parameters, the incoming message must be
     # malformed for this server and is not processible, as the parameters
     # are unexpected
@@ -34,3 +42,47 @@ def transform(transformers: List[Callable], args: List[str]):
         pass
 
     return transformed
+
+
+def compose(transformers: List[Callable]) -> Callable[[List[str]], List[Any]]:
+    """
+    Precomposes the provided transformers into a single function casting a whole list
+    of arguments, exactly like transform would. Typecasters are known to cast one
+    argument each (or all the remaining ones, if last), so arguments are cast straight
+    by position. Any other transformers are simply run through transform.
+    """
+    if not all(isinstance(t, Typecaster) for t in transformers) or any(
+        t.many for t in transformers[:-1]
+    ):
+        return partial(transform, transformers)
+
+    many = transformers[-1].type if transformers and transformers[-1].many else None
+    positional = transformers[:-1] if many else transformers
+    types = [t.type for t in positional]
+    count = len(types)
+    # every argument up to the last one that isn't optional must be given
+    required = max(
+        (i + 1 for i, t in enumerate(positional) if not t.optional), default=0
+    )
+
+    def cast(args: List[str]) -> List[Any]:
+        try:
+            casted = [t(arg) for t, arg in zip(types, args)]
+            if many:
+                casted.extend(many(arg) for arg in args[count:])
+        except (TypeError, ValueError):
+            raise ProtocolException(ErrorCode.ERR_NEEDMOREPARAMS)
+
+        if len(args) < required:
+            raise ProtocolException(ErrorCode.ERR_NEEDMOREPARAMS)
+        elif len(args) > count and not many:
+            raise ProtocolException(
+                ErrorCode.ERR_UNKNOWNERROR, msg="Too many parameters."
+            )
+        elif len(args) < count:
+            # missing optional arguments are cast to None
+            casted.extend([None] * (count - len(args)))
+
+        return casted
+
+    return cast
@@ -0,0 +1,121 @@
+"""
+Pre-forked worker processes serving clients from a single shared port, so that the
+server isn't limited to a single core. All client state is kept in the shared storage,
+so it's visible regardless of which worker a client is connected to.
+"""
+import os
+import signal
+import socket
+import time
+from typing import Callable, Dict
+
+from .profiling import PROFILE_SIGNAL
+from .typing import Address, Socket
+
+# the number of pending connections each listening socket queues up
+LISTEN_BACKLOG = 1024
+# workers dying sooner than this after being spawned are restarted with a delay, so a
+# worker that can't start doesn't turn into a fork loop
+MIN_WORKER_LIFETIME = 1.0
+
+REUSE_PORT = hasattr(socket, "SO_REUSEPORT")
+
+
+def bind_listener(address: Address, reuse_port: bool = False) -> Socket:
+    """
+    Creates a socket listening on the given address. If reuse_port=True, every worker
+    can bind its own socket to the same address, and the kernel balances incoming
+    connections between them.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+    sock.bind(address)
+    sock.listen(LISTEN_BACKLOG)
+    return sock
+
+
+class Supervisor:
+    """
+    Forks the given number of workers, each running the given function until it
+    returns, and restarts any worker that dies until the supervisor itself is asked
+    to stop with SIGINT or SIGTERM.
+    """
+
+    def __init__(self, run_worker: Callable[[], None], workers: int):
+        self._run_worker = run_worker
+        self._workers = workers
+        # the pid of every live worker, with the time it was spawned at
+        self._children: Dict[int, float] = {}
+        self._stopping = False
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid:
+            self._children[pid] = time.monotonic()
+            return
+
+        # workers are stopped by the supervisor, and shouldn't run its handlers
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        # until the worker handles it itself, profiling isn't toggled
+        if PROFILE_SIGNAL is not None:
+            signal.signal(PROFILE_SIGNAL, signal.SIG_IGN)
+
+        status = 0
+        try:
+            self._run_worker()
+        except BaseException:
+            status = 1
+            raise
+        finally:
+            # never return into the supervisor's code
+            os._exit(status)
+
+    def _stop(self, signum: int, _) -> None:
+        self._stopping = True
+        for pid in self._children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _forward(self, signum: int, _) -> None:
+        for pid in self._children:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        """Runs all the workers, blocking until they've all stopped."""
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGTERM, self._stop)
+        # the supervisor handles no clients, so every worker profiles itself
+        if PROFILE_SIGNAL is not None:
+            signal.signal(PROFILE_SIGNAL, self._forward)
+
+        for _ in range(self._workers):
+            self._spawn()
+
+        while self._children:
+            try:
+                pid, _ = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+
+            spawned_at = self._children.pop(pid, None)
+            if spawned_at is None or self._stopping:
+                continue
+
+            # replace the dead worker, waiting a bit if it died right away
+            lifetime = time.monotonic() - spawned_at
+            if lifetime < MIN_WORKER_LIFETIME:
+                time.sleep(MIN_WORKER_LIFETIME - lifetime)
+
+            if not self._stopping:
+                self._spawn()
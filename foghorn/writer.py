@@ -0,0 +1,235 @@
+"""
+Per-connection writing of outgoing message lines, decoupled from whoever produced them.
+"""
+import socket as _socket
+from collections import deque
+from typing import Deque, List, Optional, Union
+
+import gevent
+from gevent.event import Event
+from gevent.hub import Waiter, get_hub
+
+from .message import Message
+from .parsing import MSG_DELIMITER
+from .sendq import DEFAULT_SENDQ, SendQPolicy
+from .typing import Socket
+
+# how long a closing connection is given to send whatever is still queued for it
+CLOSE_TIMEOUT = 5.0
+# the most buffers written by a single vectored write
+MAX_WRITE_BUFFERS = 1024
+# not every platform has non-blocking sends (like Windows), nor vectored writes
+MSG_DONTWAIT: Optional[int] = getattr(_socket, "MSG_DONTWAIT", None)
+
+# sent to clients evicted for not reading fast enough, just before disconnecting them
+SENDQ_EXCEEDED = Message(verb="ERROR", params=["SendQ exceeded"]).to_bytes()
+
+# writers that were given data while idle. they're all woken up together by a single
+# callback of the hub, so fanning a message out doesn't schedule one per connection
+_waking_writers: List["ConnectionWriter"] = []
+
+
+def _wake_writers() -> None:
+    writers = _waking_writers[:]
+    _waking_writers.clear()
+    for writer in writers:
+        writer._wake()
+
+
+class ConnectionWriter:
+    """
+    Writes to a single connection from a greenlet of its own. Anything can queue data
+    for the connection without ever waiting on its socket, so a message can be fanned
+    out to any number of connections without the sender blocking on a slow one. Data
+    queued while a write is in progress is coalesced into the next one, which writes
+    every buffer at once without joining them.
+
+    The bytes queued for the connection, including those being written, are limited
+    to the given budget, and anything written beyond it is handled according to the
+    given policy.
+    """
+
+    __slots__ = (
+        "dropped",
+        "_socket",
+        "_pending",
+        "_queued",
+        "_max_bytes",
+        "_policy",
+        "_drained",
+        "_waiter",
+        "_waking",
+        "_closing",
+        "_closed",
+        "_vectored",
+        "_greenlet",
+    )
+
+    def __init__(
+        self,
+        socket: Socket,
+        max_bytes: int = DEFAULT_SENDQ,
+        policy: SendQPolicy = SendQPolicy.DISCONNECT,
+    ):
+        # the number of writes discarded since the queue was full
+        self.dropped = 0
+
+        self._socket = socket
+        self._pending: Deque[bytes] = deque()
+        self._queued = 0
+        self._max_bytes = max_bytes
+        self._policy = policy
+        # set whenever queued data has been written, for writes waiting for room
+        self._drained = Event()
+        # set while the writer is idle, waiting for data
+        self._waiter: Optional[Waiter] = None
+        # if the writer is already about to be woken up
+        self._waking = False
+        self._closing = self._closed = False
+        # without vectored writes, buffers are joined and written at once instead
+        self._vectored = hasattr(socket, "sendmsg")
+        self._greenlet = gevent.spawn(self._run)
+
+    @property
+    def queued(self) -> int:
+        """The number of bytes queued for the connection which haven't been written."""
+        return self._queued
+
+    def write(self, data: bytes) -> None:
+        """
+        Queues the data to be written to the connection. If the queue is full, the
+        data is handled according to the policy of the writer.
+        """
+        if self._closed:
+            return
+
+        # anything fits into an empty queue, so nothing is ever too long to write
+        if self._queued and self._queued + len(data) > self._max_bytes:
+            if self._policy is SendQPolicy.DROP:
+                self.dropped += 1
+                return
+            elif self._policy is SendQPolicy.DISCONNECT:
+                self._evict()
+                return
+
+            while self._queued and self._queued + len(data) > self._max_bytes:
+                self._drained.clear()
+                self._drained.wait()
+                if self._closed:
+                    return
+
+        self._pending.append(data)
+        self._queued += len(data)
+        if self._waiter is not None and not self._waking:
+            self._schedule()
+
+    def close(self, timeout: Optional[float] = CLOSE_TIMEOUT) -> None:
+        """
+        Stops accepting data, waiting for everything queued before to be written.
+        Anything still unwritten after the timeout is discarded.
+        """
+        self._closing = True
+        if self._waiter is not None and not self._waking:
+            self._schedule()
+
+        self._greenlet.join(timeout)
+        self._greenlet.kill()
+
+    def _evict(self) -> None:
+        # nothing else is ever written to the connection
+        self._closed = True
+        self._pending.clear()
+        self._queued = 0
+        gevent.spawn(self._disconnect)
+
+    def _disconnect(self) -> None:
+        # the writer may be stuck in the middle of a write, so it's stopped first
+        self._greenlet.kill()
+        try:
+            # the reason is only sent if it fits in the socket's buffer right away.
+            # the last write may have been cut short, so it starts on a new line
+            if self._vectored and MSG_DONTWAIT is not None:
+                self._socket.sendmsg([MSG_DELIMITER, SENDQ_EXCEEDED], (), MSG_DONTWAIT)
+            else:
+                # the write is given no time to wait for room instead
+                with gevent.Timeout(0, False):
+                    self._write([MSG_DELIMITER, SENDQ_EXCEEDED])
+        except OSError:
+            pass
+
+        try:
+            # wake the connection's reader up, so the client is cleaned up
+            self._socket.shutdown(_socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _schedule(self) -> None:
+        self._waking = True
+        if not _waking_writers:
+            get_hub().loop.run_callback(_wake_writers)
+
+        _waking_writers.append(self)
+
+    def _wake(self) -> None:
+        # runs within the hub
+        self._waking = False
+        if self._waiter is not None:
+            self._waiter.switch(None)
+
+    def _write(self, buffers: List[Union[bytes, memoryview]]) -> int:
+        if self._vectored:
+            return self._socket.sendmsg(buffers)
+
+        data = b"".join(buffers)
+        self._socket.sendall(data)
+        return len(data)
+
+    def _send(self, buffers: List[Union[bytes, memoryview]]) -> None:
+        while buffers:
+            sent = self._write(buffers)
+            self._queued -= sent
+
+            # skip the buffers that were written entirely, and the written part of
+            # the first one that wasn't
+            i = 0
+            while i < len(buffers) and sent >= len(buffers[i]):
+                sent -= len(buffers[i])
+                i += 1
+
+            buffers = buffers[i:]
+            if sent:
+                buffers[0] = memoryview(buffers[0])[sent:]
+
+    def _run(self) -> None:
+        pending = self._pending
+        try:
+            while True:
+                if not pending:
+                    if self._closing:
+                        return
+
+                    self._waiter = Waiter()
+                    try:
+                        self._waiter.get()
+                    finally:
+                        self._waiter = None
+
+                    continue
+
+                count = min(len(pending), MAX_WRITE_BUFFERS)
+                buffers: List[Union[bytes, memoryview]] = [
+                    pending.popleft() for _ in range(count)
+                ]
+                try:
+                    self._send(buffers)
+                except OSError:
+                    # the connection is broken, and its own greenlet cleans up
+                    # after it
+                    return
+
+                if self._policy is SendQPolicy.BLOCK:
+                    self._drained.set()
+        finally:
+            self._closed = True
+            # never leave anyone waiting for room that won't ever be made
+            self._drained.set()
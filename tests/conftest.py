@@ -1,5 +1,9 @@
 import pytest
 
+# the tests of both engines share a process, so the standard library is patched for
+# gevent before any of them is collected, as the gevent engine expects
+from foghorn import patching  # noqa: F401
+
 
 # a hacky way to get around our per-parsing Command validation. probably
 # a better alternative to forcing string checking and recasting to the enum
@@ -15,6 +19,9 @@ class DynamicEnumMock:
         def __contains__(self, x):
             return True
 
+        def get(self, key, default=None):
+            return key
+
 
 @pytest.fixture
 def mock_enum(monkeypatch):
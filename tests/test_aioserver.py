@@ -0,0 +1,59 @@
+import asyncio
+import socket
+
+from foghorn.aioserver import AsyncIRCServer
+from foghorn.bridge import await_, run_sync
+from foghorn.storage import MemoryStorage
+
+
+def test_run_sync():
+    async def double(value):
+        await asyncio.sleep(0)
+        return value * 2
+
+    async def main():
+        # functions that never await anything finish right away
+        assert run_sync(lambda: None) is None
+
+        results = []
+        pending = run_sync(lambda: results.append(await_(double(2)) + 1))
+        assert pending and not results
+        await pending
+        assert results == [5]
+
+    asyncio.run(main())
+
+
+def test_serve():
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    server = AsyncIRCServer("127.0.0.1", storage=MemoryStorage(), listener=listener)
+
+    async def register(nickname):
+        reader, writer = await asyncio.open_connection(*server.address)
+        writer.write(f"NICK {nickname}\r\nUSER {nickname} 0 * :N\r\n".encode("utf-8"))
+        assert (await reader.readline()).startswith(f"001 {nickname}".encode("utf-8"))
+        return reader, writer
+
+    async def main():
+        started = asyncio.get_running_loop().create_future()
+        serving = asyncio.ensure_future(server.serve(lambda: started.set_result(None)))
+        await started
+
+        (alice, alice_writer), (bob, bob_writer) = [
+            await register(nickname) for nickname in ("alice", "bob")
+        ]
+        alice_writer.write(b"PRIVMSG bob :hi there\r\nFOO\r\n")
+        assert await alice.readline() == b"421 :Unknown command.\r\n"
+        assert await bob.readline() == b":alice PRIVMSG bob :hi there\r\n"
+
+        # all traces of clients are deleted once they disconnect
+        for writer in (alice_writer, bob_writer):
+            writer.close()
+        await asyncio.sleep(0.1)
+        assert not server._clients
+
+        serving.cancel()
+
+    asyncio.run(main())
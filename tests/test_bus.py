@@ -0,0 +1,81 @@
+import gevent
+
+from foghorn.bus import MessageBus
+from foghorn.storage import ClientState, MemoryStorage
+
+KEY = "client:127.0.0.1@50000"
+
+
+def test_local_delivery():
+    storage = MemoryStorage()
+    bus = MessageBus(storage)
+    received = []
+    bus.attach(KEY, received.append)
+
+    # clients of the same node are written to directly, without publishing anything
+    assert bus.send(KEY, b"PRIVMSG coolguy :hi\r\n", storage)
+    assert received == [b"PRIVMSG coolguy :hi\r\n"]
+    assert not bus._outbox
+
+    bus.detach(KEY)
+    assert not bus.send(KEY, b"PRIVMSG coolguy :hi\r\n", storage)
+
+
+def test_remote_delivery():
+    storage = MemoryStorage()
+    sender, recipient = MessageBus(storage), MessageBus(storage)
+    received = []
+    recipient.attach(KEY, received.append)
+    ClientState(KEY, node=recipient.node).flush(storage)
+
+    listener = gevent.spawn(recipient.listen)
+    gevent.sleep(0)
+
+    # lines for another node are only published once flushed, all at once
+    assert sender.send(KEY, b"PRIVMSG coolguy :hi\r\n", storage)
+    assert sender.send(KEY, b"NOTICE coolguy :bye\r\n", storage)
+    gevent.sleep(0)
+    assert not received
+
+    sender.flush(storage)
+    gevent.sleep(0)
+    assert received == [b"PRIVMSG coolguy :hi\r\n", b"NOTICE coolguy :bye\r\n"]
+
+    listener.kill()
+
+
+def test_channel_broadcast():
+    storage = MemoryStorage()
+    local, remote = MessageBus(storage), MessageBus(storage)
+    received = {}
+    for bus, nickname in ((local, "alice"), (local, "bob"), (remote, "carol")):
+        client = ClientState(f"client:{nickname}", node=bus.node)
+        client.nickname = nickname
+        received[nickname] = []
+        bus.attach(client.key, received[nickname].append)
+        bus.join("#foghorn", client, storage)
+
+    alice = [c for c in local._channels["#foghorn"] if c.nickname == "alice"][0]
+    assert local.members("#foghorn", storage) == ["alice", "bob", "carol"]
+
+    listener = gevent.spawn(remote.listen)
+    gevent.sleep(0)
+
+    # local members get the line right away, and the remote node gets it once
+    local.broadcast("#foghorn", b":alice PRIVMSG #foghorn hi\r\n", storage, alice)
+    assert received == {
+        "alice": [],
+        "bob": [b":alice PRIVMSG #foghorn hi\r\n"],
+        "carol": [],
+    }
+    local.flush(storage)
+    gevent.sleep(0)
+    assert received["carol"] == [b":alice PRIVMSG #foghorn hi\r\n"]
+
+    # once every local member parts, the node stops being sent the channel's messages
+    for client in list(local._channels["#foghorn"]):
+        local.part("#foghorn", client, storage)
+    assert storage.channel_nodes("#foghorn") == {remote.node}
+    assert remote.members("#foghorn", storage) == ["carol"]
+
+    listener.kill()
@@ -0,0 +1,160 @@
+import gevent
+from gevent import socket
+
+from foghorn.capabilities import split_caps
+from foghorn.commands import COMMANDS
+from foghorn.enums import Capabilities, CapSubCommand, ClientStatus, Command
+from foghorn.message import Message
+from foghorn.server import IRCServer
+from foghorn.storage import (
+    ClientState,
+    MemoryStorage,
+    decode_caps,
+    decode_statuses,
+    encode_caps,
+    encode_statuses,
+)
+
+
+class RecordingStorage(MemoryStorage):
+    """Records every write made to it."""
+
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+
+    def write_client(self, key, fields):
+        super().write_client(key, fields)
+        self.writes.append((key, dict(fields)))
+
+
+def cap(client: ClientState, line: str):
+    return COMMANDS[Command.CAP].respond(
+        client, Message.from_line(line), MemoryStorage()
+    )
+
+
+def test_cap_negotiation():
+    client = ClientState("client:127.0.0.1@6697")
+
+    resp = cap(client, "CAP LS 302")
+    assert resp and resp[0].params[:2] == ["*", "LS"]
+    assert client.statuses == [ClientStatus.NEGOTIATING, ClientStatus.UNREGISTERED]
+    assert client.version == 302
+
+    # a lower version doesn't override the negotiated one
+    cap(client, "CAP LS")
+    assert client.version == 302
+
+    resp = cap(client, "CAP REQ :message-tags")
+    assert resp and resp.params == ["*", "ACK", "message-tags"]
+    assert resp.to_bytes() == b"CAP * ACK message-tags\r\n"
+    assert client.caps == {Capabilities.MESSAGE_TAGS}
+
+    resp = cap(client, "CAP REQ :-message-tags unknown-cap")
+    assert resp and resp.params[:2] == ["*", "NAK"]
+    assert client.caps == {Capabilities.MESSAGE_TAGS}
+
+    # removals are acknowledged as they were requested
+    resp = cap(client, "CAP REQ :-message-tags")
+    assert resp and resp.to_bytes() == b"CAP * ACK -message-tags\r\n"
+    assert client.caps == set()
+
+    resp = cap(client, "CAP REQ :batch -message-tags")
+    assert resp and resp.to_bytes() == b"CAP * ACK :-message-tags batch\r\n"
+    assert client.caps == {Capabilities.BATCH}
+
+    assert cap(client, "CAP END") is None
+    assert client.statuses == [ClientStatus.UNREGISTERED]
+
+
+def test_client_state_flush():
+    client = ClientState("client:127.0.0.1@6697")
+    storage = RecordingStorage()
+
+    # the initial state of a client is mirrored
+    client.flush(storage)
+    assert storage.writes == [("client:127.0.0.1@6697", {"status": 1, "caps": 0})]
+
+    # nothing is written when nothing changed
+    client.flush(storage)
+    assert len(storage.writes) == 1
+
+    cap(client, "CAP LS 302")
+    cap(client, "CAP REQ :message-tags")
+    assert client.dirty
+
+    # all changes are written at once
+    client.flush(storage)
+    assert not client.dirty
+    assert storage.writes[1:] == [
+        (
+            "client:127.0.0.1@6697",
+            {
+                "status": encode_statuses(
+                    [ClientStatus.NEGOTIATING, ClientStatus.UNREGISTERED]
+                ),
+                "version": 302,
+                "caps": 1,
+            },
+        )
+    ]
+    assert storage.read_client("client:127.0.0.1@6697")["version"] == 302
+
+
+def test_client_state_encoding():
+    statuses = [ClientStatus.NEGOTIATING, ClientStatus.REGISTERED]
+    assert decode_statuses(encode_statuses(statuses)) == statuses
+    assert decode_statuses(encode_statuses([])) == []
+
+    caps = {Capabilities.MESSAGE_TAGS}
+    assert decode_caps(encode_caps(caps)) == caps
+    assert decode_caps(0) == set()
+
+
+def test_split_caps():
+    caps = [f"cap-{i}" for i in range(20)]
+    replies = split_caps(CapSubCommand.LS, caps, multiline=True, max_length=40)
+
+    # every line fits, and all but the last are marked as continued
+    assert all(len(reply.to_bytes()) <= 40 for reply in replies)
+    assert [reply.params[2] for reply in replies[:-1]] == ["*"] * (len(replies) - 1)
+    assert " ".join(reply.params[-1] for reply in replies).split() == caps
+
+    (reply,) = split_caps(CapSubCommand.LS, caps, multiline=False, max_length=40)
+    assert reply.params[2:] == caps
+
+
+def test_cap_notify():
+    server = IRCServer("127.0.0.1", storage=MemoryStorage())
+    sockets, handlers = [], []
+    for port, version in ((50001, b"302"), (50002, b"301")):
+        client, conn = socket.socketpair()
+        handlers.append(gevent.spawn(server.handle, conn, ("127.0.0.1", port)))
+        client.sendall(
+            b"CAP LS " + version + b"\r\nCAP REQ message-tags\r\nNICK n" + version
+        )
+        client.sendall(b"\r\nUSER u 0 * :U\r\nCAP END\r\n")
+        assert client.recv(4096).endswith(
+            b"CAP * ACK message-tags\r\n001 n" + version + b" :Welcome to the "
+            b"Network, n" + version + b"\r\n"
+        )
+        sockets.append(client)
+
+    # only the client that negotiated version 302 is notified, but the capability is
+    # disabled for both of them
+    modern, legacy = sockets
+    try:
+        server.withdraw(Capabilities.MESSAGE_TAGS)
+        assert modern.recv(4096) == b"CAP * DEL message-tags\r\n"
+        assert all(not client.caps for client in server._clients.values())
+
+        legacy.sendall(b"CAP REQ message-tags\r\n")
+        assert legacy.recv(4096) == b"CAP * NAK message-tags\r\n"
+    finally:
+        server.advertise(Capabilities.MESSAGE_TAGS)
+
+    assert modern.recv(4096) == b"CAP * NEW message-tags\r\n"
+    for client in sockets:
+        client.close()
+    gevent.joinall(handlers, timeout=5)
@@ -0,0 +1,72 @@
+import time
+
+from foghorn.flood import FloodControl, TokenBucket
+from foghorn.server import IRCServer
+from foghorn.storage import MemoryStorage
+
+from .test_server import converse
+
+
+class CountingServer(IRCServer):
+    """Counts the batches it handles."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batches = 0
+
+    def handle_batch(self, address, lines):
+        self.batches += 1
+        return super().handle_batch(address, lines)
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2, capacity=4)
+    now = bucket._updated
+
+    bucket.take(5, now)
+    # one token short, which takes half a second at two tokens per second
+    assert bucket.debt(now) == 0.5
+    assert bucket.debt(now + 0.5) == 0
+
+    # the bucket never fills up beyond its capacity
+    bucket.take(5, now + 60)
+    assert bucket.debt(now + 60) == 0.5
+
+
+def test_ip_bucket_is_shared():
+    control = FloodControl(client_burst=10, ip_burst=4)
+    first = control.connect(("127.0.0.1", 50000))
+    second = control.connect(("127.0.0.1", 50001))
+    other = control.connect(("127.0.0.2", 50000))
+
+    first.charge(5)
+    # the second connection is deferred for the first one's lines, but not others
+    assert second.delay() > 0 and not other.delay()
+
+    control.disconnect(("127.0.0.1", 50000))
+    control.disconnect(("127.0.0.1", 50001))
+    assert control.stats()["ips"] == 1
+
+
+def test_flooding_client_is_deferred():
+    control = FloodControl(client_rate=50, client_burst=5)
+    server = IRCServer("127.0.0.1", storage=MemoryStorage(), flood_control=control)
+
+    start = time.monotonic()
+    replies = converse(server, b"FOO\r\n" * 15)
+    elapsed = time.monotonic() - start
+
+    # every line is still handled, but those past the burst at the sustained rate
+    assert replies.count(b"421") == 15
+    assert elapsed >= 10 / 50 * 0.9
+    assert control.throttled and control.deferred >= 10 / 50 * 0.9
+
+
+def test_deferred_last_line():
+    control = FloodControl(client_rate=50, client_burst=5)
+    server = CountingServer("127.0.0.1", storage=MemoryStorage(), flood_control=control)
+
+    # the last line puts the client in debt, and nothing is left to handle after it
+    replies = converse(server, b"FOO\r\n" * 6)
+    assert replies.count(b"421") == 6
+    assert control.throttled and server.batches == 1
@@ -0,0 +1,90 @@
+from typing import List
+
+import pytest
+
+from foghorn.framing import MAX_LINE_LENGTH, LineFramer
+
+
+class ChunkedSocket:
+    """Delivers the given chunks of data one read at a time."""
+
+    def __init__(self, chunks: List[bytes]):
+        self.chunks = list(chunks)
+
+    def recv_into(self, view: memoryview) -> int:
+        if not self.chunks:
+            return 0
+
+        chunk = self.chunks.pop(0)
+        # never deliver more than the buffer can hold
+        view[: len(chunk)] = chunk[: len(view)]
+        if len(chunk) > len(view):
+            self.chunks.insert(0, chunk[len(view) :])
+
+        return min(len(chunk), len(view))
+
+
+def frame(chunks: List[bytes], size: int = 0) -> List:
+    framer = LineFramer(size) if size else LineFramer()
+    socket = ChunkedSocket(chunks)
+
+    lines = []
+    while framer.recv_into(socket):
+        lines.extend(framer.lines())
+
+    return lines
+
+
+def test_pipelined_lines():
+    assert frame([b"CAP LS 302\r\nNICK foo\r\nUSER a 0 * :b\r\n"]) == [
+        b"CAP LS 302",
+        b"NICK foo",
+        b"USER a 0 * :b",
+    ]
+
+
+def test_trickled_line():
+    assert frame([bytes([b]) for b in b"NICK foo\r\nNICK bar\r\n"]) == [
+        b"NICK foo",
+        b"NICK bar",
+    ]
+
+
+def test_split_delimiter():
+    assert frame([b"NICK foo\r", b"\nNICK bar\r", b"\n"]) == [b"NICK foo", b"NICK bar"]
+
+
+def test_has_line():
+    framer = LineFramer()
+    framer.recv_into(ChunkedSocket([b"NICK foo\r\nNICK bar\r\nNICK b"]))
+    lines = framer.lines()
+    assert next(lines) == b"NICK foo" and framer.has_line()
+    assert next(lines) == b"NICK bar" and not framer.has_line()
+
+
+def test_incomplete_line_kept():
+    framer = LineFramer()
+    framer.recv_into(ChunkedSocket([b"NICK foo\r\nNICK b"]))
+    assert list(framer.lines()) == [b"NICK foo"]
+    assert len(framer) == len(b"NICK b")
+
+
+@pytest.mark.parametrize("size", [0, MAX_LINE_LENGTH])
+def test_maximum_length_line(size):
+    line = b"@" + b"a" * (MAX_LINE_LENGTH - 3)
+    assert frame([line[:1000], line[1000:] + b"\r\n"] * 3, size) == [line] * 3
+
+
+@pytest.mark.parametrize("size", [0, MAX_LINE_LENGTH])
+def test_oversized_line_dropped(size):
+    line = b"@" + b"a" * (MAX_LINE_LENGTH * 3)
+    assert frame([b"NICK foo\r\n", line, b"\r\nNICK bar\r\n"], size) == [
+        b"NICK foo",
+        None,
+        b"NICK bar",
+    ]
+    # oversized lines received all at once are dropped too
+    assert frame([line[: MAX_LINE_LENGTH - 1] + b"\r\nNICK bar\r\n"]) == [
+        None,
+        b"NICK bar",
+    ]
@@ -0,0 +1,90 @@
+import os
+import sys
+import tempfile
+
+import gevent
+import pytest
+from gevent import socket
+
+from foghorn.handoff import take_over
+from foghorn.server import IRCServer
+from foghorn.storage import MemoryStorage
+
+# connections are handed off as descriptors passed over Unix sockets
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="SCM_RIGHTS is unsupported on Windows"
+)
+
+
+def _expect(client, reply: bytes) -> bytes:
+    data = b""
+    while reply not in data:
+        chunk = client.recv(4096)
+        assert chunk, data
+        data += chunk
+
+    return data
+
+
+def test_handoff():
+    path = os.path.join(tempfile.mkdtemp(), "handoff.sock")
+    # both servers share the storage, like workers sharing Redis
+    storage = MemoryStorage()
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    address = listener.getsockname()
+
+    old = IRCServer("127.0.0.1", storage=storage, listener=listener, handoff_path=path)
+    old.start()
+    alice = socket.create_connection(address)
+    alice.sendall(b"NICK alice\r\nUSER alice 0 * :A\r\nJOIN #foghorn\r\n")
+    _expect(alice, b"366 alice #foghorn")
+    # a partial line, and a command expecting the next one to follow it
+    alice.sendall(b"PRIVMSG #foghorn :hel")
+    bob = socket.create_connection(address)
+    bob.sendall(b"NICK bob\r\n")
+    with gevent.Timeout(5):
+        while not old._previous_messages or sum(
+            map(len, old._connection_buffer_map.values())
+        ) < len(b"PRIVMSG #foghorn :hel"):
+            gevent.sleep(0.01)
+
+    # a replacement going away before taking over leaves every connection as it was
+    channel = socket.socket(socket.AF_UNIX)
+    channel.connect(path)
+    channel.recv(1)
+    channel.close()
+    with gevent.Timeout(5):
+        while any(c.busy.locked() for c in old._connections.values()):
+            gevent.sleep(0.01)
+
+    handoff = take_over(path)
+    assert handoff and len(handoff.connections) == 2
+    # the server that handed everything off stops right after
+    with gevent.Timeout(5):
+        while old.started:
+            gevent.sleep(0.01)
+
+    new = IRCServer(
+        "127.0.0.1", storage=storage, listener=handoff.listener, handoff_path=path
+    )
+    new.adopt(handoff)
+    new.start()
+    assert new._bus.node == old._bus.node
+
+    # clients carry on where they left off, and newcomers are accepted
+    bob.sendall(b"USER bob 0 * :B\r\nJOIN #foghorn\r\n")
+    _expect(bob, b"366 bob #foghorn")
+    alice.sendall(b"lo\r\n")
+    assert b":alice PRIVMSG #foghorn hello\r\n" in _expect(bob, b"hello\r\n")
+
+    carol = socket.create_connection(address)
+    carol.sendall(b"NICK alice\r\nUSER carol 0 * :C\r\n")
+    assert b"433" in _expect(carol, b"\r\n")
+
+    # without a server to take over from, there's nothing to adopt
+    for client in (alice, bob, carol):
+        client.close()
+    new.stop()
+    assert take_over(path) is None
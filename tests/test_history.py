@@ -0,0 +1,75 @@
+import re
+
+from foghorn.history import History, history_tags
+from foghorn.server import IRCServer
+from foghorn.storage import MemoryStorage
+
+from .test_server import converse
+
+
+def test_read():
+    storage = MemoryStorage()
+    history = History(length=5, cached_lines=3)
+    for i in range(8):
+        history.append("#foghorn", b"line %d\r\n" % i, storage)
+
+    # only the latest lines are kept
+    entries = storage.read_history("#foghorn", None, None, 10, False)
+    assert [line for _, line in entries] == [b"line %d\r\n" % i for i in range(3, 8)]
+    ids = [history_id for history_id, _ in entries]
+
+    # whether they're cached or not, lines are read the same as from storage
+    for after, before, count, latest in (
+        (None, None, 2, True),
+        (None, None, 4, True),
+        (None, ids[3], 2, True),
+        (ids[0], None, 2, False),
+        (ids[2], None, 5, False),
+        (ids[0], ids[4], 5, False),
+    ):
+        expected = [
+            (history_tags(history_id), line)
+            for history_id, line in storage.read_history(
+                "#foghorn", after, before, count, latest
+            )
+        ]
+        assert history.read("#foghorn", after, before, count, latest, storage) == (
+            expected
+        )
+
+    # lines appended through other nodes are only seen once the cache is invalidated
+    storage.append_history("#foghorn", b"remote\r\n", 5)
+    assert history.read("#foghorn", None, None, 1, True, storage)[0][1] != (
+        b"remote\r\n"
+    )
+    history.invalidate("#foghorn")
+    assert history.read("#foghorn", None, None, 1, True, storage)[0][1] == (
+        b"remote\r\n"
+    )
+
+
+def test_chathistory():
+    server = IRCServer("127.0.0.1", storage=MemoryStorage())
+
+    replies = converse(
+        server,
+        b"CAP LS 302\r\nCAP REQ :batch message-tags\r\nCAP END\r\n"
+        b"NICK alice\r\nUSER alice 0 * :A\r\nJOIN #foghorn\r\n"
+        b"PRIVMSG #foghorn :one\r\nNOTICE #foghorn :two\r\nPRIVMSG #foghorn three\r\n"
+        b"CHATHISTORY LATEST #foghorn * 2\r\nCHATHISTORY LATEST #elsewhere * 2\r\n"
+        b"CHATHISTORY AROUND #foghorn * 2\r\nCHATHISTORY BEFORE #foghorn * 2\r\n",
+    ).split(b"\r\n")
+    batch, first, second, end = replies[-8:-4]
+    assert replies[-4:] == [
+        b"442 alice #elsewhere :You're not on that channel.",
+        b"400 :Unknown subcommand AROUND.",
+        b"461 :Not enough parameters.",
+        b"",
+    ]
+
+    # the latest stored lines are replayed in a batch, with their tags
+    ref = re.fullmatch(rb"BATCH \+(\d+) chathistory #foghorn", batch).group(1)
+    assert end == b"BATCH -" + ref
+    pattern = rb"@batch=%s;time=[\d\-T:.]+Z;msgid=\d+-\d+ :alice %s #foghorn :?%s"
+    assert re.fullmatch(pattern % (ref, b"NOTICE", b"two"), first)
+    assert re.fullmatch(pattern % (ref, b"PRIVMSG", b"three"), second)
@@ -1,7 +1,9 @@
 import pytest
 from parser_tests.data import mask_match, msg_join, msg_split
 
+from foghorn.errors import ProtocolException
 from foghorn.message import Message
+from foghorn.parsing import MAX_MESSAGE_LENGTH, MAX_TAGS_LENGTH
 
 
 @pytest.mark.parametrize(
@@ -43,3 +45,66 @@ def test_msg_join(mock_enum, line):
 def test_mask_expression_match(mask, matches, fails):
     candidates = matches + fails
     assert Message.match_expression(mask, candidates) == matches
+
+
+def test_msg_split_bytes(mock_enum):
+    msg = Message.from_line(b"@a=b\\sc :coolguy  foo bar  :baz \xc3\xa9")
+    assert msg.tags == {"a": "b c"}
+    assert msg.source == "coolguy"
+    assert msg.verb == "foo"
+    assert msg.params == ["bar", "baz é"]
+
+
+def test_msg_split_invalid_utf8(mock_enum):
+    with pytest.raises(UnicodeDecodeError):
+        Message.from_line(b"foo bar :\xff")
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        b"@" + b"a" * MAX_TAGS_LENGTH + b" foo",
+        b"foo :" + b"a" * MAX_MESSAGE_LENGTH,
+    ],
+)
+def test_msg_split_too_long(mock_enum, line):
+    with pytest.raises(ProtocolException):
+        Message.from_line(line)
+
+
+def test_msg_tags_lazy(mock_enum):
+    msg = Message.from_line("@a=b\\1;c foo")
+    assert msg.tags._decoded is None
+    # relayed tags are reused as they were received
+    assert msg.to_line() == "@a=b\\1;c foo"
+    assert msg.tags._decoded is None
+
+    assert msg.tags == {"a": "b1", "c": ""}
+    assert msg.tags._decoded is not None
+
+
+def test_msg_tags_escaped(mock_enum):
+    msg = Message(verb="foo", params=[], tags={"a": "b; \\\r\n", "c": ""})
+    assert msg.to_line() == "@a=b\\:\\s\\\\\\r\\n;c foo"
+
+
+def test_msg_to_bytes(mock_enum):
+    msg = Message(verb="foo", params=["bar", "baz qux"])
+    line = msg.to_bytes()
+    assert line == b"foo bar :baz qux\r\n"
+    # the line is only encoded once
+    assert msg.to_bytes() is line
+    assert msg == Message(verb="foo", params=["bar", "baz qux"])
+
+
+def test_mask_expressions_match():
+    masks = [test["mask"] for test in mask_match["tests"]] + ["cool!ab@127.0.0.1"]
+    candidates = [c for test in mask_match["tests"] for c in test["fails"]]
+    candidates += [c for test in mask_match["tests"] for c in test["matches"]]
+
+    matches = Message.match_expressions(masks, candidates)
+    assert list(matches) == masks
+    for mask in masks:
+        assert matches[mask] == Message.match_expression(mask, candidates)
+
+    assert matches["cool!ab@127.0.0.1"] == ["cool!ab@127.0.0.1"]
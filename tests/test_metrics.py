@@ -0,0 +1,69 @@
+from urllib.request import urlopen
+
+from foghorn.enums import Command
+from foghorn.metrics import Counter, Histogram, serve_metrics
+from foghorn.server import IRCServer
+from foghorn.storage import MemoryStorage
+
+from .test_server import converse
+
+
+def test_render():
+    counter = Counter("lines_total", "Lines.", "command")
+    counter.inc(Command.NICK)
+    counter.inc(Command.NICK, 2)
+    counter.inc('a"b')
+    assert list(counter.render()) == [
+        "# HELP lines_total Lines.",
+        "# TYPE lines_total counter",
+        'lines_total{command="NICK"} 3',
+        'lines_total{command="a\\"b"} 1',
+    ]
+
+    histogram = Histogram("seconds", "Seconds.", buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(seconds)
+    assert list(histogram.render())[2:] == [
+        'seconds_bucket{le="0.1"} 2',
+        'seconds_bucket{le="1.0"} 3',
+        'seconds_bucket{le="+Inf"} 4',
+        "seconds_sum 2.65",
+        "seconds_count 4",
+    ]
+
+
+def test_stats():
+    server = IRCServer("127.0.0.1", storage=MemoryStorage(), enable_metrics=True)
+    replies = converse(
+        server, b"NICK stats\r\nUSER stats 0 * :S\r\nSTATS m\r\nSTATS u\r\nSTATS\r\n"
+    ).split(b"\r\n")
+
+    # other tests may have handled lines already, so only the commands are known
+    assert replies[0].startswith(b"001 stats")
+    assert [reply.split(b" ")[2] for reply in replies[1:4]] == [
+        b"NICK",
+        b"STATS",
+        b"USER",
+    ]
+    assert replies[4] == b"219 stats m :End of /STATS report"
+    assert replies[5].startswith(b"242 stats :Server Up 0 days 0:00:")
+    assert replies[6:] == [
+        b"219 stats u :End of /STATS report",
+        b"461 :Not enough parameters.",
+        b"",
+    ]
+
+
+def test_serve_metrics():
+    server = IRCServer("127.0.0.1", storage=MemoryStorage(), enable_metrics=True)
+    converse(server, b"NICK scraped\r\n")
+
+    http = serve_metrics(("127.0.0.1", 0))
+    try:
+        body = urlopen(f"http://127.0.0.1:{http.server_port}/metrics").read()
+    finally:
+        http.shutdown()
+
+    assert b"# TYPE foghorn_command_seconds histogram" in body
+    assert b'foghorn_command_seconds_count{command="NICK"}' in body
+    assert b"foghorn_connections 0" in body
@@ -0,0 +1,86 @@
+from foghorn.nicks import CaseMapping, NickRegistry
+from foghorn.server import IRCServer
+from foghorn.storage import MemoryStorage
+
+from .test_server import converse
+
+
+def test_fold():
+    rfc1459, ascii = NickRegistry(CaseMapping.RFC1459), NickRegistry(CaseMapping.ASCII)
+    assert rfc1459.fold("Foo[]\\~") == "foo{}|^"
+    assert ascii.fold("Foo[]\\~") == "foo[]\\~"
+
+
+def test_claim():
+    # two workers sharing the same storage
+    storage = MemoryStorage()
+    local, remote = NickRegistry(), NickRegistry()
+
+    assert local.claim("Alice", "client:a", 1, storage)
+    assert local.claim("ALICE", "client:a", 1, storage)
+    assert not remote.claim("alice", "client:b", 2, storage)
+    assert remote.find("aLiCe", storage) == "client:a"
+
+    # only the node of the client using a nickname can free it up
+    remote.release("alice", "client:b", 2, storage)
+    assert remote.find("alice", storage) == "client:a"
+
+    local.release("Alice", "client:a", 1, storage)
+    assert not remote.find("alice", storage)
+    assert remote.claim("alice", "client:b", 2, storage)
+    assert not local.claim("Alice", "client:a", 1, storage)
+
+
+class LeasedStorage(MemoryStorage):
+    """Storage shared by the given nodes, which are the only ones still running."""
+
+    def __init__(self, *alive):
+        super().__init__()
+        self.alive = set(alive)
+
+    def node_alive(self, node):
+        return node in self.alive
+
+
+def test_claim_from_crashed_node():
+    storage = LeasedStorage(1, 2)
+    crashed, local = NickRegistry(), NickRegistry()
+    assert crashed.claim("Alice", "client:a", 1, storage)
+    assert not local.claim("alice", "client:b", 2, storage)
+
+    # the nicknames used on a node that stopped holding its lease are taken over
+    storage.alive.remove(1)
+    assert local.claim("alice", "client:b", 2, storage)
+    assert local.find("ALICE", storage) == "client:b"
+
+
+def test_registration():
+    server = IRCServer("127.0.0.1", storage=MemoryStorage())
+    server._bus.nicks.claim("Taken", "client:elsewhere", 0, server._storage)
+
+    # registration waits for a nickname that isn't in use
+    replies = converse(
+        server, b"NICK taken\r\nUSER u 0 * :U\r\nNICK other\r\nNICK Other\r\n"
+    ).split(b"\r\n")
+    assert replies == [
+        b"433 taken :Nickname is already in use.",
+        b"001 other :Welcome to the Network, other",
+        b"",
+    ]
+    assert not server._storage.find_nick("other")
+
+
+def test_special_characters():
+    server = IRCServer("127.0.0.1", storage=MemoryStorage())
+    server._bus.nicks.claim("[Bot]", "client:elsewhere", 0, server._storage)
+
+    # the characters folded by the rfc1459 casemapping can be used in nicknames
+    replies = converse(
+        server, b"NICK {bot}\r\nNICK b~t!\r\nNICK b^t\r\nUSER u 0 * :U\r\n"
+    ).split(b"\r\n")
+    assert replies == [
+        b"433 {bot} :Nickname is already in use.",
+        b"432 :Erroneus nickname.",
+        b"001 b^t :Welcome to the Network, b^t",
+        b"",
+    ]
@@ -0,0 +1,53 @@
+from foghorn.profiling import PROFILER, CommandProfiler
+from foghorn.server import IRCServer
+from foghorn.storage import MemoryStorage
+
+from .test_server import converse
+
+
+def test_dump(tmp_path):
+    profiler = CommandProfiler(rate=1.0, path=str(tmp_path / "{pid}.stacks"))
+    profiler.enable()
+    timer = profiler.start()
+    assert timer
+    timer.mark("parse")
+    profiler.record(timer)
+    profiler.add("send", 0.000002)
+
+    path = profiler.disable()
+    assert not profiler.enabled and profiler.samples == 1
+    with open(path) as stacks:
+        lines = stacks.read().splitlines()
+    assert lines[0] == "send 2"
+    assert lines[1].startswith("unparsed;parse ")
+
+
+def test_stats_profile_not_allowed():
+    server = IRCServer("127.0.0.1", storage=MemoryStorage())
+    replies = converse(server, b"NICK prof\r\nUSER prof 0 * :P\r\nSTATS p\r\n")
+
+    assert replies.split(b"\r\n")[1] == b"481 :Permission denied."
+    assert not PROFILER.enabled
+
+
+def test_stats_profile(tmp_path):
+    PROFILER.allowed = True
+    PROFILER.rate = 1.0
+    PROFILER.path = str(tmp_path / "{pid}.stacks")
+    server = IRCServer("127.0.0.1", storage=MemoryStorage())
+    try:
+        replies = converse(
+            server,
+            b"NICK prof\r\nUSER prof 0 * :P\r\nSTATS p\r\nNAMES\r\nSTATS p\r\n",
+        ).split(b"\r\n")
+    finally:
+        PROFILER.__init__()
+
+    assert replies[1:3] == [
+        b"NOTICE prof :Profiling enabled, sampling 100.00% of lines",
+        b"219 prof p :End of /STATS report",
+    ]
+    assert replies[4].startswith(b"NOTICE prof :Profiling disabled, 1 lines sampled")
+    with open(replies[4].rsplit(b" ", 1)[1]) as stacks:
+        lines = stacks.read().splitlines()
+    assert "NAMES;respond" in [line.rsplit(" ", 1)[0] for line in lines]
@@ -0,0 +1,192 @@
+from contextlib import contextmanager
+from typing import Iterator
+
+import gevent
+from gevent import socket
+
+from foghorn.commands.names import names_replies
+from foghorn.framing import MAX_LINE_LENGTH
+from foghorn.parsing import MAX_MESSAGE_LENGTH
+from foghorn.server import IRCServer
+from foghorn.storage import MemoryStorage, StorageBackend, client_rkey
+
+ADDRESS = ("127.0.0.1", 50000)
+
+
+def converse(server: IRCServer, data: bytes) -> bytes:
+    """Sends the data to the server as a client, returning everything it replied."""
+    client, conn = socket.socketpair()
+    handler = gevent.spawn(server.handle, conn, ADDRESS)
+
+    client.sendall(data)
+    client.shutdown(socket.SHUT_WR)
+    handler.get(timeout=5)
+    conn.close()
+
+    replies = b""
+    while True:
+        data = client.recv(4096)
+        if not data:
+            return replies
+
+        replies += data
+
+
+def test_handle_batch():
+    storage = MemoryStorage()
+    server = IRCServer("127.0.0.1", storage=storage)
+
+    replies = converse(
+        server,
+        b"CAP LS 302\r\nFOO\r\n\xff\r\n" + b"a" * MAX_LINE_LENGTH + b"\r\nNICK",
+    ).split(b"\r\n")
+    assert replies == [
+        b"CAP * LS :message-tags cap-notify batch draft/chathistory",
+        b"421 :Unknown command.",
+        b"417 :Input line was too long.",
+        b"",
+    ]
+
+    # all traces of the client are deleted once it disconnects
+    assert not storage.read_client(client_rkey(ADDRESS))
+    assert not server._clients and not server._connection_buffer_map
+
+
+def test_context():
+    server = IRCServer("127.0.0.1", storage=MemoryStorage())
+
+    # commands not implemented are unknown, and negotiation can be followed by
+    # registration
+    replies = converse(
+        server,
+        b"CAP LS 302\r\nMOTD\r\nCAP END\r\nNICK capper\r\nUSER capper 0 * :C\r\n",
+    ).split(b"\r\n")
+    assert replies[1:] == [
+        b"421 :Unknown command.",
+        b"001 capper :Welcome to the Network, capper",
+        b"",
+    ]
+
+    # clients can also negotiate once they're registered, without registering again
+    replies = converse(
+        server,
+        b"NICK alice\r\nUSER alice 0 * :A\r\nCAP LS 302\r\nCAP END\r\nMOTD\r\n",
+    ).split(b"\r\n")
+    assert replies[0] == b"001 alice :Welcome to the Network, alice"
+    assert replies[1].startswith(b"CAP * LS")
+    assert replies[2:] == [b"421 :Unknown command.", b""]
+
+    # but only registration commands can follow negotiation
+    replies = converse(server, b"CAP LS 302\r\nUSER capper 0 * :C\r\n").split(b"\r\n")
+    assert replies[1:] == [b"400 :Unexpected command.", b""]
+
+
+def test_privmsg():
+    server = IRCServer("127.0.0.1", storage=MemoryStorage())
+    sockets, handlers = [], []
+    for port, nickname in ((50001, b"alice"), (50002, b"bob")):
+        client, conn = socket.socketpair()
+        handlers.append(gevent.spawn(server.handle, conn, ("127.0.0.1", port)))
+        client.sendall(b"NICK " + nickname + b"\r\nUSER " + nickname + b" 0 * :N\r\n")
+        assert client.recv(4096).startswith(b"001 " + nickname)
+        sockets.append(client)
+
+    alice, bob = sockets
+    alice.sendall(b"PRIVMSG bob :hello there\r\nPRIVMSG nobody :hi\r\n")
+    assert bob.recv(4096) == b":alice PRIVMSG bob :hello there\r\n"
+    assert alice.recv(4096) == b"401 alice nobody :No such nick/channel.\r\n"
+
+    # notices are never answered with errors
+    bob.sendall(b"NOTICE nobody :hi\r\nNOTICE alice :hi\r\n")
+    assert alice.recv(4096) == b":bob NOTICE alice hi\r\n"
+
+    for client in sockets:
+        client.close()
+    gevent.joinall(handlers, timeout=5)
+    assert not server._storage.find_nick("alice")
+
+
+def test_channels():
+    server = IRCServer("127.0.0.1", storage=MemoryStorage())
+    sockets, handlers = [], []
+    for port, nickname in ((50001, b"alice"), (50002, b"bob")):
+        client, conn = socket.socketpair()
+        handlers.append(gevent.spawn(server.handle, conn, ("127.0.0.1", port)))
+        client.sendall(b"NICK " + nickname + b"\r\nUSER " + nickname + b" 0 * :N\r\n")
+        client.recv(4096)
+        sockets.append(client)
+
+    alice, bob = sockets
+    alice.sendall(b"JOIN #foghorn\r\n")
+    assert alice.recv(4096).split(b"\r\n") == [
+        b":alice JOIN #foghorn",
+        b"353 alice = #foghorn alice",
+        b"366 alice #foghorn :End of /NAMES list",
+        b"",
+    ]
+
+    bob.sendall(b"PRIVMSG #foghorn :hi\r\nJOIN #foghorn\r\n")
+    assert bob.recv(4096).split(b"\r\n")[:2] == [
+        b"404 bob #foghorn :Cannot send to channel.",
+        b":bob JOIN #foghorn",
+    ]
+    assert alice.recv(4096) == b":bob JOIN #foghorn\r\n"
+
+    # members don't receive their own messages
+    bob.sendall(b"PRIVMSG #foghorn :hello there\r\nPART #foghorn :bye\r\n")
+    assert bob.recv(4096) == b":bob PART #foghorn bye\r\n"
+    assert alice.recv(4096) == (
+        b":bob PRIVMSG #foghorn :hello there\r\n:bob PART #foghorn bye\r\n"
+    )
+
+    for client in sockets:
+        client.close()
+    gevent.joinall(handlers, timeout=5)
+    assert not server._storage.channel_members("#foghorn")
+
+
+def test_names_pages():
+    names = [f"user{i:04}" for i in range(1000)]
+    replies = names_replies("alice", "#foghorn", names)
+
+    # every page fits within a single line, and no names are lost between them
+    assert all(len(reply.to_bytes()) <= MAX_MESSAGE_LENGTH for reply in replies)
+    assert [n for reply in replies[:-1] for n in reply.params[-1].split()] == names
+    assert replies[-1].params == ["alice", "#foghorn", "End of /NAMES list"]
+
+
+class CountingStorage(MemoryStorage):
+    """Storage counting the sessions taken from it."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.sessions = 0
+
+    @contextmanager
+    def session(self) -> Iterator[StorageBackend]:
+        self.sessions += 1
+        with super().session() as storage:
+            yield storage
+
+
+def test_partial_line_session():
+    storage = CountingStorage()
+    server = IRCServer("127.0.0.1", storage=storage)
+    client, conn = socket.socketpair()
+    handler = gevent.spawn(server.handle, conn, ADDRESS)
+
+    # no session is taken until a line is complete
+    client.sendall(b"NI")
+    gevent.sleep(0.05)
+    client.sendall(b"CK")
+    gevent.sleep(0.05)
+    assert storage.sessions == 0
+
+    client.sendall(b" foo\r\n")
+    gevent.sleep(0.05)
+    assert storage.sessions == 1
+
+    client.shutdown(socket.SHUT_WR)
+    handler.get(timeout=5)
+    conn.close()
+    client.close()
@@ -0,0 +1,19 @@
+import subprocess
+import sys
+
+
+def test_startup():
+    # the CLI parses its arguments without importing either engine or their storage
+    loaded = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, foghorn.cli; print(' '.join(sys.modules))",
+        ],
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout.split()
+    assert "foghorn.cli" in loaded
+    assert not [m for m in loaded if m.split(".")[0] in ("gevent", "redis")]
+    assert "foghorn.core" not in loaded
@@ -0,0 +1,53 @@
+import os
+import ssl
+
+import gevent
+from gevent import socket
+
+from foghorn.server import IRCServer
+from foghorn.storage import MemoryStorage
+from foghorn.tls import server_context
+
+CERTS = os.path.join(os.path.dirname(__file__), "certs")
+CERTFILE = os.path.join(CERTS, "localhost.crt")
+KEYFILE = os.path.join(CERTS, "localhost.key")
+
+
+def _register(server: IRCServer, context: ssl.SSLContext, session=None):
+    client, conn = socket.socketpair()
+    handler = gevent.spawn(server.handle, conn, ("127.0.0.1", 50000))
+    tls = context.wrap_socket(client, server_hostname="localhost", session=session)
+
+    tls.sendall(b"NICK alice\r\nUSER alice 0 * :A\r\n")
+    reply = tls.recv(4096)
+    session, reused = tls.session, tls.session_reused
+    tls.close()
+    handler.get(timeout=5)
+    return reply, session, reused
+
+
+def test_tls():
+    server = IRCServer(
+        "127.0.0.1",
+        storage=MemoryStorage(),
+        tls=server_context(CERTFILE, KEYFILE),
+        handshake_threads=2,
+    )
+    context = ssl.create_default_context(cafile=CERTFILE)
+
+    reply, session, reused = _register(server, context)
+    assert reply == b"001 alice :Welcome to the Network, alice\r\n"
+    assert not reused
+
+    # returning clients resume their session instead of starting a new one
+    reply, _, reused = _register(server, context, session)
+    assert reply.startswith(b"001 alice")
+    assert reused
+
+    # clients that never complete their handshake are dropped
+    client, conn = socket.socketpair()
+    handler = gevent.spawn(server.handle, conn, ("127.0.0.1", 50000))
+    client.sendall(b"NICK alice\r\n")
+    handler.get(timeout=5)
+    assert not server._clients
+    server._tls.close()
@@ -1,7 +1,32 @@
+import pytest
+
+from foghorn.errors import ProtocolException
 from foghorn.typing import typecaster
+from foghorn.utils import compose, transform
 
 
 def test_typecaster():
     assert typecaster(int)(["foo"], iter(["0"])) == 0
     assert typecaster(str, optional=True)(["bar"], iter([])) is None
     assert typecaster(int, many=True)(["foo", "bar"], iter(["0", "42"])) == [0, 42]
+
+
+@pytest.mark.parametrize(
+    "transformers",
+    [
+        [typecaster(str), typecaster(int, optional=True)],
+        [typecaster(int, many=True)],
+        [typecaster(str)] * 4,
+    ],
+)
+@pytest.mark.parametrize("args", [[], ["1"], ["a", "2"], ["3", "4", "5", "6"]])
+def test_compose(transformers, args):
+    # composed casters behave exactly like transforming one argument at a time
+    try:
+        expected = transform(transformers, args)
+    except ProtocolException as err:
+        with pytest.raises(ProtocolException) as raised:
+            compose(transformers)(args)
+        assert raised.value.error_code == err.error_code
+    else:
+        assert compose(transformers)(args) == expected
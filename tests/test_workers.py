@@ -0,0 +1,83 @@
+import os
+import signal
+import subprocess
+import sys
+
+import gevent
+import pytest
+
+from foghorn.profiling import PROFILE_SIGNAL
+from foghorn.workers import REUSE_PORT, bind_listener
+
+# workers are forked, and share a port through SO_REUSEPORT
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="Workers can't be forked on Windows"
+)
+
+# a supervisor whose workers report when they start and when they're sent a signal
+SUPERVISOR = """
+import os, signal
+from foghorn.profiling import PROFILE_SIGNAL
+from foghorn.workers import Supervisor
+
+def run_worker():
+    signal.signal(
+        PROFILE_SIGNAL, lambda signum, _: os.write(1, b"signal %d\\n" % os.getpid())
+    )
+    os.write(1, b"start %d\\n" % os.getpid())
+    while True:
+        signal.pause()
+
+Supervisor(run_worker, 2).run()
+"""
+
+
+def test_supervisor():
+    supervisor = subprocess.Popen(
+        [sys.executable, "-c", SUPERVISOR], stdout=subprocess.PIPE
+    )
+
+    def read(event: bytes, count: int = 1) -> set:
+        pids = set()
+        with gevent.Timeout(5):
+            while len(pids) < count:
+                line = supervisor.stdout.readline().split()
+                assert line[0] == event
+                pids.add(int(line[1]))
+
+        return pids
+
+    try:
+        workers = read(b"start", 2)
+
+        # a worker that dies is replaced
+        dead = workers.pop()
+        os.kill(dead, signal.SIGKILL)
+        workers |= read(b"start")
+        assert len(workers) == 2 and dead not in workers
+
+        # the profiling signal is forwarded to every worker
+        supervisor.send_signal(PROFILE_SIGNAL)
+        assert read(b"signal", 2) == workers
+
+        # stopping the supervisor stops all of its workers
+        supervisor.terminate()
+        assert supervisor.wait(timeout=5) == 0
+        for pid in workers:
+            with pytest.raises(ProcessLookupError):
+                os.kill(pid, 0)
+    finally:
+        supervisor.kill()
+        supervisor.wait()
+        supervisor.stdout.close()
+
+
+@pytest.mark.skipif(not REUSE_PORT, reason="SO_REUSEPORT is unsupported")
+def test_bind_listener_reuse_port():
+    first = bind_listener(("127.0.0.1", 0), reuse_port=True)
+    # every worker can bind its own socket to the same port
+    second = bind_listener(first.getsockname(), reuse_port=True)
+    assert second.getsockname() == first.getsockname()
+
+    first.close()
+    second.close()
@@ -0,0 +1,114 @@
+import gevent
+from gevent import socket
+from gevent.event import Event
+
+from foghorn import writer as writer_module
+from foghorn.writer import SENDQ_EXCEEDED, ConnectionWriter, SendQPolicy
+
+
+class StuckSocket:
+    """A socket whose writes don't complete until it's unstuck."""
+
+    def __init__(self):
+        self.unstuck = Event()
+        self.written = []
+        self.shut_down = False
+
+    def sendmsg(self, buffers, ancdata=(), flags=0):
+        if not flags:
+            self.unstuck.wait()
+
+        self.written.extend(bytes(b) for b in buffers)
+        return sum(len(b) for b in buffers)
+
+    def shutdown(self, how):
+        self.shut_down = True
+
+
+class PlainSocket:
+    """A socket without vectored writes, which never has room for more."""
+
+    def __init__(self):
+        self.written = []
+        self.shut_down = False
+
+    def sendall(self, data):
+        if self.written:
+            gevent.sleep(1)
+
+        self.written.append(data)
+
+    def shutdown(self, how):
+        self.shut_down = True
+
+
+def test_writes_are_coalesced():
+    client, conn = socket.socketpair()
+    writer = ConnectionWriter(conn)
+    for i in range(100):
+        writer.write(b"PING %d\r\n" % i)
+
+    writer.close()
+    conn.close()
+    assert client.recv(65536) == b"".join(b"PING %d\r\n" % i for i in range(100))
+
+
+def test_sendq_drop():
+    sock = StuckSocket()
+    writer = ConnectionWriter(sock, max_bytes=10, policy=SendQPolicy.DROP)
+    writer.write(b"a" * 8)
+    gevent.sleep(0)
+    writer.write(b"b" * 8)
+
+    # the first write is stuck, so there's no room for the second
+    assert writer.dropped == 1 and writer.queued == 8
+    sock.unstuck.set()
+    writer.close()
+    assert sock.written == [b"a" * 8]
+
+
+def test_sendq_disconnect():
+    sock = StuckSocket()
+    writer = ConnectionWriter(sock, max_bytes=10)
+    writer.write(b"a" * 8)
+    gevent.sleep(0)
+    writer.write(b"b" * 8)
+    gevent.sleep(0.01)
+
+    # the client is told why before being disconnected, and nothing else is written
+    assert sock.written[-1] == SENDQ_EXCEEDED and sock.shut_down
+    writer.write(b"c" * 8)
+    assert not writer.queued
+
+
+def test_sendq_block():
+    sock = StuckSocket()
+    writer = ConnectionWriter(sock, max_bytes=10, policy=SendQPolicy.BLOCK)
+    writer.write(b"a" * 8)
+    gevent.sleep(0)
+
+    # the second write waits until the first one is done
+    blocked = gevent.spawn(writer.write, b"b" * 8)
+    gevent.sleep(0)
+    assert not blocked.dead
+
+    sock.unstuck.set()
+    blocked.join(timeout=1)
+    writer.close()
+    assert sock.written == [b"a" * 8, b"b" * 8]
+
+
+def test_without_vectored_writes(monkeypatch):
+    monkeypatch.setattr(writer_module, "MSG_DONTWAIT", None)
+    sock = PlainSocket()
+    writer = ConnectionWriter(sock, max_bytes=10)
+    writer.write(b"a" * 4)
+    writer.write(b"b" * 4)
+    gevent.sleep(0)
+    writer.write(b"c" * 8)
+    gevent.sleep(0)
+    writer.write(b"d" * 8)
+    gevent.sleep(0.01)
+
+    # the buffers are joined, and the reason isn't waited on when there's no room
+    assert sock.written == [b"a" * 4 + b"b" * 4] and sock.shut_down